@@ -0,0 +1,9 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.vercel import ServiceHandler
+
+class handler(ServiceHandler):
+    """Vercel function for /api/metrics"""
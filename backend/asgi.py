@@ -0,0 +1,30 @@
+"""
+ASGI entry point: the same API and pages as server.py, on an event loop.
+
+    cd backend
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+``WORKER_THREADS`` sizes the pool that serves reads (default 8); the other
+settings are the ones server.py reads from the environment.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.asgi import THREADS, AsyncService, ServiceApp
+from core.service import env_config
+
+FRONTEND = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'frontend')
+
+PAGES = {
+    '/': 'index.html',
+    '/admin': 'admin.html',
+    '/connect/<connection_id>': 'connect.html',
+    '/mobile/<connection_id>': 'mobile.html',
+}
+
+service = AsyncService(env_config(), int(os.environ.get('WORKER_THREADS', THREADS)))
+
+app = ServiceApp(service, PAGES, FRONTEND)
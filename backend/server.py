@@ -1,280 +1,102 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, abort, g, request, jsonify
 from flask_cors import CORS
-import json
 import os
-from datetime import datetime
+import sys
 import secrets
-import hashlib
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import metrics
+from core.assets import Assets
+from core.service import ROUTES, Request, Service, env_config
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=['ETag', 'Idempotent-Replayed', 'Retry-After'])
 
 # Configuration
 app.config['SECRET_KEY'] = secrets.token_hex(32)
-app.config['DATABASE_FILE'] = 'wallet_connections.json'
+
+# DATABASE_FILE, plus the seconds between expiry sweeps (0 disables the
+# sweeper) and whether expired connections are moved out of the hot tables
+# into the archive; all overridable from the environment
+app.config.update(env_config())
+
+# The API itself lives in core/service.py, shared with the Vercel functions
+service = Service(app.config)
+
+# Pages and scripts, precompressed and content-hashed (core/assets.py)
+assets = Assets(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'frontend'))
 
 # Database to store connection requests
+def get_db():
+    return service.get_db()
+
 def load_database():
-    if os.path.exists(app.config['DATABASE_FILE']):
-        with open(app.config['DATABASE_FILE'], 'r') as f:
-            return json.load(f)
-    return {'connections': [], 'transactions': []}
+    return get_db().data()
 
 def save_database(data):
-    with open(app.config['DATABASE_FILE'], 'w') as f:
-        json.dump(data, f, indent=2)
+    get_db().replace(data)
+
+def service_view(endpoint):
+    """Wrap a service route as a Flask view"""
+    def view(**params):
+        service_request = Request(request.method, request.path, request.args.to_dict(), request.headers,
+                                  request.get_data(), request.host_url, request.remote_addr)
+        response = service.handle(endpoint, service_request, params)
+        return Response(response.body, status=response.status, headers=response.headers,
+                        content_type=response.content_type)
+    view.__name__ = endpoint
+    return view
+
+def frontend_file(name):
+    """Serve a file from the frontend directory"""
+    response = assets.respond(name, request.headers)
+    if response is None:
+        abort(404)
+    return Response(response.body, status=response.status, headers=response.headers,
+                    content_type=response.content_type)
+
+# Request metrics
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    # Streamed responses (exports, SSE) are timed up to their first byte
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.observe_request(route, request.method, response.status_code, time.perf_counter() - started)
+    return response
 
 # Routes
 @app.route('/')
 def index():
-    return send_from_directory('../frontend', 'index.html')
+    return frontend_file('index.html')
 
 @app.route('/admin')
 def admin():
-    return send_from_directory('../frontend', 'admin.html')
-
-@app.route('/api/health')
-def health_check():
-    return jsonify({'status': 'healthy', 'timestamp': datetime.now().isoformat()})
-
-@app.route('/api/connect', methods=['POST'])
-def create_connection():
-    """Create a new wallet connection request"""
-    try:
-        data = request.get_json()
-        
-        if not data or 'user_id' not in data:
-            return jsonify({'error': 'user_id is required'}), 400
-        
-        # Generate unique connection ID
-        connection_id = secrets.token_urlsafe(32)
-        
-        # Create connection request
-        connection_request = {
-            'id': connection_id,
-            'user_id': data['user_id'],
-            'status': 'pending',
-            'created_at': datetime.now().isoformat(),
-            'wallet_address': None,
-            'network': None,
-            'expires_at': (datetime.now().timestamp() + 3600),  # 1 hour expiry
-            'metadata': data.get('metadata', {})
-        }
-        
-        # Save to database
-        db = load_database()
-        db['connections'].append(connection_request)
-        save_database(db)
-        
-        # Generate connection link
-        connection_link = f"{request.host_url}connect/{connection_id}"
-        
-        return jsonify({
-            'success': True,
-            'connection_id': connection_id,
-            'connection_link': connection_link,
-            'expires_at': connection_request['expires_at']
-        })
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    return frontend_file('admin.html')
 
 @app.route('/connect/<connection_id>')
 def connect_page(connection_id):
     """Connection page for users"""
-    return send_from_directory('../frontend', 'connect.html')
+    return frontend_file('connect.html')
 
 @app.route('/mobile/<connection_id>')
 def mobile_page(connection_id):
     """Mobile-optimized connection page"""
-    return send_from_directory('../frontend', 'mobile.html')
-
-@app.route('/api/connections')
-def get_all_connections():
-    """Get all connections for admin dashboard"""
-    try:
-        db = load_database()
-        return jsonify(db['connections'])
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-@app.route('/api/connections/<connection_id>')
-def get_connection(connection_id):
-    """Get connection status"""
-    try:
-        db = load_database()
-        
-        for connection in db['connections']:
-            if connection['id'] == connection_id:
-                return jsonify(connection)
-        
-        return jsonify({'error': 'Connection not found'}), 404
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-@app.route('/api/connections/<connection_id>/update', methods=['POST'])
-def update_connection(connection_id):
-    """Update connection with wallet info"""
-    try:
-        data = request.get_json()
-        
-        if not data or 'wallet_address' not in data:
-            return jsonify({'error': 'wallet_address is required'}), 400
-        
-        db = load_database()
-        
-        for connection in db['connections']:
-            if connection['id'] == connection_id:
-                connection['wallet_address'] = data['wallet_address']
-                connection['network'] = data.get('network', 'ethereum')
-                connection['status'] = 'connected'
-                connection['connected_at'] = datetime.now().isoformat()
-                save_database(db)
-                
-                return jsonify({'success': True, 'connection': connection})
-        
-        return jsonify({'error': 'Connection not found'}), 404
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-@app.route('/api/transactions', methods=['POST'])
-def create_transaction():
-    """Create a new transaction request"""
-    try:
-        data = request.get_json()
-        
-        required_fields = ['connection_id', 'to_address', 'amount']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({'error': f'{field} is required'}), 400
-        
-        # Verify connection exists and is active
-        db = load_database()
-        connection = None
-        for conn in db['connections']:
-            if conn['id'] == data['connection_id'] and conn['status'] == 'connected':
-                connection = conn
-                break
-        
-        if not connection:
-            return jsonify({'error': 'Invalid or inactive connection'}), 400
-        
-        # Create transaction request
-        transaction = {
-            'id': secrets.token_urlsafe(32),
-            'connection_id': data['connection_id'],
-            'from_address': connection['wallet_address'],
-            'to_address': data['to_address'],
-            'amount': data['amount'],
-            'status': 'pending',
-            'created_at': datetime.now().isoformat(),
-            'hash': None,
-            'gas_used': None,
-            'gas_price': None
-        }
-        
-        db['transactions'].append(transaction)
-        save_database(db)
-        
-        return jsonify({
-            'success': True,
-            'transaction_id': transaction['id'],
-            'transaction': transaction
-        })
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-@app.route('/api/transactions/<transaction_id>')
-def get_transaction(transaction_id):
-    """Get transaction status"""
-    try:
-        db = load_database()
-        
-        for transaction in db['transactions']:
-            if transaction['id'] == transaction_id:
-                return jsonify(transaction)
-        
-        return jsonify({'error': 'Transaction not found'}), 404
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-@app.route('/api/transactions/<transaction_id>/update', methods=['POST'])
-def update_transaction(transaction_id):
-    """Update transaction with blockchain info"""
-    try:
-        data = request.get_json()
-        
-        db = load_database()
-        
-        for transaction in db['transactions']:
-            if transaction['id'] == transaction_id:
-                transaction.update(data)
-                transaction['updated_at'] = datetime.now().isoformat()
-                save_database(db)
-                
-                return jsonify({'success': True, 'transaction': transaction})
-        
-        return jsonify({'error': 'Transaction not found'}), 404
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-@app.route('/api/connections/<connection_id>/transactions')
-def get_connection_transactions(connection_id):
-    """Get all transactions for a connection"""
-    try:
-        db = load_database()
-        
-        transactions = [
-            tx for tx in db['transactions'] 
-            if tx['connection_id'] == connection_id
-        ]
-        
-        return jsonify({
-            'success': True,
-            'transactions': transactions
-        })
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    return frontend_file('mobile.html')
 
-@app.route('/api/transactions')
-def get_all_transactions():
-    """Get all transactions"""
-    try:
-        db = load_database()
-        return jsonify(db['transactions'])
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+@app.route('/assets/<name>')
+def asset(name):
+    """Content-hashed scripts and stylesheets"""
+    return frontend_file(name)
 
-@app.route('/api/stats')
-def get_stats():
-    """Get platform statistics"""
-    try:
-        db = load_database()
-        
-        total_connections = len(db['connections'])
-        active_connections = len([c for c in db['connections'] if c['status'] == 'connected'])
-        total_transactions = len(db['transactions'])
-        successful_transactions = len([t for t in db['transactions'] if t['status'] == 'confirmed'])
-        
-        return jsonify({
-            'success': True,
-            'stats': {
-                'total_connections': total_connections,
-                'active_connections': active_connections,
-                'total_transactions': total_transactions,
-                'successful_transactions': successful_transactions,
-                'success_rate': (successful_transactions / total_transactions * 100) if total_transactions > 0 else 0
-            }
-        })
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+for method, pattern, endpoint in ROUTES:
+    app.add_url_rule(pattern, endpoint, service_view(endpoint), methods=[method])
 
 # Error handlers
 @app.errorhandler(404)
@@ -286,4 +108,4 @@ def internal_error(error):
     return jsonify({'error': 'Internal server error'}), 500
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000) 
\ No newline at end of file
+    app.run(debug=True, host='0.0.0.0', port=int(os.environ.get('PORT', 5000))) 
\ No newline at end of file
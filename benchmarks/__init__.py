@@ -0,0 +1 @@
+# Load-test and benchmark harness for the Flask backend and the Vercel functions
@@ -0,0 +1,111 @@
+"""
+Synthetic databases for benchmarking.
+
+Record ids are derived from their index, so the load generator can address
+any of them without reading the database back. Every fifth connection is
+pending (expiring in a day) and the rest are connected; transactions belong
+to connected connections.
+"""
+
+import json
+import os
+from datetime import datetime, timedelta
+
+from core.repository import backend_for, open_store
+
+CHUNK = 10000
+
+
+def connection_id(i):
+    return f'bench-conn-{i:08d}'
+
+
+def transaction_id(i):
+    return f'bench-tx-{i:08d}'
+
+
+def is_pending(i):
+    return i % 5 == 0
+
+
+def connected_index(i, connections):
+    """Map any number onto the index of a connected connection"""
+    i %= connections
+    return i + 1 if is_pending(i) else i
+
+
+def make_connection(i, created_at, expires_at):
+    pending = is_pending(i)
+    return {
+        'id': connection_id(i),
+        'user_id': f'bench-user-{i % 1000:04d}',
+        'status': 'pending' if pending else 'connected',
+        'created_at': created_at,
+        'wallet_address': None if pending else f'0x{i:040x}',
+        'network': None if pending else 'ethereum',
+        'expires_at': expires_at,
+        'metadata': {'source': 'benchmark'}
+    }
+
+
+def make_transaction(i, connections, created_at):
+    owner = connected_index(i, connections)
+    return {
+        'id': transaction_id(i),
+        'connection_id': connection_id(owner),
+        'from_address': f'0x{owner:040x}',
+        'to_address': f'0x{i:040x}',
+        'amount': 0.001,
+        'status': ('pending', 'confirmed', 'failed')[i % 3],
+        'created_at': created_at,
+        'hash': None,
+        'gas_used': None,
+        'gas_price': None
+    }
+
+
+def generate(table, count, connections, start):
+    """Yield count records spread one second apart from start"""
+    expires_at = (datetime.now() + timedelta(days=1)).timestamp()
+    for i in range(count):
+        created_at = (start + timedelta(seconds=i)).isoformat()
+        if table == 'connections':
+            yield make_connection(i, created_at, expires_at)
+        else:
+            yield make_transaction(i, connections, created_at)
+
+
+def build(path, connections, transactions):
+    """Create a database file with synthetic connections and transactions"""
+    for suffix in ('', '.wal', '.wal.compacting', '.map', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    start = datetime.now() - timedelta(seconds=max(connections, transactions))
+    counts = {'connections': connections, 'transactions': transactions}
+
+    if backend_for(path) == 'json':
+        # Streamed straight into the snapshot layout so a million records
+        # never have to sit in memory at once
+        with open(path, 'w') as f:
+            f.write('{')
+            for n, table in enumerate(counts):
+                f.write(f'{", " if n else ""}"{table}": [')
+                for i, record in enumerate(generate(table, counts[table], connections, start)):
+                    f.write((', ' if i else '') + json.dumps(record))
+                f.write(']')
+            f.write('}')
+        return
+
+    store = open_store(path)
+    try:
+        for table, count in counts.items():
+            chunk = []
+            for record in generate(table, count, connections, start):
+                chunk.append(record)
+                if len(chunk) == CHUNK:
+                    store.insert_many(table, chunk)
+                    chunk = []
+            store.insert_many(table, chunk)
+    finally:
+        store.close()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Measure how much memory a large database takes once loaded.
+
+Builds a synthetic JSON database and loads it in a fresh interpreter per
+measurement, reporting the live Python heap (from a run under tracemalloc)
+and the RSS growth and load time (from a run without it):
+
+- ``dicts``: the tables as decoded JSON, one dict per row (the wire format)
+- ``records``: the same rows as ``core.records`` objects
+- ``store``: the JSON log store, with its indexes and counters
+
+    python -m benchmarks.memory --records 1000000
+"""
+
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks import dataset
+
+MODES = ('dicts', 'records', 'store')
+
+
+def rss():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def measure(mode, path, trace):
+    """Load the database one way and return its footprint"""
+    gc.collect()
+    rss_before = rss()
+    if trace:
+        tracemalloc.start()
+    started = time.monotonic()
+
+    if mode == 'store':
+        from core.store import Store
+        loaded = Store(path)
+    elif mode == 'records':
+        from core.records import make_record
+        with open(path) as f:
+            loaded = {table: [make_record(table, row) for row in rows] for table, rows in json.load(f).items()}
+    else:
+        with open(path) as f:
+            loaded = json.load(f)
+
+    seconds = time.monotonic() - started
+    gc.collect()
+    if trace:
+        return {'heap_bytes': tracemalloc.get_traced_memory()[0]}
+    return {'rss_bytes': rss() - rss_before, 'load_seconds': round(seconds, 3)}
+
+
+def run_child(mode, path, trace):
+    output = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.memory', '--measure', mode, path, str(int(trace))],
+        cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    return json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the in-memory footprint of a database')
+    parser.add_argument('--records', type=int, default=100000, help='connections in the synthetic database')
+    parser.add_argument('--transactions', type=int, help='transactions (defaults to --records)')
+    parser.add_argument('--modes', default=','.join(MODES), help=f'comma-separated: {", ".join(MODES)}')
+    parser.add_argument('--measure', nargs=3, metavar=('MODE', 'PATH', 'TRACE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        mode, path, trace = args.measure
+        print(json.dumps(measure(mode, path, trace == '1')))
+        return
+
+    transactions = args.records if args.transactions is None else args.transactions
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'memory.json')
+        dataset.build(path, args.records, transactions)
+        print(f'{args.records} connections, {transactions} transactions')
+        print(f"  {'mode':<8} {'heap MB':>9} {'per row':>9} {'RSS MB':>9} {'load s':>8}")
+        for mode in args.modes.split(','):
+            result = dict(run_child(mode, path, True), **run_child(mode, path, False))
+            rows = args.records + transactions
+            print(f"  {mode:<8} {result['heap_bytes'] / 2 ** 20:>9.1f} {result['heap_bytes'] // rows:>8}B "
+                  f"{result['rss_bytes'] / 2 ** 20:>9.1f} {result['load_seconds']:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Benchmark the API against a synthetic database.
+
+Builds a database of N connections and transactions, starts the Flask
+backend and/or the Vercel handlers against it in a subprocess, and drives
+each operation on its own and then a weighted mix at a fixed concurrency.
+Every phase reports p50/p95/p99 latency, throughput, error count and the
+server's RSS, and the whole run is saved as JSON:
+
+    python -m benchmarks.run --records 100000 --concurrency 16 --duration 10
+    python -m benchmarks.run --records 100000 --compare benchmarks/results/<earlier>.json
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks import dataset
+
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+DEFAULT_MIX = 'read=50,update=15,create=10,stats=5,list=10,tx_read=5,tx_update=5'
+
+
+# Operations: name -> (targets that serve it, function returning method, path, body)
+
+def op_create(rng, n):
+    return 'POST', '/api/connect', {'user_id': f'bench-user-{rng.randrange(1000):04d}', 'metadata': {}}
+
+
+def op_read(rng, n):
+    return 'GET', f'/api/connections/{dataset.connection_id(rng.randrange(n))}', None
+
+
+def op_update(rng, n):
+    connection_id = dataset.connection_id(rng.randrange(n))
+    return 'POST', f'/api/connections/{connection_id}/update', {'wallet_address': f'0x{rng.getrandbits(160):040x}'}
+
+
+def op_stats(rng, n):
+    return 'GET', '/api/stats', None
+
+
+def op_list(rng, n):
+    return 'GET', '/api/connections?limit=100&order=desc', None
+
+
+def op_tx_read(rng, n):
+    return 'GET', f'/api/transactions/{dataset.transaction_id(rng.randrange(n))}', None
+
+
+def op_tx_update(rng, n):
+    return 'POST', f'/api/transactions/{dataset.transaction_id(rng.randrange(n))}/update', {'status': 'confirmed'}
+
+
+OPERATIONS = {
+    'create': (('flask', 'vercel', 'asgi'), op_create),
+    'read': (('flask', 'vercel', 'asgi'), op_read),
+    'update': (('flask', 'vercel', 'asgi'), op_update),
+    'stats': (('flask', 'vercel', 'asgi'), op_stats),
+    'list': (('flask', 'vercel', 'asgi'), op_list),
+    'tx_read': (('flask', 'vercel', 'asgi'), op_tx_read),
+    'tx_update': (('flask', 'vercel', 'asgi'), op_tx_update),
+}
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name not in OPERATIONS:
+            raise SystemExit(f'Unknown operation in --mix: {name}')
+        mix[name] = float(weight or 1)
+    return mix
+
+
+# Server process
+
+class Server:
+    """A server process from benchmarks.servers and the ports it listens on"""
+
+    def __init__(self, target, database_file):
+        # One client address sends everything, so admission control is off
+        env = dict(os.environ, DATABASE_FILE=database_file, EXPIRY_SWEEP_INTERVAL='0', RATE_LIMIT_IP='0',
+                   RATE_LIMIT_USER='0', RATE_LIMIT_CONNECTION='0', MAX_CONCURRENT_WRITES='0')
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'benchmarks.servers', target],
+            cwd=ROOT, env=env, stdout=subprocess.PIPE, text=True)
+        line = self.process.stdout.readline()
+        if not line:
+            raise SystemExit(f'{target} server failed to start')
+        self.ports = json.loads(line)
+
+    def port_for(self, path):
+        matches = [prefix for prefix in self.ports if path.startswith(prefix)]
+        return self.ports[max(matches, key=len)]
+
+    def rss(self):
+        """Resident set size in bytes, or None where /proc is unavailable"""
+        try:
+            with open(f'/proc/{self.process.pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            return None
+        return None
+
+    def stop(self):
+        self.process.kill()
+        self.process.wait()
+
+
+# Load generation
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+def worker(server, mix, records, deadline, seed, samples):
+    """Send requests until the deadline, appending (op, seconds, status)"""
+    rng = random.Random(seed)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    connections = {}
+    while time.monotonic() < deadline:
+        name = rng.choices(names, weights)[0]
+        method, path, body = OPERATIONS[name][1](rng, records)
+        port = server.port_for(path)
+        conn = connections.get(port)
+        if conn is None:
+            conn = connections[port] = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        payload = json.dumps(body).encode() if body is not None else None
+        headers = {'Content-Type': 'application/json'} if payload is not None else {}
+        started = time.perf_counter()
+        try:
+            conn.request(method, path, body=payload, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            status = None
+        samples.append((name, time.perf_counter() - started, status))
+    for conn in connections.values():
+        conn.close()
+
+
+def summarize(samples, seconds):
+    latencies = sorted(sample[1] for sample in samples)
+    errors = sum(1 for sample in samples if sample[2] is None or sample[2] >= 500)
+    rejected = sum(1 for sample in samples if sample[2] is not None and 400 <= sample[2] < 500)
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'rejected': rejected,
+        'throughput': round(len(samples) / seconds, 1) if seconds else None,
+        'p50_ms': _ms(percentile(latencies, 50)),
+        'p95_ms': _ms(percentile(latencies, 95)),
+        'p99_ms': _ms(percentile(latencies, 99)),
+        'max_ms': _ms(latencies[-1] if latencies else None),
+    }
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3) if seconds is not None else None
+
+
+def run_phase(server, mix, records, concurrency, duration):
+    """Drive one workload and summarize it overall and per operation"""
+    samples = []
+    rss_before = peak_rss = server.rss()
+    deadline = time.monotonic() + duration
+    threads = [
+        threading.Thread(target=worker, args=(server, mix, records, deadline, seed, samples))
+        for seed in range(concurrency)
+    ]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    while any(thread.is_alive() for thread in threads):
+        time.sleep(0.2)
+        rss = server.rss()
+        if rss is not None and (peak_rss is None or rss > peak_rss):
+            peak_rss = rss
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    result = summarize(samples, elapsed)
+    result['rss_before'] = rss_before
+    result['rss_after'] = server.rss()
+    result['rss_peak'] = peak_rss
+    if len(mix) > 1:
+        result['operations'] = {
+            name: summarize([sample for sample in samples if sample[0] == name], elapsed)
+            for name in mix
+        }
+    return result
+
+
+def warm_up(server, records):
+    """Make the server load the database before anything is timed"""
+    started = time.monotonic()
+    for name in ('stats', 'read'):
+        method, path, _ = OPERATIONS[name][1](random.Random(0), records)
+        conn = http.client.HTTPConnection('127.0.0.1', server.port_for(path), timeout=600)
+        conn.request(method, path)
+        conn.getresponse().read()
+        conn.close()
+    return round(time.monotonic() - started, 3)
+
+
+def bench_target(target, args, mix):
+    database_file = os.path.join(args.workdir, f'bench-{target}{args.extension}')
+    started = time.monotonic()
+    dataset.build(database_file, args.records, args.transactions)
+    build_seconds = round(time.monotonic() - started, 3)
+
+    server = Server(target, database_file)
+    try:
+        result = {'build_seconds': build_seconds, 'warm_up_seconds': warm_up(server, args.records), 'phases': {}}
+        supported = {name: weight for name, weight in mix.items() if target in OPERATIONS[name][0]}
+        for name in supported:
+            print(f'  {target} {name} ...', flush=True)
+            result['phases'][name] = run_phase(server, {name: 1}, args.records, args.concurrency, args.duration)
+        print(f'  {target} mixed ...', flush=True)
+        result['phases']['mixed'] = run_phase(server, supported, args.records, args.concurrency, args.duration)
+        return result
+    finally:
+        server.stop()
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Reporting
+
+def print_report(results, baseline=None):
+    for target, target_result in results['targets'].items():
+        print(f"\n{target} ({results['config']['records']} records, "
+              f"concurrency {results['config']['concurrency']})")
+        print(f"  {'phase':<10} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7} {'RSS MB':>8}")
+        for phase, stats in target_result['phases'].items():
+            rss = stats['rss_peak']
+            line = (f"  {phase:<10} {stats['throughput']:>9} {stats['p50_ms']:>9} {stats['p95_ms']:>9} "
+                    f"{stats['p99_ms']:>9} {stats['errors']:>7} {rss / 2 ** 20 if rss else 0:>8.1f}")
+            old = (baseline or {}).get('targets', {}).get(target, {}).get('phases', {}).get(phase)
+            if old:
+                line += (f"   vs {baseline.get('commit')}: {_change(old['throughput'], stats['throughput'])} req/s, "
+                         f"{_change(old['p99_ms'], stats['p99_ms'])} p99")
+            print(line)
+
+
+def _change(old, new):
+    if not old or new is None:
+        return 'n/a'
+    return f'{(new - old) / old * 100:+.1f}%'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the wallet platform API')
+    parser.add_argument('--records', type=int, default=10000,
+                        help='connections in the synthetic database (1000 to 1000000)')
+    parser.add_argument('--transactions', type=int, help='transactions (defaults to --records)')
+    parser.add_argument('--targets', default='flask,vercel', help='comma-separated: flask, vercel, asgi')
+    parser.add_argument('--backend', choices=('json', 'sqlite'), default='json')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10, help='seconds per phase')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='operation weights, e.g. read=5,update=1')
+    parser.add_argument('--workdir', help='where to build databases (default: a temp dir)')
+    parser.add_argument('--output', help='results file (default: benchmarks/results/<time>-<commit>.json)')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    args = parser.parse_args()
+
+    if not 1000 <= args.records <= 1000000:
+        parser.error('--records must be between 1000 and 1000000')
+    if args.transactions is None:
+        args.transactions = args.records
+    args.extension = '.json' if args.backend == 'json' else '.db'
+    mix = parse_mix(args.mix)
+    targets = [target for target in args.targets.split(',') if target]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if not args.workdir:
+            args.workdir = tmp
+        os.makedirs(args.workdir, exist_ok=True)
+
+        commit = git_commit()
+        results = {
+            'commit': commit,
+            'timestamp': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'config': {
+                'records': args.records,
+                'transactions': args.transactions,
+                'backend': args.backend,
+                'concurrency': args.concurrency,
+                'duration': args.duration,
+                'mix': mix,
+            },
+            'targets': {},
+        }
+        for target in targets:
+            print(f'Benchmarking {target} ...', flush=True)
+            results['targets'][target] = bench_target(target, args, mix)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{commit or 'unknown'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+    print(f'\nResults saved to {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Server processes under test.
+
+Run as ``python -m benchmarks.servers flask|vercel|asgi``. Once listening,
+the process prints one JSON line mapping route prefixes to ports and then
+serves until killed. ``flask`` serves ``backend/server.py`` from one threaded
+Werkzeug server; ``vercel`` puts each ``api/*.py`` handler behind its own
+``ThreadingHTTPServer``, the way Vercel routes to them; ``asgi`` runs
+``backend/asgi.py`` under one uvicorn worker.
+"""
+
+import json
+import os
+import sys
+import threading
+from http.server import ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Route prefix -> api module, as in vercel.json
+VERCEL_ROUTES = {
+    '/api/connect': 'api.connect',
+    '/api/connections': 'api.connections',
+    '/api/transactions': 'api.transactions',
+    '/api/export/': 'api.export',
+    '/api/stats': 'api.stats',
+    '/api/health': 'api.stats',
+    '/api/metrics': 'api.metrics',
+}
+
+
+def serve_flask():
+    sys.path.insert(0, os.path.join(ROOT, 'backend'))
+    from werkzeug.serving import make_server
+    import server
+
+    httpd = make_server('127.0.0.1', 0, server.app, threaded=True)
+    print(json.dumps({'': httpd.server_port}), flush=True)
+    httpd.serve_forever()
+
+
+def serve_asgi():
+    import socket
+    import uvicorn
+    sys.path.insert(0, os.path.join(ROOT, 'backend'))
+    import asgi
+
+    # asyncio only sets TCP_NODELAY on sockets that say they are TCP
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP)
+    sock.bind(('127.0.0.1', 0))
+    sock.listen(1024)
+    print(json.dumps({'': sock.getsockname()[1]}), flush=True)
+    uvicorn.Server(uvicorn.Config(asgi.app, log_level='error', access_log=False)).run(sockets=[sock])
+
+
+def serve_vercel():
+    import importlib
+
+    ports = {}
+    servers = {}
+    for prefix, module in VERCEL_ROUTES.items():
+        if module not in servers:
+            httpd = ThreadingHTTPServer(('127.0.0.1', 0), importlib.import_module(module).handler)
+            httpd.daemon_threads = True
+            servers[module] = httpd
+        ports[prefix] = servers[module].server_port
+    servers = list(servers.values())
+    for httpd in servers[1:]:
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    print(json.dumps(ports), flush=True)
+    servers[0].serve_forever()
+
+
+if __name__ == '__main__':
+    # The api handlers log every request to stderr otherwise
+    from http.server import BaseHTTPRequestHandler
+    BaseHTTPRequestHandler.log_message = lambda *args: None
+    import logging
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    {'flask': serve_flask, 'vercel': serve_vercel, 'asgi': serve_asgi}[sys.argv[1]]()
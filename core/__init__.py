@@ -0,0 +1 @@
+# Shared modules used by both the Flask backend and the Vercel functions
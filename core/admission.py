@@ -0,0 +1,173 @@
+"""
+Admission control for the mutating routes: per-key rate limits and a cap on
+concurrent writes.
+
+Each limit is a token bucket per key (client address, ``user_id`` or
+``connection_id``): ``rate`` tokens a second, at most ``burst`` saved up, one
+token per request. A request that would overdraw any of its buckets is
+refused with ``429`` and a ``Retry-After`` saying when it would succeed, and
+draws from none of them. Past ``max_writes`` writes in flight, further ones
+are refused with ``503`` at once instead of queueing behind the writer.
+
+A bucket is stored as a single float, the time at which it will be full
+again (the "theoretical arrival time" of the generic cell rate algorithm),
+under the hash of its key, so a key costs about 100 bytes. Keys live in two
+generations: new and touched keys go into the current one, and once it holds
+half of ``max_keys`` the previous generation is dropped, which evicts the
+keys that haven't been seen for the longest (an approximate LRU). An evicted
+key starts again with a full bucket.
+
+The client address is the socket peer unless the server is told how many
+proxies it sits behind (``client_address``).
+
+Limits are per process: with several workers a client gets each limit once
+per worker.
+"""
+
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Keys tracked per limit
+MAX_KEYS = 1000000
+
+# (rate per second, burst) of each limit
+LIMITS = {
+    'ip': (50.0, 100),
+    'user_id': (5.0, 20),
+    'connection_id': (10.0, 20),
+}
+
+# Writes in flight, running or waiting for the writer, before load is shed
+MAX_WRITES = 64
+
+# Retry-After of a request shed for load
+SHED_RETRY_AFTER = 1
+
+
+class RateLimited(Exception):
+    def __init__(self, message, status, retry_after):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class RateLimit:
+    """Token buckets of one rate and burst for up to max_keys keys"""
+
+    def __init__(self, rate, burst, max_keys=MAX_KEYS):
+        # Seconds per token, and the credit a full bucket holds
+        self.interval = 1.0 / rate
+        self.tolerance = burst * self.interval
+        self.max_keys = max_keys
+        # hash(key) -> time the bucket is full again
+        self._current = {}
+        self._previous = {}
+
+    def __len__(self):
+        return len(self._current) + len(self._previous)
+
+    def delay(self, key, now):
+        """Return (seconds until a request for key would succeed, the bucket's state after it)"""
+        key = hash(key)
+        full_at = self._current.get(key)
+        if full_at is None:
+            full_at = self._previous.get(key, now)
+        full_at = max(full_at, now) + self.interval
+        return full_at - now - self.tolerance, full_at
+
+    def take(self, key, full_at):
+        """Record a request admitted by delay()"""
+        key = hash(key)
+        self._previous.pop(key, None)
+        self._current[key] = full_at
+        if len(self._current) >= self.max_keys // 2:
+            self._previous = self._current
+            self._current = {}
+
+
+class Admission:
+    """Rate limits and the write cap shared by every request of a process
+
+    ``limits`` maps a key kind ('ip', 'user_id', 'connection_id') to its
+    RateLimit; kinds left out are unlimited, as is a ``max_writes`` of 0.
+    """
+
+    def __init__(self, limits, max_writes=MAX_WRITES):
+        self.limits = limits
+        self.max_writes = max_writes
+        self.writes = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def admit(self, keys):
+        """Hold a write slot for the block, or raise RateLimited
+
+        ``keys`` is a list of (kind, key) pairs, each drawing one token.
+        """
+        self.enter(keys)
+        try:
+            yield
+        finally:
+            self.leave()
+
+    def enter(self, keys):
+        now = time.monotonic()
+        with self._lock:
+            if self.max_writes and self.writes >= self.max_writes:
+                raise RateLimited('Server busy, retry shortly', 503, SHED_RETRY_AFTER)
+            admitted = []
+            for kind, key in keys:
+                limit = self.limits.get(kind)
+                if limit is None or key is None:
+                    continue
+                wait, full_at = limit.delay(key, now)
+                if wait > 0:
+                    raise RateLimited(f'Too many requests for this {kind}', 429, math.ceil(wait))
+                admitted.append((limit, key, full_at))
+            for limit, key, full_at in admitted:
+                limit.take(key, full_at)
+            self.writes += 1
+
+    def leave(self):
+        with self._lock:
+            self.writes -= 1
+
+
+def client_address(peer, forwarded_for, trusted_proxies):
+    """Return the address to rate limit a request on
+
+    Each of the ``trusted_proxies`` proxies in front of the server appends the
+    address it got the request from to ``X-Forwarded-For``, so the client is
+    the right-most address none of them added. Anything further left came
+    from the client itself and could be changed on every request.
+    """
+    if not trusted_proxies:
+        return peer
+    hops = [hop.strip() for hop in forwarded_for.split(',')] if forwarded_for else []
+    hops.append(peer)
+    return hops[max(len(hops) - 1 - trusted_proxies, 0)]
+
+
+def parse_limit(value):
+    """Parse a 'rate,burst' setting (requests a second, bucket size); '0' disables the limit"""
+    rate, _, burst = str(value).partition(',')
+    rate = float(rate)
+    if rate <= 0:
+        return None
+    return rate, int(burst) if burst else max(1, math.ceil(rate))
+
+
+def env_admission():
+    """Build an Admission from RATE_LIMIT_IP, RATE_LIMIT_USER, RATE_LIMIT_CONNECTION,
+    RATE_LIMIT_KEYS and MAX_CONCURRENT_WRITES"""
+    max_keys = int(os.environ.get('RATE_LIMIT_KEYS', MAX_KEYS))
+    limits = {}
+    for kind, variable in (('ip', 'RATE_LIMIT_IP'), ('user_id', 'RATE_LIMIT_USER'),
+                           ('connection_id', 'RATE_LIMIT_CONNECTION')):
+        setting = parse_limit(os.environ[variable]) if variable in os.environ else LIMITS[kind]
+        if setting is not None:
+            limits[kind] = RateLimit(*setting, max_keys=max_keys)
+    return Admission(limits, int(os.environ.get('MAX_CONCURRENT_WRITES', MAX_WRITES)))
@@ -0,0 +1,395 @@
+"""
+ASGI front end for the shared service.
+
+``backend/asgi.py`` builds the application; any ASGI server can run it, e.g.
+``uvicorn asgi:app`` from ``backend/``. The routes and the storage layer are
+the same ones Flask and the Vercel functions use:
+
+- the store stays resident in memory, and its thread locks are only ever
+  taken on worker threads, never on the event loop
+- POST routes run one at a time on a single writer thread, so log appends
+  never block the loop or contend with each other; in the ``group``
+  durability mode the writer doesn't wait for fsyncs either, the request's
+  coroutine does, so one fsync still covers many requests
+- other routes run on a pool of reader threads
+- long-polls and SSE streams wait on the event loop itself, as futures woken
+  by ``AsyncWatcher``, so thousands of idle subscribers cost no
+  threads
+"""
+
+import asyncio
+import inspect
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPMessage
+from urllib.parse import parse_qsl
+
+from core import metrics
+from core.assets import PREFIX, Assets
+from core.durability import deferred_waits
+from core.events import HEARTBEAT_INTERVAL, POLL_INTERVAL, bus, format_event
+from core.routing import Router
+from core.admission import RateLimited
+from core.service import (ADMITTED_ROUTES, CORS_HEADERS, ROUTES, Request, Response, Service, admission_keys,
+                          error, failure, found, json_response, wait_timeout)
+
+THREADS = 8
+
+# Routes that only wait for changes; they run on the event loop
+WAITING_ROUTES = frozenset(('wait_for_connection', 'wait_for_transaction',
+                            'connection_events', 'transaction_events'))
+
+_END = object()
+
+
+class AsyncWatcher:
+    """Status waits for coroutines running on one event loop
+
+    Store reads run on ``executor``. Publishes from any thread wake the
+    matching waiters directly, and every ``poll_interval`` seconds all watched
+    records are re-read in a single executor call.
+    """
+
+    def __init__(self, store, executor=None, poll_interval=POLL_INTERVAL):
+        self.store = store
+        self.executor = executor
+        self.poll_interval = poll_interval
+        # (table, record_id) -> {future: status the waiter already knows}
+        self._waiters = {}
+        self._loop = None
+        self._poller = None
+
+    def start(self):
+        """Start watching; must be called from the event loop"""
+        self._loop = asyncio.get_running_loop()
+        self._poller = self._loop.create_task(self._poll())
+        bus.add_listener(self._published)
+        return self
+
+    def stop(self):
+        bus.remove_listener(self._published)
+        if self._poller is not None:
+            self._poller.cancel()
+
+    def _published(self, table, record):
+        # Runs in the publishing thread; a waiter that registers after this
+        # check reads the record after the write, so it can't miss it.
+        if (table, record['id']) in self._waiters:
+            self._loop.call_soon_threadsafe(self._deliver, (table, record['id']), record)
+
+    def _deliver(self, key, record):
+        for future, known_status in list(self._waiters.get(key, {}).items()):
+            if not future.done() and (record is None or record.get('status') != known_status):
+                future.set_result(record)
+
+    def _read(self, keys):
+        return [self.store.get(table, record_id) for table, record_id in keys]
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            if not self._waiters:
+                continue
+            keys = list(self._waiters)
+            try:
+                records = await self._loop.run_in_executor(self.executor, self._read, keys)
+            except Exception:
+                # Retried on the next tick
+                continue
+            for key, record in zip(keys, records):
+                self._deliver(key, record)
+
+    async def wait(self, table, record_id, known_status, timeout):
+        """Wait until a record's status differs from known_status
+
+        Returns the record (None if it doesn't exist) and whether it changed
+        before the timeout.
+        """
+        key = (table, record_id)
+        future = self._loop.create_future()
+        waiters = self._waiters.setdefault(key, {})
+        waiters[future] = known_status
+        try:
+            record = await self._loop.run_in_executor(self.executor, self.store.get, table, record_id)
+            if record is None or record.get('status') != known_status:
+                return record, True
+            try:
+                return await asyncio.wait_for(future, timeout), True
+            except asyncio.TimeoutError:
+                return record, False
+        finally:
+            del waiters[future]
+            if not waiters:
+                del self._waiters[key]
+
+
+class AsyncService(Service):
+    """The shared routes, run from an event loop
+
+    ``threads`` sizes the reader pool; writes always go through one thread.
+    """
+
+    def __init__(self, config, threads=THREADS):
+        super().__init__(config)
+        self.readers = ThreadPoolExecutor(threads, thread_name_prefix='reader')
+        self.writer = ThreadPoolExecutor(1, thread_name_prefix='writer')
+        self._watcher = None
+
+    async def run(self, executor, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+    async def start(self):
+        """Open the database before the first request arrives"""
+        await self.run(self.writer, self.get_db)
+
+    def close(self):
+        if self._watcher is not None:
+            self._watcher.stop()
+        self.readers.shutdown(wait=False)
+        self.writer.shutdown(wait=True)
+
+    def watcher(self):
+        if self._watcher is None:
+            self._watcher = AsyncWatcher(self.get_db(), self.readers).start()
+        return self._watcher
+
+    def handle_write(self, endpoint, request, params):
+        """Run a route, collecting the durability waits of its writes"""
+        with deferred_waits() as waits:
+            return self.dispatch(endpoint, request, params), waits
+
+    async def respond(self, endpoint, request, params):
+        """Run a route off the event loop (or on it, for waits) and return its Response"""
+        if endpoint in ADMITTED_ROUTES:
+            # Admitted on the loop, so the write cap counts requests queued
+            # for the writer as well as the running one
+            try:
+                keys = admission_keys(endpoint, request, params, self.config['TRUSTED_PROXIES'])
+                with self.admission.admit(keys):
+                    return await self.write(endpoint, request, params)
+            except RateLimited as e:
+                return failure(e)
+        if request.method == 'POST':
+            return await self.write(endpoint, request, params)
+        if endpoint not in WAITING_ROUTES:
+            return await self.run(self.readers, self.handle, endpoint, request, params)
+        try:
+            response = getattr(self, endpoint)(request, **params)
+            return await response if inspect.isawaitable(response) else response
+        except Exception as e:
+            return failure(e)
+
+    async def write(self, endpoint, request, params):
+        """Run a route on the writer thread and wait for its writes to be durable"""
+        response, waits = await self.run(self.writer, self.handle_write, endpoint, request, params)
+        for commit, ticket in waits:
+            if not await durable(commit, ticket):
+                return error(500, 'Write could not be made durable')
+        return response
+
+    # Subscriptions
+
+    async def wait_for_status(self, request, table, record_id, key):
+        """Long-poll until a record's status differs from ?status (default: its current one)"""
+        timeout = wait_timeout(request)
+        store = await self.run(self.readers, self.get_db)
+        known_status = request.args.get('status')
+        if known_status is None:
+            record = await self.run(self.readers, store.get, table, record_id)
+            known_status = found(record, key).get('status')
+
+        record, changed = await self.watcher().wait(table, record_id, known_status, timeout)
+        return json_response({'success': True, 'changed': changed, key: store.encode(table, found(record, key))})
+
+    async def stream_events(self, table, record_id, key):
+        """Stream a record's status changes as Server-Sent Events"""
+        store = await self.run(self.readers, self.get_db)
+        record = found(await self.run(self.readers, store.get, table, record_id), key)
+        watcher = self.watcher()
+
+        async def generate(record):
+            # The current state first, then one event per status change
+            yield format_event('status', record).encode()
+            status = record.get('status')
+            while True:
+                record, changed = await watcher.wait(table, record_id, status, HEARTBEAT_INTERVAL)
+                if not record:
+                    yield format_event('deleted', {'id': record_id}).encode()
+                    return
+                if changed:
+                    status = record.get('status')
+                    yield format_event('status', record).encode()
+                else:
+                    # Comment line that keeps proxies from closing an idle stream
+                    yield b': keep-alive\n\n'
+
+        return Response(generate(record), content_type='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+class ServiceApp:
+    """ASGI application serving the API routes plus optional static pages
+
+    ``pages`` maps Flask-style patterns to the names of the files in
+    ``frontend`` served for them; the directory's scripts and stylesheets are
+    served under ``/assets/``.
+    """
+
+    def __init__(self, service, pages=None, frontend=None):
+        self.service = service
+        self.router = Router(ROUTES)
+        self.pages = Router(('GET', pattern, name) for pattern, name in (pages or {}).items())
+        self.assets = Assets(frontend) if frontend is not None else None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.http(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await self.service.start()
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.service.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def http(self, scope, receive, send):
+        started = time.perf_counter()
+        method = scope['method']
+        if method == 'OPTIONS':
+            # Preflight request
+            await self.send(Response(content_type='text/plain'), send, receive)
+            return
+
+        endpoint, params, pattern = self.router.match(method, scope['path'])
+        if endpoint is not None:
+            request = await self.build_request(scope, receive)
+            response = await self.service.respond(endpoint, request, params)
+        else:
+            response, pattern = await self.static(method, scope)
+            if response is None:
+                response = error(405 if params else 404, 'Method not allowed' if params else 'Not found')
+                pattern = 'unmatched'
+        # Streamed responses (exports, SSE) are timed up to their first byte
+        metrics.observe_request(pattern, method, response.status, time.perf_counter() - started)
+        await self.send(response, send, receive)
+
+    async def static(self, method, scope):
+        """Return (response, pattern) for a page or asset, or (None, None)"""
+        if self.assets is None or method != 'GET':
+            return None, None
+        path = scope['path']
+        if path.startswith(PREFIX):
+            name, pattern = path[len(PREFIX):], PREFIX + '<name>'
+        else:
+            name, _, pattern = self.pages.match(method, path)
+            if name is None:
+                return None, None
+        # Files are only read when they change, but a change reads them all
+        response = await self.service.run(self.service.readers, self.assets.respond, name, scope_headers(scope))
+        return response, pattern
+
+    async def build_request(self, scope, receive):
+        chunks = []
+        while True:
+            message = await receive()
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+
+        headers = scope_headers(scope)
+        if 'host' in headers:
+            host = headers['host']
+        else:
+            host = '%s:%d' % tuple(scope.get('server') or ('localhost', 80))
+        # Like Flask, the first value of a repeated parameter wins
+        args = {}
+        for name, value in parse_qsl(scope['query_string'].decode('latin-1'), keep_blank_values=True):
+            args.setdefault(name, value)
+        client = scope.get('client')
+        return Request(scope['method'], scope['path'], args, headers, b''.join(chunks),
+                       f"{scope.get('scheme', 'http')}://{host}/", client[0] if client else None)
+
+    async def send(self, response, send, receive):
+        headers = dict(CORS_HEADERS, **response.headers)
+        if response.status != 304:
+            headers['Content-Type'] = response.content_type
+        if not response.streamed:
+            body = response.body.encode() if isinstance(response.body, str) else response.body
+            # A 304 has no body, and its headers describe the cached one
+            if response.status != 304:
+                headers['Content-Length'] = str(len(body))
+            await send({'type': 'http.response.start', 'status': response.status, 'headers': encode_headers(headers)})
+            await send({'type': 'http.response.body', 'body': body})
+            return
+
+        await send({'type': 'http.response.start', 'status': response.status, 'headers': encode_headers(headers)})
+        # Stop producing as soon as the client goes away, or an SSE stream
+        # would wait for changes forever.
+        pump = asyncio.ensure_future(self.pump(response.body, send))
+        disconnect = asyncio.ensure_future(disconnected(receive))
+        done, _ = await asyncio.wait((pump, disconnect), return_when=asyncio.FIRST_COMPLETED)
+        pump.cancel()
+        disconnect.cancel()
+        if pump in done and not pump.cancelled():
+            pump.result()
+
+    async def pump(self, body, send):
+        try:
+            if hasattr(body, '__aiter__'):
+                async for chunk in body:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            else:
+                # Synchronous generators (exports) read the store between chunks
+                chunks = iter(body)
+                while True:
+                    chunk = await self.service.run(self.service.readers, next, chunks, _END)
+                    if chunk is _END:
+                        break
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            close = getattr(body, 'aclose', None)
+            if close is not None:
+                await close()
+            elif hasattr(body, 'close'):
+                try:
+                    body.close()
+                except ValueError:
+                    # Still running on a reader thread after a disconnect;
+                    # it is closed when collected instead.
+                    pass
+
+
+async def durable(commit, ticket):
+    """Wait on the loop until a write is durable; False if its fsync failed"""
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    commit.notify(ticket, lambda ok: loop.call_soon_threadsafe(future.set_result, ok))
+    return await future
+
+
+async def disconnected(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+def scope_headers(scope):
+    headers = HTTPMessage()
+    for name, value in scope['headers']:
+        headers[name.decode('latin-1')] = value.decode('latin-1')
+    return headers
+
+
+def encode_headers(headers):
+    return [(name.lower().encode('latin-1'), str(value).encode('latin-1')) for name, value in headers.items()]
+
@@ -0,0 +1,154 @@
+"""
+The frontend's pages and scripts, served from memory precompressed and
+content-hashed.
+
+Every file under ``frontend/`` is read once and kept together with gzip and
+brotli versions built at the highest levels. Scripts and stylesheets are also
+published as ``/assets/<name>.<hash>.<ext>`` with a year-long ``immutable``
+``Cache-Control``, and each page's references to them are rewritten to those
+names, so a changed script ships under a new URL instead of waiting for
+caches to expire. Pages keep their URLs, carry a strong ETag and are
+revalidated on every load. Files are read again when they change on disk.
+"""
+
+import os
+import re
+import threading
+import time
+
+from core.negotiation import CODINGS, MIN_SIZE, choose, compress, compressible, content_etag, etag_matches, tagged
+from core.service import Response
+
+PREFIX = '/assets/'
+
+CONTENT_TYPES = {
+    '.html': 'text/html; charset=utf-8',
+    '.js': 'application/javascript; charset=utf-8',
+    '.css': 'text/css; charset=utf-8',
+    '.svg': 'image/svg+xml',
+    '.png': 'image/png',
+    '.ico': 'image/x-icon',
+}
+
+# Files published under a content-hashed name
+HASHED_EXTENSIONS = ('.js', '.css')
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+
+# Seconds between checks of the directory for changed files
+CHECK_INTERVAL = 1.0
+
+
+class Asset:
+    """One file's body, precompressed variants and validators"""
+
+    __slots__ = ('body', 'content_type', 'etag', 'variants', 'immutable')
+
+    def __init__(self, body, content_type, immutable=False):
+        self.body = body
+        self.content_type = content_type
+        self.etag = content_etag(body)
+        self.immutable = immutable
+        self.variants = {}
+        if compressible(content_type) and len(body) >= MIN_SIZE:
+            for coding in CODINGS:
+                compressed = compress(body, coding, static=True)
+                if len(compressed) < len(body):
+                    self.variants[coding] = compressed
+
+    def respond(self, headers):
+        """Answer a GET for this file: a 304, or the best variant the client accepts"""
+        common = {'Cache-Control': IMMUTABLE if self.immutable else REVALIDATE, 'Vary': 'Accept-Encoding'}
+        coding = choose(headers.get('Accept-Encoding')) if self.variants else None
+        if coding not in self.variants:
+            coding = None
+        if etag_matches(headers.get('If-None-Match'), self.etag):
+            # The ETag of the variant a 200 would have sent
+            return Response(b'', 304, content_type=self.content_type,
+                            headers=dict(common, ETag=tagged(self.etag, coding)))
+        if coding is None:
+            return Response(self.body, content_type=self.content_type, headers=dict(common, ETag=self.etag))
+        return Response(self.variants[coding], content_type=self.content_type,
+                        headers=dict(common, ETag=tagged(self.etag, coding), **{'Content-Encoding': coding}))
+
+
+class Assets:
+    """The files of one directory, rebuilt when any of them changes"""
+
+    def __init__(self, root, check_interval=CHECK_INTERVAL):
+        self.root = root
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._signature = None
+        self._checked_at = None
+        # name -> Asset, for both plain and hashed names
+        self._files = {}
+        # plain name -> hashed name
+        self.hashed_names = {}
+
+    def get(self, name):
+        """Return the Asset for a file name or hashed name, or None"""
+        self._refresh()
+        return self._files.get(name)
+
+    def respond(self, name, headers):
+        """Answer a GET for a file, or None if there is no such file"""
+        asset = self.get(name)
+        return asset.respond(headers) if asset is not None else None
+
+    def _scan(self):
+        try:
+            entries = sorted(os.scandir(self.root), key=lambda entry: entry.name)
+        except FileNotFoundError:
+            return ()
+        return tuple((entry.name, entry.stat().st_mtime_ns, entry.stat().st_size)
+                     for entry in entries if entry.is_file())
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < self.check_interval:
+                return
+            signature = self._scan()
+            if signature != self._signature:
+                self._build(signature)
+            self._checked_at = now
+
+    def _build(self, signature):
+        bodies = {}
+        for name, _, _ in signature:
+            with open(os.path.join(self.root, name), 'rb') as f:
+                bodies[name] = f.read()
+
+        files = {}
+        hashed_names = {}
+        for name, body in bodies.items():
+            stem, extension = os.path.splitext(name)
+            if extension in HASHED_EXTENSIONS:
+                hashed = f'{stem}.{content_etag(body)[1:17]}{extension}'
+                hashed_names[name] = hashed
+                files[hashed] = Asset(body, content_type(name), immutable=True)
+
+        # Pages point at the hashed names; relative and root-relative
+        # references are both rewritten.
+        reference = None
+        if hashed_names:
+            reference = re.compile(
+                rb'''((?:src|href)=["'])(?:\./|/)?(''' +
+                b'|'.join(re.escape(name.encode()) for name in hashed_names) + rb''')(["'])''')
+        for name, body in bodies.items():
+            if reference is not None and name.endswith('.html'):
+                body = reference.sub(
+                    lambda m: m.group(1) + (PREFIX + hashed_names[m.group(2).decode()]).encode() + m.group(3), body)
+            files[name] = Asset(body, content_type(name))
+
+        self._files = files
+        self.hashed_names = hashed_names
+        self._signature = signature
+
+
+def content_type(name):
+    return CONTENT_TYPES.get(os.path.splitext(name)[1], 'application/octet-stream')
@@ -0,0 +1,208 @@
+"""
+When a write counts as done: durability modes and the group-commit writer.
+
+Both storage backends append each write to a file (the JSON log, or SQLite's
+``-wal`` file) before they return, so other threads and processes see it at
+once. What differs between the modes is when that file is ``fsync``-ed and
+whether the request waits for it:
+
+- ``sync``: every write is fsynced before the request gets its response,
+  one fsync per request, taken in turn
+- ``group`` (default): a single writer thread fsyncs whatever has been
+  written every ``interval`` seconds, or as soon as ``max_records`` records
+  are waiting, and each request is answered once the fsync covering its write
+  has finished; one fsync serves every request in the batch
+- ``async``: requests are answered as soon as the write is in the OS, and
+  the writer thread fsyncs in the background; a power failure can lose the
+  last ``interval`` seconds of writes, a process crash loses nothing
+
+The mode comes from ``DURABILITY``, the batching knobs from
+``GROUP_COMMIT_INTERVAL`` (seconds) and ``GROUP_COMMIT_RECORDS``.
+
+A thread that must not block, such as the ASGI server's single writer thread,
+runs its writes inside ``deferred_waits()`` and hands the collected tickets
+to ``GroupCommit.notify`` instead.
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+
+SYNC = 'sync'
+GROUP = 'group'
+ASYNC = 'async'
+MODES = (SYNC, GROUP, ASYNC)
+
+GROUP_COMMIT_INTERVAL = 0.001
+GROUP_COMMIT_RECORDS = 512
+
+_local = threading.local()
+
+
+def env_durability():
+    """Return the (mode, interval, max_records) settings from the environment"""
+    mode = os.environ.get('DURABILITY', GROUP).lower()
+    if mode not in MODES:
+        raise ValueError(f'DURABILITY must be one of {", ".join(MODES)}')
+    interval = float(os.environ.get('GROUP_COMMIT_INTERVAL', GROUP_COMMIT_INTERVAL))
+    max_records = int(os.environ.get('GROUP_COMMIT_RECORDS', GROUP_COMMIT_RECORDS))
+    return mode, interval, max_records
+
+
+@contextmanager
+def deferred_waits():
+    """Within the block, wait() returns at once and records (commit, ticket) in the yielded list"""
+    waits = []
+    previous = getattr(_local, 'waits', None)
+    _local.waits = waits
+    try:
+        yield waits
+    finally:
+        _local.waits = previous
+
+
+class GroupCommit:
+    """Make writes durable by calling ``sync`` according to a durability mode
+
+    A writer calls ``written()`` once its write has reached the file and
+    gets a ticket back; ``wait(ticket)`` then blocks until that write is as
+    durable as the mode promises. ``sync`` must make everything written
+    before the call durable.
+    """
+
+    def __init__(self, sync, mode=GROUP, interval=GROUP_COMMIT_INTERVAL, max_records=GROUP_COMMIT_RECORDS):
+        if mode not in MODES:
+            raise ValueError(f'Unknown durability mode: {mode}')
+        self.mode = mode
+        self.interval = interval
+        self.max_records = max_records
+        self._sync = sync
+        self._condition = threading.Condition()
+        # Tickets of the last write, of the last one known to be durable and
+        # of the last one whose fsync failed
+        self._written = 0
+        self._durable = 0
+        self._failed = 0
+        # Records written since the last fsync started
+        self._pending = 0
+        # (ticket, callback) waiting for notify()
+        self._callbacks = []
+        self._stopped = False
+        self._thread = None
+        if mode != SYNC:
+            self._thread = threading.Thread(target=self._run, name='group-commit', daemon=True)
+            self._thread.start()
+
+    @property
+    def ticket(self):
+        """Ticket of the latest write"""
+        return self._written
+
+    def written(self, records=1):
+        """Note a write that has reached the file; returns its ticket"""
+        if self.mode == SYNC:
+            # Each write pays for its own fsync before it returns
+            self._sync()
+            with self._condition:
+                self._written += 1
+                self._durable = self._written
+                return self._written
+        with self._condition:
+            self._written += 1
+            self._pending += records
+            if self._pending == records or self._pending >= self.max_records:
+                self._condition.notify_all()
+            return self._written
+
+    def wait(self, ticket):
+        """Block until the write with this ticket is durable (group mode only)"""
+        if self.mode != GROUP or self._durable >= ticket:
+            return
+        waits = getattr(_local, 'waits', None)
+        if waits is not None:
+            waits.append((self, ticket))
+            return
+        with self._condition:
+            self._condition.wait_for(lambda: self._durable >= ticket or self._failed >= ticket)
+            if self._durable < ticket:
+                raise OSError('Write could not be made durable')
+
+    def notify(self, ticket, callback):
+        """Call callback(durable) once the write with this ticket is settled
+
+        The callback runs on the group-commit thread, or right away when the
+        write is already durable.
+        """
+        with self._condition:
+            if self._durable < ticket and self._failed < ticket:
+                self._callbacks.append((ticket, callback))
+                return
+            durable = self._durable >= ticket
+        callback(durable)
+
+    def _settled(self):
+        """Pop the callbacks whose writes are now durable or failed"""
+        settled = max(self._durable, self._failed)
+        ready = []
+        waiting = []
+        for ticket, callback in self._callbacks:
+            if ticket <= settled:
+                ready.append((callback, ticket <= self._durable))
+            else:
+                waiting.append((ticket, callback))
+        self._callbacks = waiting
+        return ready
+
+    def flush(self):
+        """Make every write so far durable, whatever the mode"""
+        ticket = self._written
+        if self._durable < ticket:
+            self._sync()
+            with self._condition:
+                self._durable = max(self._durable, ticket)
+                self._condition.notify_all()
+                settled = self._settled()
+            _run_callbacks(settled)
+
+    def close(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def _run(self):
+        condition = self._condition
+        while True:
+            with condition:
+                condition.wait_for(lambda: self._written > max(self._durable, self._failed) or self._stopped)
+                if self._stopped:
+                    return
+                # Give more writers up to interval to join this batch
+                condition.wait_for(lambda: self._pending >= self.max_records or self._stopped, self.interval)
+                ticket = self._written
+                self._pending = 0
+            try:
+                self._sync()
+            except OSError:
+                # The requests of this batch fail; the next batch tries again
+                with condition:
+                    self._failed = ticket
+                    condition.notify_all()
+                    settled = self._settled()
+            else:
+                with condition:
+                    self._durable = max(self._durable, ticket)
+                    condition.notify_all()
+                    settled = self._settled()
+            _run_callbacks(settled)
+
+
+def _run_callbacks(settled):
+    for callback, durable in settled:
+        try:
+            callback(durable)
+        except Exception:
+            # The waiter is gone (its event loop has closed, say)
+            pass
@@ -0,0 +1,108 @@
+"""
+In-process notifications of connection and transaction changes.
+
+Routes that change a record publish it on the bus; long-poll and SSE requests
+block on the bus until the record they watch changes. Waiters also re-read
+the record every ``poll_interval`` seconds, which catches changes made by
+other worker processes or by the expiry sweeper without a publish.
+
+The ASGI server's coroutines wait through ``core.asgi.AsyncWatcher`` instead,
+which lives there so the other front ends never import ``asyncio``.
+"""
+
+import threading
+import time
+
+from core import serializer
+
+POLL_INTERVAL = 1.0
+HEARTBEAT_INTERVAL = 15
+
+
+class _Channel:
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.sequence = 0
+        self.subscribers = 0
+
+
+class EventBus:
+    """Wake up whoever is waiting on a record when it is published"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._channels = {}
+        self._listeners = ()
+
+    def publish(self, table, record):
+        with self._lock:
+            channel = self._channels.get((table, record['id']))
+        if channel is not None:
+            with channel.condition:
+                channel.sequence += 1
+                channel.condition.notify_all()
+        for listener in self._listeners:
+            listener(table, record)
+
+    def add_listener(self, listener):
+        """Call listener(table, record) on every publish, in the publishing thread"""
+        with self._lock:
+            self._listeners += (listener,)
+
+    def remove_listener(self, listener):
+        with self._lock:
+            self._listeners = tuple(l for l in self._listeners if l is not listener)
+
+    def subscribe(self, table, record_id):
+        key = (table, record_id)
+        with self._lock:
+            channel = self._channels.get(key)
+            if channel is None:
+                channel = self._channels[key] = _Channel()
+            channel.subscribers += 1
+        return key, channel
+
+    def unsubscribe(self, subscription):
+        key, channel = subscription
+        with self._lock:
+            channel.subscribers -= 1
+            if not channel.subscribers:
+                del self._channels[key]
+
+    def wait(self, subscription, sequence, timeout):
+        """Block until something is published after sequence, or timeout"""
+        channel = subscription[1]
+        with channel.condition:
+            return channel.condition.wait_for(lambda: channel.sequence != sequence, timeout)
+
+
+bus = EventBus()
+
+
+def wait_for_change(store, table, record_id, known_status, timeout, poll_interval=POLL_INTERVAL):
+    """Wait until a record's status differs from known_status
+
+    Returns the record (None if it doesn't exist) and whether it changed
+    before the timeout.
+    """
+    deadline = time.monotonic() + timeout
+    subscription = bus.subscribe(table, record_id)
+    try:
+        while True:
+            # Read the sequence before the record so a publish in between is
+            # not missed.
+            sequence = subscription[1].sequence
+            record = store.get(table, record_id)
+            if record is None or record.get('status') != known_status:
+                return record, True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return record, False
+            bus.wait(subscription, sequence, min(remaining, poll_interval))
+    finally:
+        bus.unsubscribe(subscription)
+
+
+def format_event(event, record):
+    """Encode a record as one Server-Sent Events message"""
+    return f'event: {event}\ndata: {serializer.dumps(record).decode()}\n\n'
@@ -0,0 +1,65 @@
+"""
+Expiry of pending connection requests.
+
+``create_connection`` stamps ``expires_at`` one hour out. Lookups reject a
+connection as soon as that time has passed (``is_expired``), and a background
+sweeper periodically asks the repository to mark due connections ``expired``
+and, optionally, move them out of the hot tables into a cold archive.
+"""
+
+import threading
+import time
+
+EXPIRED = 'expired'
+SWEEP_INTERVAL = 60
+
+
+def is_expired(connection, now=None):
+    """Tell whether a connection can no longer be used"""
+    if connection.get('status') == EXPIRED:
+        return True
+    if connection.get('status') != 'pending':
+        return False
+    expires_at = connection.get('expires_at')
+    if expires_at is None:
+        return False
+    return expires_at <= (now if now is not None else time.time())
+
+
+class Sweeper:
+    """Background thread that expires (and optionally archives) connections"""
+
+    def __init__(self, store, interval=SWEEP_INTERVAL, archive=False):
+        self.store = store
+        self.interval = interval
+        self.archive = archive
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='expiry-sweeper', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.store.expire(archive=self.archive)
+            except Exception:
+                # A failed sweep is retried on the next tick
+                pass
+
+
+_sweepers = {}
+_sweepers_lock = threading.Lock()
+
+
+def ensure_sweeper(store, interval=SWEEP_INTERVAL, archive=False):
+    """Start a sweeper for a store unless one is already running"""
+    if not interval or id(store) in _sweepers:
+        return
+    with _sweepers_lock:
+        if id(store) not in _sweepers:
+            _sweepers[id(store)] = Sweeper(store, interval, archive).start()
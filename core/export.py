@@ -0,0 +1,38 @@
+"""
+Streaming NDJSON export of store tables.
+"""
+
+import zlib
+
+from core import serializer
+
+# Lines are grouped into chunks of about this size before being yielded, so a
+# large export doesn't turn into one tiny write per record.
+CHUNK_SIZE = 64 * 1024
+
+
+def ndjson_chunks(records, chunk_size=CHUNK_SIZE):
+    """Encode records one per line, yielding byte chunks"""
+    buffer = []
+    size = 0
+    for record in records:
+        line = serializer.dumps(record) + b'\n'
+        buffer.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def gzip_chunks(chunks, level=6):
+    """Compress a stream of byte chunks into a single gzip member"""
+    # wbits=31 selects the gzip container rather than raw zlib
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,117 @@
+"""
+Replays of create requests sent with an ``Idempotency-Key`` header.
+
+The first request with a key runs; its response is kept for ``ttl`` seconds,
+and every later request with the same key and body gets that response back
+without writing anything. A request that arrives while the first is still
+running waits for it instead of running too. Reusing a key with a different
+body is an error.
+
+Responses of 5xx are not kept, so a request that failed on the server can be
+retried under the same key. At most ``max_keys`` responses are kept, the
+oldest dropped first. Like rate limits, the cache is per process.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+HEADER = 'Idempotency-Key'
+
+TTL = 24 * 3600
+MAX_KEYS = 100000
+
+# Longest key accepted
+MAX_KEY_LENGTH = 255
+
+# Seconds a duplicate waits for the request it repeats
+WAIT_TIMEOUT = 30
+
+
+class KeyReused(Exception):
+    """The key was first used for a request with a different body"""
+
+
+class KeyInFlight(Exception):
+    """The request this one repeats is still running"""
+
+
+class _Entry:
+    __slots__ = ('fingerprint', 'expires_at', 'result', 'done')
+
+    def __init__(self, fingerprint, expires_at):
+        self.fingerprint = fingerprint
+        self.expires_at = expires_at
+        self.result = None
+        self.done = threading.Event()
+
+
+class IdempotencyCache:
+    """Results of recent requests, by idempotency key"""
+
+    def __init__(self, ttl=TTL, max_keys=MAX_KEYS):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        # key -> _Entry, oldest first
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def run(self, key, body, func, keep):
+        """Return (result, replayed): func()'s result, or the kept result of an earlier call
+
+        ``keep(result)`` tells whether a result may be replayed; if not, the
+        key is released and requests waiting on it run func themselves.
+        """
+        fingerprint = hashlib.blake2b(body, digest_size=16).digest()
+        while True:
+            now = time.monotonic()
+            with self._lock:
+                self._expire(now)
+                entry = self._entries.get(key)
+                if entry is None:
+                    entry = self._entries[key] = _Entry(fingerprint, now + self.ttl)
+                    break
+            if entry.fingerprint != fingerprint:
+                raise KeyReused(f'{HEADER} was already used for a different request')
+            if not entry.done.wait(WAIT_TIMEOUT):
+                raise KeyInFlight(f'A request with this {HEADER} is still in progress')
+            if entry.result is not None:
+                return entry.result, True
+            # The first request's result wasn't kept; try again
+
+        try:
+            result = func()
+        except BaseException:
+            self._release(key, entry)
+            raise
+        if keep(result):
+            entry.result = result
+            entry.done.set()
+        else:
+            self._release(key, entry)
+        return result, False
+
+    def _release(self, key, entry):
+        with self._lock:
+            if self._entries.get(key) is entry:
+                del self._entries[key]
+        entry.done.set()
+
+    def _expire(self, now):
+        entries = self._entries
+        while entries:
+            key, entry = next(iter(entries.items()))
+            if entry.expires_at > now and len(entries) < self.max_keys:
+                break
+            del entries[key]
+
+
+def env_idempotency():
+    """Build an IdempotencyCache from IDEMPOTENCY_TTL and IDEMPOTENCY_KEYS"""
+    return IdempotencyCache(float(os.environ.get('IDEMPOTENCY_TTL', TTL)),
+                            int(os.environ.get('IDEMPOTENCY_KEYS', MAX_KEYS)))
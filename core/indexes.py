@@ -0,0 +1,85 @@
+"""
+Secondary indexes kept alongside the in-memory tables.
+
+Every index entry is a sort key ``(created_at, id)``, so each bucket is
+already in creation order and can be paged through with ``bisect``.
+"""
+
+from bisect import bisect_left, insort
+
+# Fields indexed per table. The primary id index is kept by the store itself.
+INDEXED_FIELDS = {
+    'connections': ('user_id', 'wallet_address', 'status'),
+    'transactions': ('connection_id', 'status'),
+}
+
+# Values an index holds. A record with anything else in an indexed field (a
+# list or object sent by a client) is stored, but that index doesn't find it.
+SCALARS = (str, int, float, bool)
+
+
+def sort_key(record):
+    """Return the key records are ordered by"""
+    # Stored records carry theirs, so the order list and every index share
+    # one tuple per record
+    key = getattr(record, 'key', None)
+    if key is not None:
+        return key
+    return (record.get('created_at') or '', record['id'])
+
+
+def add_key(keys, key):
+    """Insert a key into a sorted list, appending when it is the newest"""
+    if not keys or keys[-1] < key:
+        keys.append(key)
+    else:
+        insort(keys, key)
+
+
+def remove_key(keys, key):
+    position = bisect_left(keys, key)
+    if position < len(keys) and keys[position] == key:
+        del keys[position]
+
+
+class Index:
+    """Map each value of a field to the sorted keys of the records holding it"""
+
+    def __init__(self, field):
+        self.field = field
+        self._entries = {}
+
+    def add(self, record):
+        value = record.get(self.field)
+        if isinstance(value, SCALARS):
+            add_key(self._entries.setdefault(value, []), sort_key(record))
+
+    def remove(self, record):
+        value = record.get(self.field)
+        keys = self._entries.get(value) if isinstance(value, SCALARS) else None
+        if keys is not None:
+            remove_key(keys, sort_key(record))
+            if not keys:
+                del self._entries[value]
+
+    def keys(self, value):
+        """Return the live, sorted key list for a value; do not modify it"""
+        return self._entries.get(value, []) if isinstance(value, SCALARS) else []
+
+    def ids(self, value):
+        """Return the ids holding a value, oldest first"""
+        return [key[1] for key in self.keys(value)]
+
+    def count(self, value):
+        return len(self.keys(value))
+
+    def clear(self):
+        self._entries = {}
+
+
+def build_indexes():
+    """Return a fresh set of empty indexes for every table"""
+    return {
+        table: {field: Index(field) for field in fields}
+        for table, fields in INDEXED_FIELDS.items()
+    }
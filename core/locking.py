@@ -0,0 +1,77 @@
+"""
+Locks that serialize writers across threads and processes.
+"""
+
+import os
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+
+class FileLock:
+    """Reentrant lock held across threads (via thread_lock) and processes
+
+    The process-level part is an ``fcntl`` advisory lock on ``path``, taken
+    when the outermost ``with`` block is entered and released when it exits.
+    """
+
+    def __init__(self, path, thread_lock):
+        self.path = path
+        self._thread_lock = thread_lock
+        self._depth = 0
+        self._fd = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if self._depth == 0 and fcntl is not None:
+            try:
+                if self._fd is None:
+                    self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            except BaseException:
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        try:
+            if self._depth == 0 and fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        finally:
+            self._thread_lock.release()
+
+    @property
+    def held(self):
+        """True while some thread holds the lock
+
+        Only meaningful to a caller already holding thread_lock, in which case
+        it means the caller itself holds this lock.
+        """
+        return self._depth > 0
+
+
+def lock_file(path, blocking=True):
+    """Take an exclusive lock on path
+
+    Returns an open file descriptor to pass to unlock_file(), or None if the
+    lock is held by another process and blocking is False.
+    """
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    if fcntl is None:
+        return fd
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    return fd
+
+
+def unlock_file(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    os.close(fd)
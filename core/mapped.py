@@ -0,0 +1,264 @@
+"""
+Binary companion to the JSON snapshot, read through ``mmap``.
+
+Whenever the JSON log store writes a snapshot it also writes
+``<snapshot>.map``, built from the same encoded records:
+
+- a header: magic, the JSON snapshot's signature (inode, mtime, size), then
+  per table its record count and where its id table starts, and where the
+  precomputed per-status counts are
+- the records' ids and JSON, back to back
+- per table, an id table sorted by id, of fixed-size entries
+  ``(id offset, id length, record offset, record length)``
+- the counts, as ``{table: {'total': n, 'by_status': {...}}}`` JSON
+
+``MappedView`` serves ``get`` by binary search over the id table, and
+``stats`` from the header, layering whatever the log holds on top, so a fresh
+process answers those without decoding the snapshot. A ``.map`` whose
+signature doesn't match the JSON snapshot next to it is ignored.
+"""
+
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import Counter
+
+from core import serializer
+from core.records import check_record, load_record, make_record
+from core.repository import TABLES
+
+MAGIC = b'WCSNAP01'
+# magic, snapshot inode, mtime_ns, size, then (count, id table offset) per
+# table and (offset, length) of the counts
+HEADER = struct.Struct('<8s3Q' + 'QQ' * len(TABLES) + 'QQ')
+ENTRY = struct.Struct('<QIQI')
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotWriter:
+    """Collect encoded records while a snapshot is written, then write the .map file"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'wb')
+        self._file.write(b'\0' * HEADER.size)
+        self._offset = HEADER.size
+        # table -> [(id, record offset, record length)]
+        self._entries = {table: [] for table in TABLES}
+        self._counts = {table: Counter() for table in TABLES}
+
+    def add(self, table, record, data):
+        record_id = str(record['id']).encode()
+        self._file.write(record_id)
+        self._file.write(data)
+        self._entries[table].append((record_id, self._offset + len(record_id), len(data)))
+        self._offset += len(record_id) + len(data)
+        self._counts[table][record.get('status')] += 1
+
+    def finish(self, signature):
+        """Write the id tables, counts and header for the JSON snapshot with this signature"""
+        tables = []
+        for table in TABLES:
+            entries = sorted(self._entries[table])
+            tables += [len(entries), self._offset]
+            self._file.write(b''.join(ENTRY.pack(offset - len(record_id), len(record_id), offset, length)
+                                      for record_id, offset, length in entries))
+            self._offset += ENTRY.size * len(entries)
+        counts = json.dumps({
+            table: {'total': sum(counter.values()), 'by_status': dict(counter)}
+            for table, counter in self._counts.items()
+        }).encode()
+        self._file.write(counts)
+        self._file.seek(0)
+        self._file.write(HEADER.pack(MAGIC, *signature, *tables, self._offset, len(counts)))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+    def discard(self):
+        self._file.close()
+        os.remove(self.path)
+
+
+class MappedSnapshot:
+    """A .map file mapped into memory"""
+
+    def __init__(self, path, signature):
+        """Map path; raises ValueError unless it describes the snapshot with this signature"""
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map.size() < HEADER.size:
+            raise ValueError('Truncated snapshot map')
+        fields = HEADER.unpack_from(self._map)
+        if fields[0] != MAGIC or tuple(fields[1:4]) != tuple(signature):
+            raise ValueError('Snapshot map does not match the snapshot')
+        self._tables = {table: (fields[4 + 2 * i], fields[5 + 2 * i]) for i, table in enumerate(TABLES)}
+        counts_offset, counts_length = fields[-2:]
+        self.counts = json.loads(self._map[counts_offset:counts_offset + counts_length])
+
+    def get(self, table, record_id):
+        """Return the encoded record with this id, or None"""
+        count, start = self._tables[table]
+        target = str(record_id).encode()
+        data = self._map
+        lo, hi = 0, count
+        while lo < hi:
+            middle = (lo + hi) // 2
+            id_offset, id_length, offset, length = ENTRY.unpack_from(data, start + middle * ENTRY.size)
+            found = data[id_offset:id_offset + id_length]
+            if found == target:
+                return serializer.Fragment(data[offset:offset + length])
+            if found < target:
+                lo = middle + 1
+            else:
+                hi = middle
+        return None
+
+
+class Stale(Exception):
+    """The files changed in a way the view can't follow; open a new one"""
+
+
+class MappedView:
+    """Lookups and counts from a mapped snapshot plus the log written since
+
+    ``get`` and ``stats`` check for new log entries at most every
+    ``refresh_interval`` seconds and raise ``Stale`` once the snapshot has been
+    replaced or the log rotated.
+    """
+
+    def __init__(self, snapshot, path, signature, log_path, compacting_path, refresh_interval):
+        self.snapshot = snapshot
+        self.path = path
+        self.signature = signature
+        self.log_path = log_path
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        # table -> {id: record, or None once deleted}
+        self._overlay = {table: {} for table in TABLES}
+        self._counts = {table: {'total': counts['total'], 'by_status': Counter(counts['by_status'])}
+                        for table, counts in (snapshot.counts.items() if snapshot else ())}
+        for table in TABLES:
+            self._counts.setdefault(table, {'total': 0, 'by_status': Counter()})
+        self._log_inode = None
+        self._log_offset = 0
+        self._checked_at = time.monotonic()
+        # As in Store._load: the live log is opened before the compacting
+        # segment is looked for, so a rotation in between can't hide entries
+        try:
+            log = open(log_path, 'rb')
+        except FileNotFoundError:
+            log = None
+        try:
+            with open(compacting_path, 'rb') as f:
+                self._replay(f)
+        except FileNotFoundError:
+            pass
+        if log is not None:
+            with log:
+                self._log_inode = os.fstat(log.fileno()).st_ino
+                self._log_offset = self._replay(log)
+        if signature_of(path) != signature:
+            raise Stale()
+
+    def get(self, table, record_id):
+        self.refresh()
+        overlay = self._overlay[table]
+        if record_id in overlay:
+            return overlay[record_id]
+        return self._mapped(table, record_id)
+
+    def stats(self):
+        self.refresh()
+        with self._lock:
+            return {table: {'total': counts['total'], 'by_status': dict(+counts['by_status'])}
+                    for table, counts in self._counts.items()}
+
+    def version(self):
+        """Return a token that changes whenever what the view serves may have"""
+        self.refresh()
+        inode, mtime, size = self.signature or (0, 0, 0)
+        return f'm{inode:x}.{mtime:x}.{self._log_inode or 0:x}.{self._log_offset:x}'
+
+    def refresh(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.refresh_interval:
+            return
+        with self._lock:
+            self._catch_up(now)
+
+    def _mapped(self, table, record_id):
+        if self.snapshot is None:
+            return None
+        data = self.snapshot.get(table, record_id)
+        return load_record(table, data) if data is not None else None
+
+    def _catch_up(self, now):
+        self._checked_at = now
+        if signature_of(self.path) != self.signature:
+            raise Stale()
+        try:
+            f = open(self.log_path, 'rb')
+        except FileNotFoundError:
+            if self._log_inode is not None:
+                raise Stale()
+            return
+        with f:
+            st = os.fstat(f.fileno())
+            if self._log_inode is not None and (st.st_ino != self._log_inode or st.st_size < self._log_offset):
+                raise Stale()
+            self._log_inode = st.st_ino
+            if st.st_size > self._log_offset:
+                self._log_offset = self._replay(f, self._log_offset)
+
+    def _replay(self, f, offset=0):
+        """Apply complete log entries from offset on; returns the offset past the last one"""
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            try:
+                self._replay_entry(json.loads(line))
+            except (AttributeError, KeyError, TypeError, ValueError) as e:
+                # Skipped, as Store._replay does
+                logger.warning('Skipping log entry at %s:%d that cannot be applied: %r', f.name, offset, e)
+            offset += len(line)
+        return offset
+
+    def _replay_entry(self, entry):
+        table = entry['table']
+        if entry.get('op') == 'delete':
+            self._put(table, entry['id'], None)
+            return
+        records = entry['records'] if entry.get('op') == 'put_many' else [entry['record']]
+        records = [make_record(table, record) for record in records]
+        for record in records:
+            check_record(record)
+        for record in records:
+            self._put(table, record['id'], record)
+
+    def _put(self, table, record_id, record):
+        overlay = self._overlay[table]
+        previous = overlay[record_id] if record_id in overlay else self._mapped(table, record_id)
+        counts = self._counts[table]
+        if previous is not None:
+            counts['total'] -= 1
+            counts['by_status'][previous.get('status')] -= 1
+        if record is not None:
+            counts['total'] += 1
+            counts['by_status'][record.get('status')] += 1
+        overlay[record_id] = record
+
+
+def signature_of(path):
+    """Return what changes when a file is replaced or written: (inode, mtime, size), or None"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
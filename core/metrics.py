@@ -0,0 +1,159 @@
+"""
+Request and storage metrics in the Prometheus text format.
+
+Latencies go into fixed-bucket histograms, so recording one costs a bisect
+and a few additions under a lock. Gauges such as record counts and file
+sizes are only computed when ``/api/metrics`` is scraped. Every process keeps
+its own numbers; with several workers each one is scraped separately.
+
+Storage time is broken out by ``operation``:
+
+- ``load``: reading the snapshot, log or database from disk
+- ``save``: appending to the log, writing snapshots, committing to SQLite
+- ``sync``: fsyncing the log or SQLite's write-ahead log; with group commit
+  one fsync covers a whole batch of writes
+- ``scan``: walking records for lists, lookups by field, stats and exports
+- ``encode``: serializing response bodies to JSON (record encodings cached by
+  the store are reused, so this mostly covers the envelope around them)
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+
+from core import serializer
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Files that make up a database next to its main path, for either backend
+DATABASE_FILE_SUFFIXES = ('', '.wal', '.wal.compacting', '.map', '.archive.ndjson', '-wal', '-shm')
+
+
+class Histogram:
+    """Latency distribution per label set"""
+
+    def __init__(self, name, help_text, label_names, buckets=BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # labels -> [count per bucket (last one is +Inf), sum]
+        self._series = {}
+
+    def observe(self, labels, value):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted((labels, list(counts), total) for labels, (counts, total) in self._series.items())
+        for labels, counts, total in series:
+            base = _labels(self.label_names, labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f'{self.name}_bucket{{{base + "," if base else ""}{le}}} {cumulative}')
+            suffix = f'{{{base}}}' if base else ''
+            lines.append(f'{self.name}_sum{suffix} {total}')
+            lines.append(f'{self.name}_count{suffix} {cumulative}')
+        return lines
+
+
+def _labels(names, values):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'Time to handle a request, by route',
+    ('route', 'method', 'status'))
+STORE_DURATION = Histogram(
+    'store_operation_duration_seconds', 'Time spent in the storage layer, by operation',
+    ('operation',))
+
+
+def observe_request(route, method, status, seconds):
+    REQUEST_DURATION.observe((route, method, str(status)), seconds)
+
+
+def timed(operation):
+    """Decorator recording a function's run time under a storage operation"""
+    labels = (operation,)
+
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                STORE_DURATION.observe(labels, time.perf_counter() - started)
+        return wrapper
+    return decorate
+
+
+@timed('encode')
+def dumps(obj):
+    """serializer.dumps, timed as encoding"""
+    return serializer.dumps(obj)
+
+
+def render(store=None):
+    """Return every metric, plus gauges read from the store, as exposition text"""
+    lines = REQUEST_DURATION.render() + STORE_DURATION.render()
+    if store is not None:
+        lines += _store_gauges(store)
+    rss = _resident_memory()
+    if rss is not None:
+        lines += ['# HELP process_resident_memory_bytes Resident memory size in bytes',
+                  '# TYPE process_resident_memory_bytes gauge',
+                  f'process_resident_memory_bytes {rss}']
+    return '\n'.join(lines) + '\n'
+
+
+def _store_gauges(store):
+    stats = store.stats()
+    lines = ['# HELP wallet_records Records stored, by table and status', '# TYPE wallet_records gauge']
+    for table, counts in stats.items():
+        for status, count in sorted(counts['by_status'].items(), key=lambda item: str(item[0])):
+            lines.append(f'wallet_records{{{_labels(("table", "status"), (table, status))}}} {count}')
+    lines += ['# HELP database_file_bytes Size of the database files on disk', '# TYPE database_file_bytes gauge']
+    # A sharded store lists the files of its shards
+    for base in getattr(store, 'paths', None) or (store.path,):
+        for suffix in DATABASE_FILE_SUFFIXES:
+            path = base + suffix
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                continue
+            lines.append(f'database_file_bytes{{file="{_escape(os.path.basename(path))}"}} {size}')
+    lines += ['# HELP store_generation Changes seen by this process\'s store', '# TYPE store_generation counter',
+              f'store_generation {store.generation}']
+    return lines
+
+
+def _resident_memory():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
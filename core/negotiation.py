@@ -0,0 +1,120 @@
+"""
+Content codings and validators shared by every front end.
+
+``choose`` picks ``br`` or ``gzip`` from an ``Accept-Encoding`` header,
+``compress`` applies it, and ``etag_matches`` evaluates ``If-None-Match``.
+Brotli is used when the ``brotli`` package is installed; gzip always works.
+
+A compressed representation gets its own strong ETag, the identity one with
+``-gzip`` or ``-br`` appended, and ``etag_matches`` accepts any of them, so a
+client keeps getting 304s after switching codings. A 304 carries the ETag of
+the representation the client would have been sent, see ``held``.
+"""
+
+import gzip
+import hashlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Smaller bodies go out as they are; compressing them saves nothing
+MIN_SIZE = 1024
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/', 'application/javascript', 'image/svg+xml')
+
+# Responses are compressed per request, so favour speed (on JSON, higher
+# levels cost several times the CPU for a few percent); static files are
+# compressed once, so favour size.
+LEVELS = {'gzip': 1, 'br': 1}
+STATIC_LEVELS = {'gzip': 9, 'br': 11}
+
+# Codings this process can produce, most preferred first
+CODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+SUFFIXES = ('-br"', '-gzip"')
+
+
+def choose(accept_encoding):
+    """Return the preferred coding the client accepts, or None for identity"""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for item in accept_encoding.split(','):
+        name, _, params = item.partition(';')
+        weight = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip().lower()] = weight
+    best = None
+    for coding in CODINGS:
+        weight = weights.get(coding, weights.get('*', 0.0))
+        if weight > 0 and (best is None or weight > best[1]):
+            best = (coding, weight)
+    return best[0] if best else None
+
+
+def compressible(content_type):
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def compress(body, coding, static=False):
+    level = (STATIC_LEVELS if static else LEVELS)[coding]
+    if coding == 'br':
+        return brotli.compress(body, quality=level)
+    # mtime=0 keeps the output, and so a static file's ETag, reproducible
+    return gzip.compress(body, level, mtime=0)
+
+
+def content_etag(data):
+    """Strong ETag for a body or an encoded record"""
+    return '"' + hashlib.blake2b(data, digest_size=12).hexdigest() + '"'
+
+
+def tagged(etag, coding):
+    """Return the ETag of a representation in the given coding"""
+    if coding is None:
+        return etag
+    return etag[:-1] + '-' + coding + '"'
+
+
+def _candidates(if_none_match):
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        # If-None-Match uses the weak comparison
+        yield candidate[2:] if candidate.startswith('W/') else candidate
+
+
+def held(if_none_match, etag, coding):
+    """Return the ETag a 304 should carry when the client accepts coding
+
+    Only bodies of ``MIN_SIZE`` or more are compressed, which a 304 cannot
+    tell without building the body; the validator the client sent says which
+    representation it holds. A client holding only the identity one is
+    answered with that, as a small body goes out uncompressed.
+    """
+    coded = tagged(etag, coding)
+    candidates = set(_candidates(if_none_match or ''))
+    if coded in candidates or etag not in candidates:
+        return coded
+    return etag
+
+
+def etag_matches(if_none_match, etag):
+    """Evaluate an If-None-Match header against the identity ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    for candidate in _candidates(if_none_match):
+        for suffix in SUFFIXES:
+            if candidate.endswith(suffix):
+                candidate = candidate[:-len(suffix)] + '"'
+                break
+        if candidate == etag:
+            return True
+    return False
@@ -0,0 +1,91 @@
+"""
+Query parameter handling shared by the list endpoints.
+
+List endpoints accept:
+
+- ``limit``: page size (default 100, max 1000)
+- ``cursor``: opaque token returned as ``next_cursor`` by the previous page
+- ``order``: ``asc`` (oldest first, default) or ``desc``
+- ``since`` / ``until``: ``created_at`` range, inclusive / exclusive
+- ``fields``: comma-separated list of fields to return
+- any indexed field of the table (e.g. ``status``, ``user_id``) as a filter
+"""
+
+import base64
+import binascii
+import json
+
+from core.indexes import INDEXED_FIELDS
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+LIST_PARAMS = ('limit', 'cursor', 'order', 'since', 'until', 'fields')
+
+
+class QueryError(ValueError):
+    """Raised for malformed list parameters"""
+
+
+def encode_cursor(key):
+    if key is None:
+        return None
+    raw = json.dumps(list(key), separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        key = json.loads(raw)
+    except (binascii.Error, ValueError, TypeError):
+        raise QueryError('Invalid cursor')
+    # Compared against the stores' (created_at, id) string keys; a dict or a
+    # two-character string would unpack into two strings as well
+    if not (isinstance(key, list) and len(key) == 2 and all(isinstance(part, str) for part in key)):
+        raise QueryError('Invalid cursor')
+    return tuple(key)
+
+
+def wants_page(table, args):
+    """Tell whether any list parameter or filter was given"""
+    return any(name in args for name in LIST_PARAMS + INDEXED_FIELDS[table])
+
+
+def parse_list_args(table, args, fixed_filters=None):
+    """Turn request parameters into Store.query() arguments and a field list
+
+    ``args`` is any mapping of parameter name to a single string value.
+    """
+    filters = {field: args[field] for field in INDEXED_FIELDS[table] if field in args}
+    filters.update(fixed_filters or {})
+
+    try:
+        limit = int(args.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise QueryError('limit must be an integer')
+    if not 1 <= limit <= MAX_LIMIT:
+        raise QueryError(f'limit must be between 1 and {MAX_LIMIT}')
+
+    order = args.get('order', 'asc')
+    if order not in ('asc', 'desc'):
+        raise QueryError('order must be asc or desc')
+
+    cursor = args.get('cursor')
+    fields = [f for f in args.get('fields', '').split(',') if f] or None
+
+    query = {
+        'filters': filters,
+        'since': args.get('since'),
+        'until': args.get('until'),
+        'after': decode_cursor(cursor) if cursor else None,
+        'limit': limit,
+        'descending': order == 'desc',
+    }
+    return query, fields
+
+
+def project(record, fields):
+    """Keep only the requested fields of a record"""
+    if not fields:
+        return record
+    return {field: record[field] for field in fields if field in record}
@@ -0,0 +1,236 @@
+"""
+Compact in-memory record types for connections and transactions.
+
+A record keeps its known fields in ``__slots__`` instead of a per-row dict,
+with any other field in a small ``extra`` dict, so a large table no longer
+pays for a hash table per row. On top of that:
+
+- values that repeat across rows are interned, so they share one string:
+  statuses, networks, user ids, wallet addresses, and the connection id and
+  sender address every transaction copies from its connection
+- ``connected_at``, ``expired_at`` and ``updated_at`` are held as integer
+  microseconds since 1970-01-01, on the same naive local clock the ISO
+  strings use; values that aren't canonical ``datetime.isoformat()`` output
+  are kept verbatim in ``extra``
+- the ``(created_at, id)`` sort key is built once, and the store's order
+  list and every index share that one tuple
+- an empty ``metadata`` dict is not allocated per row, and the keys of a
+  non-empty one are interned
+
+``created_at`` stays a string: records are ordered, paged and filtered by it,
+and the sort key needs it in that form anyway.
+
+Records read like a read-only mapping (``record['status']``,
+``record.get('hash')``, ``'network' in record``) and ``to_dict()`` returns the
+exact wire format, with known fields in their usual order. A stored record is
+never modified; ``merge()`` returns a new version.
+"""
+
+import sys
+from collections.abc import Mapping
+from datetime import datetime, timedelta
+
+from core import serializer
+from core.indexes import SCALARS
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+# Field kinds
+PLAIN = 'plain'
+TIMESTAMP = 'timestamp'
+INTERNED = 'interned'
+METADATA = 'metadata'
+
+# Returned for fields the record doesn't have (their slots are left unset)
+_ABSENT = object()
+# Slot value standing in for an empty metadata dict
+_EMPTY = object()
+
+
+def encode_timestamp(value):
+    """Return microseconds since the epoch for a canonical naive ISO string, else None"""
+    if type(value) is not str:
+        return None
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if moment.tzinfo is not None or moment.isoformat() != value:
+        return None
+    return (moment - EPOCH) // MICROSECOND
+
+
+def decode_timestamp(micros):
+    return (EPOCH + micros * MICROSECOND).isoformat()
+
+
+def _kinds(fields, timestamps=(), interned=(), metadata=()):
+    kinds = dict.fromkeys(fields, PLAIN)
+    kinds.update(dict.fromkeys(timestamps, TIMESTAMP))
+    kinds.update(dict.fromkeys(interned, INTERNED))
+    kinds.update(dict.fromkeys(metadata, METADATA))
+    return kinds
+
+
+class Record(Mapping):
+    """Base of the stored record types; built from a wire-format dict"""
+
+    __slots__ = ('key', 'extra', '_json')
+
+    # Known fields in wire order, and how each one is held
+    FIELDS = ()
+    KINDS = {}
+
+    def __init__(self, data):
+        self.extra = None
+        self._json = None
+        kinds = self.KINDS
+        for name, value in data.items():
+            kind = kinds.get(name)
+            if kind is PLAIN:
+                setattr(self, name, value)
+            else:
+                self._set(name, kind, value)
+        try:
+            record_id = self.id
+        except AttributeError:
+            raise KeyError('id')
+        self.key = (getattr(self, 'created_at', None) or '', record_id)
+
+    def _set(self, name, kind, value):
+        if kind is TIMESTAMP:
+            micros = encode_timestamp(value)
+            if micros is None:
+                kind = None
+            else:
+                value = micros
+        elif kind is INTERNED:
+            if type(value) is str:
+                value = sys.intern(value)
+        elif kind is METADATA:
+            if type(value) is dict:
+                value = {sys.intern(k) if type(k) is str else k: v for k, v in value.items()} if value else _EMPTY
+
+        if kind is None:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[name] = value
+        else:
+            setattr(self, name, value)
+
+    def get(self, name, default=None):
+        kind = self.KINDS.get(name)
+        value = _ABSENT if kind is None else getattr(self, name, _ABSENT)
+        if value is _ABSENT:
+            if self.extra is not None:
+                return self.extra.get(name, default)
+            return default
+        if kind is TIMESTAMP:
+            return decode_timestamp(value)
+        if value is _EMPTY:
+            return {}
+        return value
+
+    def __getitem__(self, name):
+        value = self.get(name, _ABSENT)
+        if value is _ABSENT:
+            raise KeyError(name)
+        return value
+
+    def __contains__(self, name):
+        return self.get(name, _ABSENT) is not _ABSENT
+
+    def __iter__(self):
+        for name in self.FIELDS:
+            if getattr(self, name, _ABSENT) is not _ABSENT:
+                yield name
+        if self.extra is not None:
+            yield from self.extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.to_dict()!r})'
+
+    def to_dict(self):
+        """Return the record in its wire format"""
+        data = {}
+        for name in self.FIELDS:
+            value = self.get(name, _ABSENT)
+            if value is not _ABSENT:
+                data[name] = value
+        if self.extra is not None:
+            data.update(self.extra)
+        return data
+
+    def to_json(self, cache=True):
+        """Return the record's JSON as a serializer.Fragment, encoded at most once"""
+        data = self._json
+        if data is None:
+            data = serializer.encode(self.to_dict())
+            if cache:
+                self._json = data
+        return data
+
+    def merge(self, changes):
+        """Return a new version of the record with changes applied; its id never changes"""
+        data = self.to_dict()
+        data.update(changes)
+        # The stores key the write on the merged id, so a changed one would
+        # store a second record instead of updating this one
+        data['id'] = self['id']
+        return type(self)(data)
+
+
+class Connection(Record):
+    """A wallet connection request"""
+
+    FIELDS = ('id', 'user_id', 'status', 'created_at', 'wallet_address', 'network',
+              'expires_at', 'metadata', 'connected_at', 'expired_at')
+    KINDS = _kinds(FIELDS, timestamps=('connected_at', 'expired_at'),
+                   interned=('id', 'user_id', 'status', 'wallet_address', 'network'),
+                   metadata=('metadata',))
+    __slots__ = FIELDS
+
+
+class Transaction(Record):
+    """A transaction request against a connection"""
+
+    FIELDS = ('id', 'connection_id', 'from_address', 'to_address', 'amount', 'status',
+              'created_at', 'hash', 'gas_used', 'gas_price', 'updated_at')
+    KINDS = _kinds(FIELDS, timestamps=('updated_at',),
+                   interned=('connection_id', 'from_address', 'status'))
+    __slots__ = FIELDS
+
+
+RECORD_TYPES = {'connections': Connection, 'transactions': Transaction}
+
+
+def make_record(table, data):
+    """Return data as the table's record type; records of that type pass through"""
+    cls = RECORD_TYPES[table]
+    return data if type(data) is cls else cls(data)
+
+
+def check_record(record):
+    """Raise ValueError unless the stores can hold a record
+
+    They key it on its id, order it by created_at and count it by status, so
+    those must be a string, a string and a scalar.
+    """
+    if type(record['id']) is not str or not record['id']:
+        raise ValueError('id must be a non-empty string')
+    if not isinstance(record.get('created_at') or '', str):
+        raise ValueError('created_at must be a string')
+    status = record.get('status')
+    if status is not None and not isinstance(status, SCALARS):
+        raise ValueError('status must be a string')
+
+
+def load_record(table, data):
+    """Decode a record from its stored JSON, keeping those bytes as its encoding"""
+    record = RECORD_TYPES[table](serializer.loads(data))
+    record._json = serializer.Fragment(data)
+    return record
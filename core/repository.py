@@ -0,0 +1,202 @@
+"""
+Storage backends and the process-wide registry that hands them out.
+
+Every route in ``backend/server.py`` and every handler in ``api/`` talks to
+the database through the ``Repository`` interface below. Two backends
+implement it:
+
+- ``core.store.Store``: the append-only JSON log store (default)
+- ``core.sqlite_store.SQLiteStore``: SQLite with WAL journaling
+
+The backend is picked from ``DATABASE_BACKEND`` (``json`` or ``sqlite``) or,
+failing that, from the database file's extension. Either backend fsyncs its
+writes as ``DURABILITY`` says (see ``core.durability``). A database can also
+be split across several files of either backend (``core.sharding``).
+"""
+
+import os
+import threading
+
+from core.durability import env_durability
+from core.records import make_record
+
+TABLES = ('connections', 'transactions')
+SQLITE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+
+
+class Repository:
+    """Operations every storage backend provides
+
+    Records go in as dicts (or records) with at least ``id`` and
+    ``created_at`` and come back as ``core.records`` objects, which read like
+    read-only dicts. Tables are ``connections`` and ``transactions``.
+    """
+
+    # Changes whenever the stored data changes, in this or another process
+    generation = 0
+
+    def insert(self, table, record):
+        """Store a new record and return it"""
+        raise NotImplementedError
+
+    def insert_many(self, table, records):
+        """Store several new records in one write and return them"""
+        for record in records:
+            self.insert(table, record)
+        return records
+
+    def update(self, table, record_id, changes):
+        """Merge changes into a record, returning the new version or None; an id in changes is ignored"""
+        raise NotImplementedError
+
+    def update_many(self, table, patches):
+        """Apply (record_id, changes) pairs in one atomic write
+
+        Returns the new version of each record, or None for ids that don't
+        exist, in the order given.
+        """
+        return [self.update(table, record_id, changes) for record_id, changes in patches]
+
+    def replace(self, data):
+        """Replace the whole database with the given tables"""
+        raise NotImplementedError
+
+    def data(self):
+        """Return every record in the original ``{table: [records]}`` layout"""
+        raise NotImplementedError
+
+    def encode(self, table, record):
+        """Return a record's JSON encoding as a ``serializer.Fragment``"""
+        return make_record(table, record).to_json()
+
+    def version(self):
+        """Return a token that changes whenever the stored data changes
+
+        Responses built from the whole database use it as their ETag. Equal
+        tokens always mean equal data, even across processes and restarts.
+        """
+        raise NotImplementedError
+
+    def get(self, table, record_id):
+        """Look up a record by id, returning None when missing"""
+        raise NotImplementedError
+
+    def find(self, table, field, value):
+        """Return the records whose indexed field equals value, oldest first"""
+        raise NotImplementedError
+
+    def count(self, table, field, value):
+        """Count the records whose indexed field equals value"""
+        raise NotImplementedError
+
+    def query(self, table, filters=None, since=None, until=None, after=None, limit=None, descending=False):
+        """Return one page of records ordered by (created_at, id)
+
+        Returns the records and the sort key to resume from, or None once the
+        last page has been reached.
+        """
+        raise NotImplementedError
+
+    def iter_records(self, table, filters=None, since=None, until=None, batch=500):
+        """Yield every matching record in creation order, one page at a time"""
+        after = None
+        while True:
+            records, after = self.query(table, filters, since, until, after, batch)
+            yield from records
+            if after is None:
+                return
+
+    def expire(self, now=None, archive=False):
+        """Mark pending connections past their expires_at as expired
+
+        With archive set, every expired connection is also moved out of the
+        hot tables into the backend's cold archive. Returns the number of
+        connections newly expired.
+        """
+        raise NotImplementedError
+
+    def stats(self):
+        """Return ``{table: {'total': n, 'by_status': {status: n}}}``"""
+        raise NotImplementedError
+
+    def series(self, table, bucket='minute', window=60):
+        """Return records created per bucket over the last window buckets"""
+        raise NotImplementedError
+
+    def refresh(self, force=False):
+        """Pick up changes made by other processes, where that is needed"""
+
+    def close(self):
+        pass
+
+
+def backend_for(path):
+    """Return the backend name to use for a database file"""
+    backend = os.environ.get('DATABASE_BACKEND')
+    if backend:
+        return backend.lower()
+    if path.lower().endswith(SQLITE_EXTENSIONS):
+        return 'sqlite'
+    return 'json'
+
+
+def open_store(path):
+    """Create a repository for a database file, sharded when its layout says so"""
+    requested = os.environ.get('DATABASE_SHARDS')
+    if requested is not None:
+        requested = int(requested)
+        if requested < 1:
+            raise ValueError('DATABASE_SHARDS must be at least 1')
+    # core.sharding builds on this module
+    from core.sharding import ShardedStore, shard_count, shard_paths
+    count = shard_count(path, requested)
+    if count > 1:
+        return ShardedStore(path, [open_backend(shard_path) for shard_path in shard_paths(path, count)])
+    return open_backend(path)
+
+
+def open_backend(path, durability=None):
+    """Create a single-file repository
+
+    ``durability`` overrides the (mode, interval, max_records) settings read
+    from the environment.
+    """
+    backend = backend_for(path)
+    durability, interval, records = durability or env_durability()
+    # Imported lazily so a serverless function only loads the backend it uses
+    if backend == 'sqlite':
+        from core.sqlite_store import SQLiteStore
+        return SQLiteStore(path, durability=durability, commit_interval=interval, commit_records=records)
+    if backend == 'json':
+        from core.store import Store
+        return Store(path, durability=durability, commit_interval=interval, commit_records=records)
+    raise ValueError(f'Unknown database backend: {backend}')
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(path):
+    """Return the process-wide repository for a database file
+
+    The repository is created on first use and then shared by every request
+    served by this process, including warm invocations of a serverless
+    function.
+    """
+    key = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = open_store(path)
+        return store
+
+
+def load_database(path):
+    """Return the database contents from the shared repository"""
+    return get_store(path).data()
+
+
+def save_database(data, path):
+    """Overwrite the database with a full copy of its contents"""
+    get_store(path).replace(data)
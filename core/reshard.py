@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Move a database to another number of shards, offline.
+
+    python -m core.reshard wallet_connections.json 8
+    python -m core.reshard wallet_connections.json 1     # back to one file
+
+Stop every server using the database first. Records are copied in creation
+order into the new shard files, the counts are checked, and only then is the
+layout in ``<name>.shards`` switched, so an interrupted run leaves the
+database as it was. The old files are kept unless ``--remove`` is given.
+Archives of expired connections stay with the files they were written next
+to.
+"""
+
+import argparse
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from core.durability import ASYNC, GROUP_COMMIT_INTERVAL, GROUP_COMMIT_RECORDS
+from core.repository import TABLES, open_backend
+from core.sharding import ShardedStore, has_data, read_shard_count, shard_paths, write_shard_count
+
+# Records per write into the new shards
+BATCH = 10000
+
+# The copy is only trusted once it has been verified, so it skips per-write
+# fsyncs; closing the stores flushes everything.
+COPY_DURABILITY = (ASYNC, GROUP_COMMIT_INTERVAL, GROUP_COMMIT_RECORDS)
+
+FILE_SUFFIXES = ('', '.wal', '.wal.compacting', '.map', '.lock', '.compact.lock', '-wal', '-shm', '-journal')
+
+
+def layout_paths(path, count):
+    """Return the backend files of a layout"""
+    return [path] if count == 1 else shard_paths(path, count)
+
+
+def open_layout(path, count):
+    stores = [open_backend(shard_path, COPY_DURABILITY) for shard_path in layout_paths(path, count)]
+    return stores[0] if count == 1 else ShardedStore(path, stores)
+
+
+def reshard(path, count, remove=False, log=print):
+    """Copy the database at path into count shards and switch to them"""
+    current = read_shard_count(path) or 1
+    if count == current:
+        log(f'{path} already has {count} shard(s)')
+        return
+    targets = layout_paths(path, count)
+    if any(has_data(target) for target in targets):
+        raise SystemExit(f'{", ".join(t for t in targets if has_data(t))} already exist; remove them first')
+
+    source = open_layout(path, current)
+    target = open_layout(path, count)
+    verified = False
+    try:
+        expected = source.stats()
+        for table in TABLES:
+            batch = []
+            written = 0
+            for record in source.iter_records(table):
+                batch.append(record)
+                if len(batch) == BATCH:
+                    target.insert_many(table, batch)
+                    written += len(batch)
+                    batch = []
+            target.insert_many(table, batch)
+            written += len(batch)
+            log(f'{table}: {written} records')
+        counts = target.stats()
+        if counts != expected:
+            raise SystemExit(f'Copy does not match the source ({counts} != {expected}); layout left unchanged')
+        verified = True
+    finally:
+        source.close()
+        target.close()
+        if not verified:
+            remove_files(targets)
+
+    write_shard_count(path, count)
+    log(f'{path} now has {count} shard(s)')
+
+    old = layout_paths(path, current)
+    if remove:
+        remove_files(old)
+        log(f'Removed {", ".join(old)}')
+    else:
+        log(f'Old files kept: {", ".join(old)}')
+
+
+def remove_files(paths):
+    for base in paths:
+        for suffix in FILE_SUFFIXES:
+            if os.path.exists(base + suffix):
+                os.remove(base + suffix)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Move a database to another number of shards')
+    parser.add_argument('database', help='database file, as in DATABASE_FILE')
+    parser.add_argument('shards', type=int, help='new number of shards (1 for a single file)')
+    parser.add_argument('--remove', action='store_true', help='delete the old files afterwards')
+    args = parser.parse_args()
+    if args.shards < 1:
+        parser.error('shards must be at least 1')
+    reshard(args.database, args.shards, args.remove)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+"""
+A minimal path router shared by the Flask app and the Vercel functions.
+
+Patterns use Flask's ``<name>`` placeholders, so the same table can be handed
+to ``app.add_url_rule`` unchanged. A literal segment beats a placeholder, so
+``/api/transactions/batch/update`` is never taken for a transaction id.
+"""
+
+import re
+
+
+class Router:
+    """Map (method, path) to an endpoint name and its path parameters"""
+
+    def __init__(self, routes=()):
+        self._routes = []
+        for method, pattern, endpoint in routes:
+            self.add(method, pattern, endpoint)
+
+    def add(self, method, pattern, endpoint):
+        regex = re.compile('^' + re.sub(r'<(\w+)>', r'(?P<\1>[^/]+)', pattern) + '$')
+        self._routes.append((pattern.count('<'), method, pattern, endpoint, regex))
+        self._routes.sort(key=lambda route: route[0])
+
+    def match(self, method, path):
+        """Return (endpoint, params, pattern), or (None, allowed methods, None)
+
+        The allowed methods are empty when nothing matches the path at all.
+        """
+        allowed = []
+        for _, route_method, pattern, endpoint, regex in self._routes:
+            found = regex.match(path)
+            if found is None:
+                continue
+            if route_method == method:
+                return endpoint, found.groupdict(), pattern
+            allowed.append(route_method)
+        return None, allowed, None
@@ -0,0 +1,142 @@
+"""
+JSON encoding for responses, log entries and snapshots.
+
+``dumps`` returns compact UTF-8 bytes, using ``orjson`` when it is installed
+and the standard library otherwise. Values orjson refuses (integers beyond 64
+bits, such as wei amounts, or strings with lone surrogates) fall back to the
+standard library, so the output never depends on which encoder ran.
+
+Decoding always goes through the standard library: orjson turns integers
+beyond 64 bits into floats, which would silently corrupt amounts.
+
+A ``Fragment`` is JSON that has already been encoded. ``dumps`` splices it into
+the output as is, which lets the stores encode each record once and build list
+responses from the cached bytes. Stored records (``core.records``) are spliced
+in through their ``to_json()``.
+"""
+
+import json
+import re
+import secrets
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = 'orjson' if orjson is not None else 'json'
+
+# Placeholder strings stand in for fragments while the enclosing value is
+# encoded. Both encoders escape NUL, and the random token keeps stored data
+# from ever matching a placeholder.
+_TOKEN = secrets.token_hex(8)
+_PLACEHOLDER = re.compile(rb'"\\u0000' + _TOKEN.encode() + rb'(\d+)"')
+
+
+class Fragment(bytes):
+    """Already-encoded JSON, embedded verbatim by dumps"""
+
+
+def _dumps(obj, default=None):
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=default, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass
+    return json.dumps(obj, separators=(',', ':'), default=default).encode()
+
+
+def _to_dict(value):
+    to_dict = getattr(value, 'to_dict', None)
+    if to_dict is None:
+        raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+    return to_dict()
+
+
+def dumps(obj):
+    """Encode obj as compact JSON bytes, splicing in fragments and records"""
+    if isinstance(obj, Fragment):
+        return obj
+    to_json = getattr(obj, 'to_json', None)
+    if to_json is not None:
+        return to_json()
+
+    fragments = []
+
+    def placeholder(value):
+        if not isinstance(value, Fragment):
+            to_json = getattr(value, 'to_json', None)
+            if to_json is None:
+                return _to_dict(value)
+            value = to_json()
+        fragments.append(value)
+        return f'\x00{_TOKEN}{len(fragments) - 1}'
+
+    data = _dumps(obj, placeholder)
+    if not fragments:
+        return data
+    return _PLACEHOLDER.sub(lambda m: fragments[int(m.group(1))], data)
+
+
+def encode(obj):
+    """Encode a single value, returning it as a Fragment"""
+    return Fragment(_dumps(obj, _to_dict))
+
+
+def join(fragments):
+    """Encode a list of fragments as a JSON array"""
+    return Fragment(b'[' + b','.join(fragments) + b']')
+
+
+def loads(data):
+    """Decode JSON text or bytes"""
+    return json.loads(data)
+
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+def iter_arrays(text):
+    """Yield (key, item) for every item of the arrays in a top-level JSON object
+
+    Items are decoded one at a time, so a caller converting them as they come
+    never holds the whole document as Python objects. Non-array values are
+    skipped.
+    """
+    decode = _decoder.raw_decode
+
+    def skip(i):
+        return _WHITESPACE.match(text, i).end()
+
+    def expect(i, chars):
+        i = skip(i)
+        if i >= len(text) or text[i] not in chars:
+            raise ValueError(f'Expected one of {chars!r} at offset {i}')
+        return i
+
+    i = skip(expect(0, '{') + 1)
+    if text[i:i + 1] == '}':
+        return
+    while True:
+        key, i = decode(text, expect(i, '"'))
+        i = skip(expect(i, ':') + 1)
+        if text[i:i + 1] == '[':
+            i = skip(i + 1)
+            if text[i:i + 1] == ']':
+                i += 1
+            else:
+                while True:
+                    item, i = decode(text, i)
+                    yield key, item
+                    i = expect(i, ',]')
+                    if text[i] == ']':
+                        i += 1
+                        break
+                    i = skip(i + 1)
+        else:
+            _, i = decode(text, i)
+        i = expect(i, ',}')
+        if text[i] == '}':
+            return
+        i += 1
@@ -0,0 +1,841 @@
+"""
+The platform's HTTP API, independent of any web framework.
+
+``backend/server.py`` mounts these routes on Flask and the Vercel functions in
+``api/`` serve them through ``core/vercel.py``, so both run the same code
+against the same storage layer. A route method takes a ``Request`` plus its
+path parameters and returns a ``Response``; raising ``ApiError`` produces a
+JSON error body.
+"""
+
+import functools
+import json
+import os
+import secrets
+from datetime import datetime
+
+from core import metrics, serializer
+from core.admission import RateLimited, client_address, env_admission
+from core.events import HEARTBEAT_INTERVAL, bus, format_event, wait_for_change
+from core.expiry import ensure_sweeper, is_expired
+from core.idempotency import HEADER as IDEMPOTENCY_HEADER
+from core.idempotency import MAX_KEY_LENGTH, KeyInFlight, KeyReused, env_idempotency
+from core.indexes import INDEXED_FIELDS
+from core.negotiation import MIN_SIZE, choose, compress, compressible, content_etag, etag_matches, held, tagged
+from core.query import QueryError, encode_cursor, parse_list_args, project, wants_page
+from core.records import Connection, Transaction
+from core.repository import TABLES, get_store
+from core.stats import BUCKET_SECONDS
+
+MAX_SERIES_WINDOW = 1440
+
+# Longest a long-poll request may block, in seconds
+MAX_WAIT_TIMEOUT = 60
+
+# Most items accepted by a single batch request
+MAX_BATCH_SIZE = 50000
+
+# Transaction statuses and fields a chain watcher may report
+TRANSACTION_STATUSES = ('pending', 'submitted', 'confirmed', 'failed')
+TRANSACTION_PATCH_FIELDS = ('status', 'hash', 'gas_used', 'gas_price')
+
+JSON = 'application/json'
+
+# Every front end answers cross-origin requests, as flask_cors does for Flask
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type, If-None-Match, Idempotency-Key',
+    'Access-Control-Expose-Headers': 'ETag, Idempotent-Replayed, Retry-After',
+}
+
+# Cached API responses must be revalidated before every use
+REVALIDATE = 'no-cache'
+
+# (method, pattern, endpoint); endpoints are Service method names
+ROUTES = (
+    ('GET', '/api/health', 'health_check'),
+    ('POST', '/api/connect', 'create_connection'),
+    ('POST', '/api/connect/batch', 'create_connections_batch'),
+    ('GET', '/api/connections', 'get_all_connections'),
+    ('GET', '/api/connections/<connection_id>', 'get_connection'),
+    ('POST', '/api/connections/<connection_id>/update', 'update_connection'),
+    ('POST', '/api/connections/<connection_id>', 'update_connection_by_id'),
+    ('GET', '/api/connections/<connection_id>/wait', 'wait_for_connection'),
+    ('GET', '/api/connections/<connection_id>/events', 'connection_events'),
+    ('GET', '/api/connections/<connection_id>/transactions', 'get_connection_transactions'),
+    ('POST', '/api/transactions', 'create_transaction'),
+    ('GET', '/api/transactions', 'get_all_transactions'),
+    ('POST', '/api/transactions/batch/update', 'update_transactions_batch'),
+    ('GET', '/api/transactions/<transaction_id>', 'get_transaction'),
+    ('POST', '/api/transactions/<transaction_id>/update', 'update_transaction'),
+    ('GET', '/api/transactions/<transaction_id>/wait', 'wait_for_transaction'),
+    ('GET', '/api/transactions/<transaction_id>/events', 'transaction_events'),
+    ('GET', '/api/export/<table>', 'export_table'),
+    ('GET', '/api/stats', 'get_stats'),
+    ('GET', '/api/metrics', 'get_metrics'),
+)
+
+# Routes that write, and the request values (path parameters, else JSON body
+# fields) they are rate limited on besides the client address
+ADMITTED_ROUTES = {
+    'create_connection': ('user_id',),
+    'create_connections_batch': (),
+    'update_connection': ('connection_id',),
+    'update_connection_by_id': ('connection_id',),
+    'create_transaction': ('connection_id',),
+    'update_transaction': (),
+    'update_transactions_batch': (),
+}
+
+# Create routes that honour an Idempotency-Key header
+IDEMPOTENT_ROUTES = frozenset(('create_connection', 'create_transaction'))
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Request:
+    """What a route needs to know about an incoming request"""
+
+    def __init__(self, method, path, args, headers, body, host_url, remote_addr=None):
+        self.method = method
+        self.path = path
+        # Parameter name -> first value
+        self.args = args
+        # Case-insensitive mapping (Flask's or http.server's headers)
+        self.headers = headers
+        self.body = body
+        # Base URL ending in '/', used to build connection links
+        self.host_url = host_url
+        # Client address, for rate limiting
+        self.remote_addr = remote_addr
+        self._json = None
+
+    def arg(self, name, default=None, type=str):
+        """Return a query parameter converted with type, or default if missing or invalid"""
+        value = self.args.get(name)
+        if value is None:
+            return default
+        try:
+            return type(value)
+        except (TypeError, ValueError):
+            return default
+
+    def get_json(self):
+        """Decode the JSON body, returning None when there is none"""
+        if not self.body:
+            return None
+        if self._json is None:
+            try:
+                self._json = (json.loads(self.body),)
+            except ValueError:
+                raise ApiError(400, 'Invalid JSON body')
+        return self._json[0]
+
+
+class Response:
+    """Status, headers and a body of bytes or an iterable of byte chunks"""
+
+    def __init__(self, body=b'', status=200, content_type=JSON, headers=None):
+        self.body = body
+        self.status = status
+        self.content_type = content_type
+        self.headers = headers or {}
+
+    @property
+    def streamed(self):
+        return not isinstance(self.body, (bytes, str))
+
+
+def json_response(obj, status=200):
+    return Response(metrics.dumps(obj), status)
+
+
+def error(status, message):
+    return json_response({'error': message}, status)
+
+
+def not_modified(etag):
+    return Response(b'', 304, headers={'ETag': etag, 'Cache-Control': REVALIDATE})
+
+
+def conditional(request, etag, build):
+    """Return a 304 if the client holds etag, else build() tagged with it"""
+    if etag_matches(request.headers.get('If-None-Match'), etag):
+        return not_modified(etag)
+    response = build()
+    if response.status == 200:
+        response.headers.update({'ETag': etag, 'Cache-Control': REVALIDATE})
+    return response
+
+
+def versioned(*volatile_args):
+    """Tag a route's responses with the store's version and answer 304s from it
+
+    The route must depend only on the stored data and its query; a request
+    using any of ``volatile_args`` (a time window, say) is answered in full.
+    The version is read before the data, so an ETag is never newer than the
+    body it comes with.
+    """
+    def decorate(route):
+        @functools.wraps(route)
+        def wrapper(self, request, **params):
+            if any(name in request.args for name in volatile_args):
+                return route(self, request, **params)
+            etag = '"' + self.get_db().version() + '"'
+            return conditional(request, etag, lambda: route(self, request, **params))
+        return wrapper
+    return decorate
+
+
+def negotiate(request, response):
+    """Compress a response body in the best coding the client accepts
+
+    A 304 gets the ``Vary`` and ETag the 200 would have had, so a shared
+    cache never pairs it with a body in another coding.
+    """
+    if response.status == 304 and 'ETag' in response.headers:
+        response.headers['Vary'] = 'Accept-Encoding'
+        coding = choose(request.headers.get('Accept-Encoding'))
+        if coding is not None:
+            response.headers['ETag'] = held(request.headers.get('If-None-Match'), response.headers['ETag'], coding)
+        return response
+    if (response.status != 200 or response.streamed or not compressible(response.content_type)
+            or 'Content-Encoding' in response.headers):
+        return response
+    response.headers['Vary'] = 'Accept-Encoding'
+    coding = choose(request.headers.get('Accept-Encoding'))
+    if coding is None or len(response.body) < MIN_SIZE:
+        return response
+    body = response.body.encode() if isinstance(response.body, str) else response.body
+    response.body = compress(body, coding)
+    response.headers['Content-Encoding'] = coding
+    if 'ETag' in response.headers:
+        response.headers['ETag'] = tagged(response.headers['ETag'], coding)
+    return response
+
+
+def env_config(**defaults):
+    """Build the service configuration from environment variables"""
+    config = {
+        'DATABASE_FILE': 'wallet_connections.json',
+        'EXPIRY_SWEEP_INTERVAL': 60,
+        'ARCHIVE_EXPIRED': False,
+        'REUSE_PENDING_CONNECTIONS': False,
+        'TRUSTED_PROXIES': 0,
+    }
+    config.update(defaults)
+    if 'DATABASE_FILE' in os.environ:
+        config['DATABASE_FILE'] = os.environ['DATABASE_FILE']
+    if 'EXPIRY_SWEEP_INTERVAL' in os.environ:
+        config['EXPIRY_SWEEP_INTERVAL'] = float(os.environ['EXPIRY_SWEEP_INTERVAL'])
+    if 'ARCHIVE_EXPIRED' in os.environ:
+        config['ARCHIVE_EXPIRED'] = os.environ['ARCHIVE_EXPIRED'].lower() in ('1', 'true', 'yes')
+    if 'REUSE_PENDING_CONNECTIONS' in os.environ:
+        config['REUSE_PENDING_CONNECTIONS'] = os.environ['REUSE_PENDING_CONNECTIONS'].lower() in ('1', 'true', 'yes')
+    if 'TRUSTED_PROXIES' in os.environ:
+        config['TRUSTED_PROXIES'] = int(os.environ['TRUSTED_PROXIES'])
+    return config
+
+
+class Service:
+    """Route implementations bound to one configuration
+
+    ``config`` is read on every request (it may be Flask's ``app.config``),
+    with keys DATABASE_FILE, EXPIRY_SWEEP_INTERVAL, ARCHIVE_EXPIRED,
+    REUSE_PENDING_CONNECTIONS and TRUSTED_PROXIES. Rate limits and the idempotency cache are
+    configured from the environment (``core.admission``, ``core.idempotency``).
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.admission = env_admission()
+        self.idempotency = env_idempotency()
+
+    def handle(self, endpoint, request, params):
+        """Admit a request (see core/admission.py) and run its route"""
+        if endpoint not in ADMITTED_ROUTES:
+            return self.dispatch(endpoint, request, params)
+        try:
+            keys = admission_keys(endpoint, request, params, self.config['TRUSTED_PROXIES'])
+            with self.admission.admit(keys):
+                return self.dispatch(endpoint, request, params)
+        except RateLimited as e:
+            return failure(e)
+
+    def dispatch(self, endpoint, request, params):
+        """Run a route, turning errors into JSON error responses, and compress the result"""
+        key = request.headers.get(IDEMPOTENCY_HEADER) if endpoint in IDEMPOTENT_ROUTES else None
+        if key:
+            response = self.replayable(endpoint, request, params, key)
+        else:
+            response = self.route(endpoint, request, params)
+        return negotiate(request, response)
+
+    def route(self, endpoint, request, params):
+        try:
+            return getattr(self, endpoint)(request, **params)
+        except Exception as e:
+            return failure(e)
+
+    def replayable(self, endpoint, request, params, key):
+        """Run a create route once per Idempotency-Key, replaying its response to repeats"""
+        if len(key) > MAX_KEY_LENGTH:
+            return error(400, f'{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters')
+        try:
+            response, replayed = self.idempotency.run(
+                (endpoint, key), request.body, lambda: self.route(endpoint, request, params),
+                lambda response: response.status < 500)
+        except (KeyReused, KeyInFlight) as e:
+            return failure(e)
+        # The kept response stays as the route returned it; compression
+        # applies to a copy
+        headers = dict(response.headers)
+        if replayed:
+            headers['Idempotent-Replayed'] = 'true'
+        return Response(response.body, response.status, response.content_type, headers)
+
+    # Database to store connection requests
+    def get_db(self):
+        store = get_store(self.config['DATABASE_FILE'])
+        ensure_sweeper(store, self.config['EXPIRY_SWEEP_INTERVAL'], self.config['ARCHIVE_EXPIRED'])
+        return store
+
+    def list_page(self, request, table, fixed_filters=None):
+        """Run a paginated list query built from the request arguments"""
+        query, fields = parse_list_args(table, request.args, fixed_filters)
+        records, last_key = self.get_db().query(table, **query)
+        if fields:
+            return [project(record, fields) for record in records], encode_cursor(last_key)
+        return self.encoded(table, records), encode_cursor(last_key)
+
+    def encoded(self, table, records):
+        """Build a JSON array from the store's cached record encodings"""
+        db = self.get_db()
+        return serializer.join([db.encode(table, record) for record in records])
+
+    # Health
+
+    def health_check(self, request):
+        return json_response({'status': 'healthy', 'timestamp': datetime.now().isoformat()})
+
+    # Connections
+
+    def create_connection(self, request):
+        """Create a new wallet connection request"""
+        data = request.get_json()
+
+        if not isinstance(data, dict):
+            return error(400, 'user_id is required')
+        reason = identifier_error(data, 'user_id', numbers=True)
+        if reason:
+            return error(400, reason)
+
+        if self.config.get('REUSE_PENDING_CONNECTIONS'):
+            connection = pending_connection(self.get_db(), data)
+            if connection is not None:
+                return json_response(dict({'success': True, 'reused': True}, **connection_created(request, connection)))
+
+        connection_request = new_connection_request(data)
+
+        # Save to database
+        self.get_db().insert('connections', connection_request)
+
+        return json_response(dict({'success': True}, **connection_created(request, connection_request)))
+
+    def create_connections_batch(self, request):
+        """Create many connection requests with a single store write"""
+        items = request.get_json()
+
+        if not isinstance(items, list):
+            return error(400, 'Expected a JSON array of {user_id, metadata}')
+        if len(items) > MAX_BATCH_SIZE:
+            return error(400, f'At most {MAX_BATCH_SIZE} connections per batch')
+
+        # Validate every item first; invalid ones get an error in place
+        results = []
+        connection_requests = []
+        for item in items:
+            reason = identifier_error(item, 'user_id', numbers=True) if isinstance(item, dict) else 'user_id is required'
+            if reason:
+                results.append({'success': False, 'error': reason})
+                continue
+            connection_request = new_connection_request(item)
+            connection_requests.append(connection_request)
+            results.append(connection_request)
+
+        self.get_db().insert_many('connections', connection_requests)
+
+        results = [
+            result if 'error' in result else dict({'success': True}, **connection_created(request, result))
+            for result in results
+        ]
+        return json_response({
+            'success': True,
+            'created': len(connection_requests),
+            'failed': len(results) - len(connection_requests),
+            'results': results
+        })
+
+    @versioned()
+    def get_all_connections(self, request):
+        """Get connections for admin dashboard, paginated when asked to"""
+        if not wants_page('connections', request.args):
+            return json_response(self.encoded('connections', self.get_db().data()['connections']))
+
+        connections, next_cursor = self.list_page(request, 'connections')
+        return json_response({
+            'success': True,
+            'connections': connections,
+            'next_cursor': next_cursor
+        })
+
+    def get_connection(self, request, connection_id):
+        """Get connection status"""
+        connection = self.get_db().get('connections', connection_id)
+
+        if not connection:
+            return error(404, 'Connection not found')
+
+        if is_expired(connection):
+            return error(410, 'Connection expired')
+
+        body = self.get_db().encode('connections', connection)
+        return conditional(request, content_etag(body), lambda: json_response(body))
+
+    def update_connection(self, request, connection_id):
+        """Update connection with wallet info"""
+        data = request.get_json()
+
+        if not isinstance(data, dict):
+            return error(400, 'wallet_address is required')
+        reason = identifier_error(data, 'wallet_address')
+        if reason:
+            return error(400, reason)
+
+        connection = self.get_db().get('connections', connection_id)
+
+        if not connection:
+            return error(404, 'Connection not found')
+
+        if is_expired(connection):
+            return error(410, 'Connection expired')
+
+        connection = self.get_db().update('connections', connection_id, {
+            'wallet_address': data['wallet_address'],
+            'network': data.get('network', 'ethereum'),
+            'status': 'connected',
+            'connected_at': datetime.now().isoformat()
+        })
+
+        if connection:
+            bus.publish('connections', connection)
+            return json_response({'success': True, 'connection': self.get_db().encode('connections', connection)})
+
+        return error(404, 'Connection not found')
+
+    # The first Vercel functions updated connections at the bare id path
+    update_connection_by_id = update_connection
+
+    def wait_for_connection(self, request, connection_id):
+        """Block until the connection changes status"""
+        return self.wait_for_status(request, 'connections', connection_id, 'connection')
+
+    def connection_events(self, request, connection_id):
+        """Subscribe to connection status changes"""
+        return self.stream_events('connections', connection_id, 'connection')
+
+    @versioned()
+    def get_connection_transactions(self, request, connection_id):
+        """Get all transactions for a connection"""
+        if not wants_page('transactions', request.args):
+            transactions = self.get_db().find('transactions', 'connection_id', connection_id)
+            return json_response({
+                'success': True,
+                'transactions': self.encoded('transactions', transactions)
+            })
+
+        transactions, next_cursor = self.list_page(request, 'transactions', {'connection_id': connection_id})
+        return json_response({
+            'success': True,
+            'transactions': transactions,
+            'next_cursor': next_cursor
+        })
+
+    # Transactions
+
+    def create_transaction(self, request):
+        """Create a new transaction request"""
+        data = request.get_json()
+
+        if not isinstance(data, dict):
+            return error(400, 'connection_id is required')
+        required_fields = ['connection_id', 'to_address', 'amount']
+        for field in required_fields:
+            if field not in data:
+                return error(400, f'{field} is required')
+        reason = identifier_error(data, 'connection_id')
+        if reason:
+            return error(400, reason)
+
+        # Verify connection exists and is active
+        connection = self.get_db().get('connections', data['connection_id'])
+
+        if not connection or connection['status'] != 'connected':
+            return error(400, 'Invalid or inactive connection')
+
+        # Create transaction request
+        transaction = Transaction({
+            'id': secrets.token_urlsafe(32),
+            'connection_id': data['connection_id'],
+            'from_address': connection['wallet_address'],
+            'to_address': data['to_address'],
+            'amount': data['amount'],
+            'status': 'pending',
+            'created_at': datetime.now().isoformat(),
+            'hash': None,
+            'gas_used': None,
+            'gas_price': None
+        })
+
+        self.get_db().insert('transactions', transaction)
+
+        return json_response({
+            'success': True,
+            'transaction_id': transaction['id'],
+            'transaction': self.get_db().encode('transactions', transaction)
+        })
+
+    @versioned()
+    def get_all_transactions(self, request):
+        """Get transactions, paginated when asked to"""
+        if not wants_page('transactions', request.args):
+            return json_response(self.encoded('transactions', self.get_db().data()['transactions']))
+
+        transactions, next_cursor = self.list_page(request, 'transactions')
+        return json_response({
+            'success': True,
+            'transactions': transactions,
+            'next_cursor': next_cursor
+        })
+
+    def get_transaction(self, request, transaction_id):
+        """Get transaction status"""
+        transaction = self.get_db().get('transactions', transaction_id)
+
+        if transaction:
+            body = self.get_db().encode('transactions', transaction)
+            return conditional(request, content_etag(body), lambda: json_response(body))
+
+        return error(404, 'Transaction not found')
+
+    def update_transaction(self, request, transaction_id):
+        """Update transaction with blockchain info"""
+        data = request.get_json()
+
+        if not isinstance(data, dict):
+            return error(400, 'Expected a JSON object')
+        reason = transaction_changes_error(data)
+        if reason:
+            return error(400, reason)
+
+        changes = {field: data[field] for field in TRANSACTION_PATCH_FIELDS if field in data}
+        changes['updated_at'] = datetime.now().isoformat()
+        transaction = self.get_db().update('transactions', transaction_id, changes)
+
+        if transaction:
+            bus.publish('transactions', transaction)
+            return json_response({'success': True, 'transaction': self.get_db().encode('transactions', transaction)})
+
+        return error(404, 'Transaction not found')
+
+    def update_transactions_batch(self, request):
+        """Apply many transaction updates in one atomic write"""
+        patches = request.get_json()
+
+        if not isinstance(patches, list):
+            return error(400, 'Expected a JSON array of {id, status, hash, gas_used, gas_price}')
+        if len(patches) > MAX_BATCH_SIZE:
+            return error(400, f'At most {MAX_BATCH_SIZE} updates per batch')
+
+        # Invalid patches are reported and skipped; the rest go in together
+        results = []
+        changes = []
+        seen = set()
+        updated_at = datetime.now().isoformat()
+        for patch in patches:
+            reason = transaction_patch_error(patch)
+            if reason is None and patch['id'] in seen:
+                reason = 'Duplicate id in batch'
+            if reason:
+                results.append({'id': patch.get('id') if isinstance(patch, dict) else None,
+                                'success': False, 'error': reason})
+                continue
+            seen.add(patch['id'])
+            change = {field: patch[field] for field in TRANSACTION_PATCH_FIELDS if field in patch}
+            change['updated_at'] = updated_at
+            changes.append((patch['id'], change))
+            results.append(None)
+
+        # update_many answers in the order of changes, which fill the gaps
+        db = self.get_db()
+        updated = zip(changes, db.update_many('transactions', changes))
+        for i, result in enumerate(results):
+            if result is not None:
+                continue
+            (transaction_id, _), transaction = next(updated)
+            if transaction is None:
+                results[i] = {'id': transaction_id, 'success': False, 'error': 'Transaction not found'}
+                continue
+            bus.publish('transactions', transaction)
+            results[i] = {'id': transaction_id, 'success': True, 'transaction': db.encode('transactions', transaction)}
+
+        applied = sum(1 for result in results if result['success'])
+        return json_response({
+            'success': True,
+            'updated': applied,
+            'failed': len(results) - applied,
+            'results': results
+        })
+
+    def wait_for_transaction(self, request, transaction_id):
+        """Block until the transaction changes status"""
+        return self.wait_for_status(request, 'transactions', transaction_id, 'transaction')
+
+    def transaction_events(self, request, transaction_id):
+        """Subscribe to transaction status changes"""
+        return self.stream_events('transactions', transaction_id, 'transaction')
+
+    # Subscriptions
+
+    def wait_for_status(self, request, table, record_id, key):
+        """Long-poll until a record's status differs from ?status (default: its current one)"""
+        timeout = wait_timeout(request)
+        store = self.get_db()
+        known_status = request.args.get('status')
+        if known_status is None:
+            known_status = found(store.get(table, record_id), key).get('status')
+
+        record, changed = wait_for_change(store, table, record_id, known_status, timeout)
+        return json_response({'success': True, 'changed': changed, key: store.encode(table, found(record, key))})
+
+    def stream_events(self, table, record_id, key):
+        """Stream a record's status changes as Server-Sent Events"""
+        store = self.get_db()
+        record = store.get(table, record_id)
+        if not record:
+            return error(404, f'{key.capitalize()} not found')
+
+        def generate(record):
+            # The current state first, then one event per status change
+            yield format_event('status', record).encode()
+            status = record.get('status')
+            while True:
+                record, changed = wait_for_change(store, table, record_id, status, HEARTBEAT_INTERVAL)
+                if not record:
+                    yield format_event('deleted', {'id': record_id}).encode()
+                    return
+                if changed:
+                    status = record.get('status')
+                    yield format_event('status', record).encode()
+                else:
+                    # Comment line that keeps proxies from closing an idle stream
+                    yield b': keep-alive\n\n'
+
+        return Response(generate(record), content_type='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+    # Export, statistics and metrics
+
+    def export_table(self, request, table):
+        """Stream connections or transactions as NDJSON, one record per line"""
+        if table not in TABLES:
+            return error(404, 'Unknown table')
+
+        # Only exports pay for loading the encoder and zlib
+        from core.export import gzip_chunks, ndjson_chunks
+
+        filters = {field: request.args[field] for field in INDEXED_FIELDS[table] if field in request.args}
+        records = self.get_db().iter_records(table, filters, request.args.get('since'), request.args.get('until'))
+        chunks = ndjson_chunks(records)
+        filename = f'{table}.ndjson'
+        content_type = 'application/x-ndjson'
+
+        if request.args.get('gzip') in ('1', 'true'):
+            chunks = gzip_chunks(chunks)
+            filename += '.gz'
+            content_type = 'application/gzip'
+
+        return Response(chunks, content_type=content_type, headers={
+            'Content-Disposition': f'attachment; filename={filename}'
+        })
+
+    @versioned('series')
+    def get_stats(self, request):
+        """Get platform statistics"""
+        counts = self.get_db().stats()
+
+        total_connections = counts['connections']['total']
+        active_connections = counts['connections']['by_status'].get('connected', 0)
+        total_transactions = counts['transactions']['total']
+        successful_transactions = counts['transactions']['by_status'].get('confirmed', 0)
+
+        result = {
+            'success': True,
+            'stats': {
+                'total_connections': total_connections,
+                'active_connections': active_connections,
+                'total_transactions': total_transactions,
+                'successful_transactions': successful_transactions,
+                'success_rate': (successful_transactions / total_transactions * 100) if total_transactions > 0 else 0
+            }
+        }
+
+        # Optional time series, e.g. /api/stats?series=hour&window=24
+        bucket = request.args.get('series')
+        if bucket:
+            window = request.arg('window', 60, int)
+            if bucket not in BUCKET_SECONDS or not 1 <= window <= MAX_SERIES_WINDOW:
+                return error(400, f'series must be one of {", ".join(BUCKET_SECONDS)} with window between 1 and {MAX_SERIES_WINDOW}')
+            result['series'] = {table: self.get_db().series(table, bucket, window) for table in TABLES}
+
+        return json_response(result)
+
+    def get_metrics(self, request):
+        """Request and storage metrics in the Prometheus text format"""
+        return Response(metrics.render(self.get_db()).encode(), content_type=metrics.CONTENT_TYPE)
+
+
+def failure(e):
+    """Turn an exception raised by a route into a JSON error response"""
+    if isinstance(e, ApiError):
+        return error(e.status, str(e))
+    if isinstance(e, QueryError):
+        return error(400, str(e))
+    if isinstance(e, KeyReused):
+        return error(422, str(e))
+    if isinstance(e, KeyInFlight):
+        return error(409, str(e))
+    if isinstance(e, RateLimited):
+        response = error(e.status, str(e))
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response
+    return error(500, str(e))
+
+
+def admission_keys(endpoint, request, params, trusted_proxies=0):
+    """Return the (kind, key) pairs a write is rate limited on"""
+    keys = [('ip', client_address(request.remote_addr, request.headers.get('X-Forwarded-For'), trusted_proxies))]
+    for name in ADMITTED_ROUTES[endpoint]:
+        value = params.get(name)
+        if value is None:
+            try:
+                data = request.get_json()
+            except ApiError:
+                # The route reports the bad body
+                data = None
+            value = data.get(name) if isinstance(data, dict) else None
+        keys.append((name, None if value is None else str(value)))
+    return keys
+
+
+def wait_timeout(request):
+    """Return a long-poll's ?timeout in seconds (default 30)"""
+    timeout = request.arg('timeout', 30, float)
+    if not 0 <= timeout <= MAX_WAIT_TIMEOUT:
+        raise ApiError(400, f'timeout must be between 0 and {MAX_WAIT_TIMEOUT} seconds')
+    return timeout
+
+
+def found(record, key):
+    """Return record, raising a 404 naming key when it doesn't exist"""
+    if not record:
+        raise ApiError(404, f'{key.capitalize()} not found')
+    return record
+
+
+def new_connection_request(data):
+    """Build a pending connection record from a {user_id, metadata} request"""
+    # Generate unique connection ID
+    connection_id = secrets.token_urlsafe(32)
+
+    return Connection({
+        'id': connection_id,
+        'user_id': data['user_id'],
+        'status': 'pending',
+        'created_at': datetime.now().isoformat(),
+        'wallet_address': None,
+        'network': None,
+        'expires_at': (datetime.now().timestamp() + 3600),  # 1 hour expiry
+        'metadata': data.get('metadata', {})
+    })
+
+
+def pending_connection(db, data):
+    """Return the user's newest pending connection if it is unexpired and has the same metadata"""
+    connections, _ = db.query('connections', {'user_id': data['user_id'], 'status': 'pending'},
+                              limit=1, descending=True)
+    for connection in connections:
+        if not is_expired(connection) and connection.get('metadata') == data.get('metadata', {}):
+            return connection
+    return None
+
+
+def connection_created(request, connection_request):
+    """Describe a new connection the way POST /api/connect reports it"""
+    return {
+        'connection_id': connection_request['id'],
+        # Generate connection link
+        'connection_link': f"{request.host_url}connect/{connection_request['id']}",
+        'expires_at': connection_request['expires_at']
+    }
+
+
+def identifier_error(data, field, numbers=False):
+    """Return why data[field] can't be stored as an id or address, or None
+
+    The stores index and partition on these fields, so a list or object sent
+    by a client is refused here rather than failing as a 500 further down.
+    """
+    value = data.get(field)
+    if value is None:
+        return f'{field} is required'
+    if numbers and isinstance(value, (int, float)) and not isinstance(value, bool):
+        return None
+    if not isinstance(value, str):
+        return f'{field} must be a string{" or number" if numbers else ""}'
+    return None
+
+
+def transaction_patch_error(patch):
+    """Return why a bulk transaction patch is invalid, or None"""
+    if not isinstance(patch, dict):
+        return 'Each update must be an object'
+    if not isinstance(patch.get('id'), str) or not patch['id']:
+        return 'id is required'
+    return transaction_changes_error({field: value for field, value in patch.items() if field != 'id'})
+
+
+def transaction_changes_error(changes):
+    """Return why a transaction update's fields are invalid, or None"""
+    unknown = set(changes) - set(TRANSACTION_PATCH_FIELDS)
+    if unknown:
+        return f'Unknown fields: {", ".join(sorted(unknown))}'
+    if 'status' in changes and changes['status'] not in TRANSACTION_STATUSES:
+        return f'status must be one of {", ".join(TRANSACTION_STATUSES)}'
+    if changes.get('hash') is not None and not isinstance(changes['hash'], str):
+        return 'hash must be a string'
+    for field in ('gas_used', 'gas_price'):
+        value = changes.get(field)
+        if value is None:
+            continue
+        # Gas values may arrive as numbers or as decimal strings (wei)
+        if isinstance(value, str) and value.isdigit():
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+            return f'{field} must be a non-negative number'
+    return None
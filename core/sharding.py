@@ -0,0 +1,260 @@
+"""
+Sharded storage: one database split across several backend files.
+
+Connections are hash-partitioned on their id, and each transaction lives in
+the shard of its ``connection_id``, so a connection and its transactions
+always share a file. Every shard is an ordinary ``Store`` or ``SQLiteStore``
+with its own lock, log and group-commit writer, so writes to different
+shards never wait for each other.
+
+Lookups of a connection, and anything filtered on a transaction's
+``connection_id``, go to a single shard. A transaction looked up by id alone
+is searched for in every shard (a dictionary lookup each with the JSON
+store). Lists, stats and series merge the per-shard results. A write that
+spans several shards (a batch) is atomic per shard, not across them.
+
+The layout is recorded next to the database in ``<name>.shards``; the shard
+files are ``<name>.shard-<i>-of-<n><ext>``. ``DATABASE_SHARDS`` chooses the
+count for a new database, and ``python -m core.reshard`` moves an existing one
+to another count.
+"""
+
+import hashlib
+import heapq
+import json
+import os
+import zlib
+from itertools import islice
+
+from core.indexes import sort_key
+from core.repository import TABLES, Repository
+
+# Field each table is partitioned on
+PARTITION_FIELDS = {'connections': 'id', 'transactions': 'connection_id'}
+
+
+class ShardedStore(Repository):
+    """A Repository spread over ``len(shards)`` backend repositories"""
+
+    def __init__(self, path, shards):
+        self.path = path
+        self.shards = shards
+        self.paths = [shard.path for shard in shards]
+
+    @property
+    def generation(self):
+        return sum(shard.generation for shard in self.shards)
+
+    def shard(self, key):
+        """Return the shard holding a partition key"""
+        return self.shards[shard_index(key, len(self.shards))]
+
+    def _owner(self, table, record):
+        return self.shard(record[PARTITION_FIELDS[table]])
+
+    def _locate(self, table, record_id):
+        """Return (shard, record) for a record id, or (None, None)"""
+        if table == 'connections':
+            shard = self.shard(record_id)
+            record = shard.get(table, record_id)
+            return (shard, record) if record else (None, None)
+        for shard in self.shards:
+            record = shard.get(table, record_id)
+            if record:
+                return shard, record
+        return None, None
+
+    # Writes
+
+    def insert(self, table, record):
+        return self._owner(table, record).insert(table, record)
+
+    def insert_many(self, table, records):
+        """Store records with one write per shard they fall in"""
+        groups = {}
+        for position, record in enumerate(records):
+            groups.setdefault(id(self._owner(table, record)), []).append(position)
+        stored = [None] * len(records)
+        for positions in groups.values():
+            shard = self._owner(table, records[positions[0]])
+            for position, record in zip(positions, shard.insert_many(table, [records[p] for p in positions])):
+                stored[position] = record
+        return stored
+
+    def update(self, table, record_id, changes):
+        shard, record = self._locate(table, record_id)
+        if shard is None:
+            return None
+        self._check_partition(table, record, changes)
+        return shard.update(table, record_id, changes)
+
+    def update_many(self, table, patches):
+        """Apply patches with one atomic write per shard"""
+        groups = {}
+        results = [None] * len(patches)
+        for position, (record_id, changes) in enumerate(patches):
+            shard, record = self._locate(table, record_id)
+            if shard is None:
+                continue
+            self._check_partition(table, record, changes)
+            groups.setdefault(id(shard), (shard, []))[1].append(position)
+        for shard, positions in groups.values():
+            for position, record in zip(positions, shard.update_many(table, [patches[p] for p in positions])):
+                results[position] = record
+        return results
+
+    def _check_partition(self, table, record, changes):
+        field = PARTITION_FIELDS[table]
+        # An id in changes is ignored, like in every store
+        if field != 'id' and field in changes and changes[field] != record.get(field):
+            raise ValueError(f'{field} cannot change in a sharded database')
+
+    def replace(self, data):
+        parts = [{table: [] for table in TABLES} for _ in self.shards]
+        for table in TABLES:
+            for record in data.get(table, []):
+                parts[shard_index(record[PARTITION_FIELDS[table]], len(self.shards))][table].append(record)
+        for shard, part in zip(self.shards, parts):
+            shard.replace(part)
+
+    def expire(self, now=None, archive=False):
+        return sum(shard.expire(now, archive) for shard in self.shards)
+
+    # Reads
+
+    def data(self):
+        tables = [shard.data() for shard in self.shards]
+        return {table: list(heapq.merge(*(part[table] for part in tables), key=sort_key)) for table in TABLES}
+
+    def encode(self, table, record):
+        return self._owner(table, record).encode(table, record)
+
+    def version(self):
+        """Return a digest of every shard's version"""
+        versions = '/'.join(shard.version() for shard in self.shards)
+        return hashlib.blake2b(versions.encode(), digest_size=8).hexdigest()
+
+    def get(self, table, record_id):
+        return self._locate(table, record_id)[1]
+
+    def find(self, table, field, value):
+        if field == PARTITION_FIELDS[table]:
+            return self.shard(value).find(table, field, value)
+        return list(heapq.merge(*(shard.find(table, field, value) for shard in self.shards), key=sort_key))
+
+    def count(self, table, field, value):
+        if field == PARTITION_FIELDS[table]:
+            return self.shard(value).count(table, field, value)
+        return sum(shard.count(table, field, value) for shard in self.shards)
+
+    def query(self, table, filters=None, since=None, until=None, after=None, limit=None, descending=False):
+        """Return one page of records, merged from every shard the filters allow"""
+        partition = PARTITION_FIELDS[table]
+        if filters and partition in filters:
+            return self.shard(filters[partition]).query(table, filters, since, until, after, limit, descending)
+
+        # Each shard's first page holds every record that can make the
+        # merged page
+        pages = [shard.query(table, filters, since, until, after, limit, descending) for shard in self.shards]
+        merged = heapq.merge(*(records for records, _ in pages), key=sort_key, reverse=descending)
+        if not limit:
+            return list(merged), None
+        records = list(islice(merged, limit + 1))
+        more = len(records) > limit or any(last_key is not None for _, last_key in pages)
+        records = records[:limit]
+        return records, sort_key(records[-1]) if more and records else None
+
+    def iter_records(self, table, filters=None, since=None, until=None, batch=500):
+        """Yield every matching record in creation order, merging the shards' streams"""
+        return heapq.merge(*(shard.iter_records(table, filters, since, until, batch) for shard in self.shards),
+                           key=sort_key)
+
+    def stats(self):
+        result = {table: {'total': 0, 'by_status': {}} for table in TABLES}
+        for shard in self.shards:
+            for table, counts in shard.stats().items():
+                result[table]['total'] += counts['total']
+                by_status = result[table]['by_status']
+                for status, count in counts['by_status'].items():
+                    by_status[status] = by_status.get(status, 0) + count
+        return result
+
+    def series(self, table, bucket='minute', window=60):
+        counts = {}
+        for shard in self.shards:
+            for point in shard.series(table, bucket, window):
+                counts[point['timestamp']] = counts.get(point['timestamp'], 0) + point['count']
+        # A bucket boundary may pass between shards; keep the newest window
+        return [{'timestamp': timestamp, 'count': counts[timestamp]} for timestamp in sorted(counts)[-window:]]
+
+    def refresh(self, force=False):
+        for shard in self.shards:
+            shard.refresh(force)
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+
+
+def shard_index(key, count):
+    """Return the shard a partition key falls in; the same in every process"""
+    return zlib.crc32(str(key).encode()) % count
+
+
+def manifest_path(path):
+    # Named apart from the database file, so cleaning up that file's old
+    # copies can't take the layout with it
+    return os.path.splitext(path)[0] + '.shards'
+
+
+def shard_paths(path, count):
+    root, extension = os.path.splitext(path)
+    return [f'{root}.shard-{i}-of-{count}{extension}' for i in range(count)]
+
+
+def read_shard_count(path):
+    """Return the shard count recorded for a database, or None if it isn't sharded"""
+    try:
+        with open(manifest_path(path)) as f:
+            return int(json.load(f)['shards'])
+    except FileNotFoundError:
+        return None
+
+
+def write_shard_count(path, count):
+    """Record a database's layout; a count of 1 removes the manifest"""
+    manifest = manifest_path(path)
+    if count == 1:
+        if os.path.exists(manifest):
+            os.remove(manifest)
+        return
+    temporary = manifest + '.tmp'
+    with open(temporary, 'w') as f:
+        json.dump({'shards': count}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, manifest)
+
+
+def has_data(path):
+    """Tell whether an unsharded database exists at path"""
+    return any(os.path.exists(path + suffix) for suffix in ('', '.wal', '-wal'))
+
+
+def shard_count(path, requested=None):
+    """Return the number of shards to open a database with
+
+    The manifest decides for an existing database; ``requested`` (from
+    ``DATABASE_SHARDS``) only sets up a new one, and disagreeing with the
+    manifest, or asking to shard an existing unsharded database, is an error
+    pointing at the reshard tool.
+    """
+    recorded = read_shard_count(path)
+    if requested is None or requested == (recorded or 1):
+        return recorded or 1
+    if recorded is not None or (requested > 1 and has_data(path)):
+        raise ValueError(f'{path} has {recorded or 1} shard(s), not {requested}; '
+                         f'move it with: python -m core.reshard {path} {requested}')
+    if requested > 1:
+        write_shard_count(path, requested)
+    return requested
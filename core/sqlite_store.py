@@ -0,0 +1,434 @@
+"""
+SQLite storage backend.
+
+Each table keeps the full record as JSON in ``data`` and copies the indexed
+fields into real columns, so lookups, filters, pagination and stats are
+indexed SQL queries. The database runs in WAL mode, which lets readers in
+other threads and processes proceed while a write is in progress. Each thread
+gets its own connection, handed on to a later thread when it finishes, and
+``sqlite3`` keeps the prepared form of every statement below in a
+per-connection cache. Rows are returned as ``core.records`` objects, like the
+JSON log store's.
+
+Expired connections can be archived to ``connections_archive``, which the API
+never reads.
+
+Commits run with ``synchronous=NORMAL``, which appends them to the ``-wal``
+file without an fsync; ``core.durability`` then fsyncs that file per commit,
+per batch of commits or in the background, depending on the durability mode.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import weakref
+from datetime import datetime
+
+from core import serializer
+from core.durability import GROUP, GROUP_COMMIT_INTERVAL, GROUP_COMMIT_RECORDS, GroupCommit
+from core.expiry import EXPIRED
+from core.indexes import INDEXED_FIELDS
+from core.metrics import timed
+from core.records import make_record
+from core.repository import TABLES, Repository
+from core.stats import BUCKET_SECONDS, series_from_minutes, series_start
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS connections (
+    id TEXT PRIMARY KEY,
+    user_id TEXT,
+    wallet_address TEXT,
+    status TEXT,
+    expires_at REAL,
+    created_at TEXT NOT NULL DEFAULT '',
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS connections_created_at ON connections (created_at, id);
+CREATE INDEX IF NOT EXISTS connections_user_id ON connections (user_id, created_at, id);
+CREATE INDEX IF NOT EXISTS connections_wallet_address ON connections (wallet_address, created_at, id);
+CREATE INDEX IF NOT EXISTS connections_status ON connections (status, created_at, id);
+
+CREATE TABLE IF NOT EXISTS transactions (
+    id TEXT PRIMARY KEY,
+    connection_id TEXT,
+    status TEXT,
+    created_at TEXT NOT NULL DEFAULT '',
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transactions_created_at ON transactions (created_at, id);
+CREATE INDEX IF NOT EXISTS transactions_connection_id ON transactions (connection_id, created_at, id);
+CREATE INDEX IF NOT EXISTS transactions_status ON transactions (status, created_at, id);
+
+CREATE TABLE IF NOT EXISTS connections_archive (
+    id TEXT PRIMARY KEY,
+    archived_at TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('generation', 0);
+-- Tells a recreated database apart from the one it replaced
+INSERT OR IGNORE INTO meta (key, value) VALUES ('epoch', abs(random()));
+"""
+
+BUMP_GENERATION = "UPDATE meta SET value = value + 1 WHERE key = 'generation'"
+READ_GENERATION = "SELECT value FROM meta WHERE key = 'generation'"
+READ_VERSION = ("SELECT (SELECT value FROM meta WHERE key = 'epoch'), "
+                "(SELECT value FROM meta WHERE key = 'generation')")
+
+# Connections of finished threads kept open for the next threads to reuse
+MAX_IDLE_CONNECTIONS = 16
+
+# Columns kept for range scans rather than equality lookups
+EXTRA_COLUMNS = {'connections': ('expires_at',), 'transactions': ()}
+
+
+def _columns(table):
+    return ('id',) + INDEXED_FIELDS[table] + EXTRA_COLUMNS[table] + ('created_at', 'data')
+
+
+def _row(table, record):
+    """Return the column values for a record, in _columns() order"""
+    values = [record['id']]
+    values.extend(record.get(field) for field in INDEXED_FIELDS[table] + EXTRA_COLUMNS[table])
+    values.append(record.get('created_at') or '')
+    values.append(serializer.dumps(record).decode())
+    return values
+
+
+# Table names and columns come from the fixed lists above, never from input.
+INSERT_SQL = {
+    table: 'INSERT INTO {} ({}) VALUES ({})'.format(
+        table, ', '.join(_columns(table)), ', '.join('?' * len(_columns(table))))
+    for table in TABLES
+}
+UPSERT_SQL = {table: sql.replace('INSERT', 'INSERT OR REPLACE', 1) for table, sql in INSERT_SQL.items()}
+GET_SQL = {table: f'SELECT data FROM {table} WHERE id = ?' for table in TABLES}
+
+
+class _Holder:
+    """Per-thread slot for a connection; freed when its thread ends"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+
+class SQLiteStore(Repository):
+    """Repository backed by a SQLite database file"""
+
+    def __init__(self, path, timeout=30.0, durability=GROUP, commit_interval=GROUP_COMMIT_INTERVAL,
+                 commit_records=GROUP_COMMIT_RECORDS):
+        self.path = path
+        self.timeout = timeout
+        self.wal_path = path + '-wal'
+        self._local = threading.local()
+        self._connections = set()
+        self._idle = []
+        self._connections_lock = threading.Lock()
+
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        self._migrate(conn)
+        self._commit = GroupCommit(self._sync_wal, durability, commit_interval, commit_records)
+
+    def _migrate(self, conn):
+        """Bring databases created by older versions up to the current schema"""
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(connections)')}
+        if 'expires_at' not in columns:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute('ALTER TABLE connections ADD COLUMN expires_at REAL')
+                rows = conn.execute('SELECT id, data FROM connections').fetchall()
+                for record_id, data in rows:
+                    conn.execute('UPDATE connections SET expires_at = ? WHERE id = ?',
+                                 (json.loads(data).get('expires_at'), record_id))
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        conn.execute('CREATE INDEX IF NOT EXISTS connections_expiry ON connections (status, expires_at)')
+
+    def _conn(self):
+        """Return this thread's connection, taking one on first use"""
+        holder = getattr(self._local, 'holder', None)
+        if holder is None:
+            with self._connections_lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                conn = self._connect()
+            holder = self._local.holder = _Holder(conn)
+            # Servers that start a thread per request would otherwise leave
+            # one open connection behind per request.
+            weakref.finalize(holder, self._release, conn)
+        return holder.conn
+
+    def _connect(self):
+        # isolation_level=None leaves transactions to the explicit
+        # BEGIN IMMEDIATE below instead of sqlite3's implicit ones.
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None,
+                               check_same_thread=False, cached_statements=256)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        with self._connections_lock:
+            self._connections.add(conn)
+        return conn
+
+    def _release(self, conn):
+        """Take back the connection of a thread that has finished"""
+        with self._connections_lock:
+            if conn not in self._connections:
+                return
+            if len(self._idle) < MAX_IDLE_CONNECTIONS:
+                self._idle.append(conn)
+                return
+            self._connections.discard(conn)
+        conn.close()
+
+    @timed('sync')
+    def _sync_wal(self):
+        """fsync the write-ahead log, making every commit so far durable"""
+        try:
+            fd = os.open(self.wal_path, os.O_RDWR | getattr(os, 'O_BINARY', 0))
+        except FileNotFoundError:
+            # Checkpointed into the database file and removed
+            return
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _committed(self, records=1):
+        """Wait until a commit is as durable as the durability mode promises"""
+        self._commit.wait(self._commit.written(records))
+
+    @timed('save')
+    def _write(self, statements):
+        """Run (sql, params) pairs in one write transaction"""
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for sql, params in statements:
+                conn.execute(sql, params)
+            conn.execute(BUMP_GENERATION)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        self._committed(len(statements))
+
+    @property
+    def generation(self):
+        return self._conn().execute(READ_GENERATION).fetchone()[0]
+
+    def version(self):
+        """Return the database's epoch and generation, shared by every process"""
+        epoch, generation = self._conn().execute(READ_VERSION).fetchone()
+        return f'{epoch:x}-{generation}'
+
+    # Writes
+
+    def insert(self, table, record):
+        record = make_record(table, record)
+        self._write([(INSERT_SQL[table], _row(table, record))])
+        return record
+
+    @timed('save')
+    def insert_many(self, table, records):
+        records = [make_record(table, record) for record in records]
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany(INSERT_SQL[table], (_row(table, record) for record in records))
+            conn.execute(BUMP_GENERATION)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        self._committed(len(records))
+        return records
+
+    @timed('save')
+    def update(self, table, record_id, changes):
+        conn = self._conn()
+        # The read happens inside the write transaction so concurrent updates
+        # to the same record can't overwrite each other.
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(GET_SQL[table], (record_id,)).fetchone()
+            if row is None:
+                conn.execute('ROLLBACK')
+                return None
+            record = make_record(table, json.loads(row[0])).merge(changes)
+            conn.execute(UPSERT_SQL[table], _row(table, record))
+            conn.execute(BUMP_GENERATION)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        self._committed()
+        return record
+
+    @timed('save')
+    def update_many(self, table, patches):
+        conn = self._conn()
+        results = []
+        records = {}
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for record_id, changes in patches:
+                current = records.get(record_id)
+                if current is None:
+                    row = conn.execute(GET_SQL[table], (record_id,)).fetchone()
+                    current = make_record(table, json.loads(row[0])) if row else None
+                if current is None:
+                    results.append(None)
+                    continue
+                record = current.merge(changes)
+                records[record_id] = record
+                results.append(record)
+            conn.executemany(UPSERT_SQL[table], (_row(table, record) for record in records.values()))
+            conn.execute(BUMP_GENERATION)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        self._committed(max(len(records), 1))
+        return results
+
+    def replace(self, data):
+        statements = [(f'DELETE FROM {table}', ()) for table in TABLES]
+        for table in TABLES:
+            for record in data.get(table, []):
+                statements.append((UPSERT_SQL[table], _row(table, record)))
+        self._write(statements)
+
+    @timed('save')
+    def expire(self, now=None, archive=False):
+        if now is None:
+            now = datetime.now().timestamp()
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = conn.execute(
+                'SELECT data FROM connections WHERE status = ? AND expires_at <= ?', ('pending', now)
+            ).fetchall()
+            expired_at = datetime.now().isoformat()
+            for (data,) in rows:
+                record = json.loads(data)
+                record['status'] = EXPIRED
+                record['expired_at'] = expired_at
+                conn.execute(UPSERT_SQL['connections'], _row('connections', record))
+            if archive:
+                conn.execute(
+                    'INSERT OR REPLACE INTO connections_archive (id, archived_at, data) '
+                    'SELECT id, ?, data FROM connections WHERE status = ?', (expired_at, EXPIRED))
+                conn.execute('DELETE FROM connections WHERE status = ?', (EXPIRED,))
+            conn.execute(BUMP_GENERATION)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        self._committed(max(len(rows), 1))
+        return len(rows)
+
+    # Reads
+
+    @timed('scan')
+    def _select(self, table, sql, params=()):
+        return [make_record(table, json.loads(row[0])) for row in self._conn().execute(sql, params)]
+
+    def data(self):
+        return {
+            table: self._select(table, f'SELECT data FROM {table} ORDER BY created_at, id')
+            for table in TABLES
+        }
+
+    def get(self, table, record_id):
+        row = self._conn().execute(GET_SQL[table], (record_id,)).fetchone()
+        return make_record(table, json.loads(row[0])) if row else None
+
+    def find(self, table, field, value):
+        if field not in INDEXED_FIELDS[table]:
+            raise KeyError(field)
+        return self._select(table, f'SELECT data FROM {table} WHERE {field} = ? ORDER BY created_at, id', (value,))
+
+    def count(self, table, field, value):
+        if field not in INDEXED_FIELDS[table]:
+            raise KeyError(field)
+        return self._conn().execute(f'SELECT COUNT(*) FROM {table} WHERE {field} = ?', (value,)).fetchone()[0]
+
+    def query(self, table, filters=None, since=None, until=None, after=None, limit=None, descending=False):
+        clauses = []
+        params = []
+        for field, value in (filters or {}).items():
+            if field not in INDEXED_FIELDS[table]:
+                raise KeyError(field)
+            clauses.append(f'{field} = ?')
+            params.append(value)
+        if since:
+            clauses.append('created_at >= ?')
+            params.append(since)
+        if until:
+            clauses.append('created_at < ?')
+            params.append(until)
+        if after is not None:
+            clauses.append('(created_at, id) < (?, ?)' if descending else '(created_at, id) > (?, ?)')
+            params.extend(after)
+
+        direction = 'DESC' if descending else 'ASC'
+        sql = f'SELECT data FROM {table}'
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        sql += f' ORDER BY created_at {direction}, id {direction}'
+        if limit:
+            # One extra row tells whether another page follows
+            sql += ' LIMIT ?'
+            params.append(limit + 1)
+
+        records = self._select(table, sql, params)
+        if limit and len(records) > limit:
+            records = records[:limit]
+            last = records[-1]
+            return records, (last.get('created_at') or '', last['id'])
+        return records, None
+
+    @timed('scan')
+    def stats(self):
+        result = {}
+        for table in TABLES:
+            rows = self._conn().execute(f'SELECT status, COUNT(*) FROM {table} GROUP BY status').fetchall()
+            by_status = dict(rows)
+            result[table] = {'total': sum(by_status.values()), 'by_status': by_status}
+        return result
+
+    @timed('scan')
+    def series(self, table, bucket='minute', window=60):
+        if bucket not in BUCKET_SECONDS:
+            raise KeyError(bucket)
+        since = datetime.fromtimestamp(series_start(bucket, window)).isoformat()
+        rows = self._conn().execute(
+            f'SELECT substr(created_at, 1, 16) AS minute, COUNT(*) FROM {table} '
+            'WHERE created_at >= ? GROUP BY minute',
+            (since,)
+        )
+        per_minute = {}
+        for minute, count in rows:
+            try:
+                start = int(datetime.fromisoformat(minute).timestamp())
+            except ValueError:
+                continue
+            per_minute[start] = per_minute.get(start, 0) + count
+        return series_from_minutes(per_minute, bucket, window)
+
+    def close(self):
+        self._commit.close()
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = set()
+            self._idle = []
+        self._local = threading.local()
@@ -0,0 +1,90 @@
+"""
+Running statistics kept up to date by the store on every write.
+"""
+
+from collections import Counter
+from datetime import datetime
+
+BUCKET_SECONDS = {'minute': 60, 'hour': 3600}
+
+
+def _bucket_start(created_at, seconds=60):
+    """Return the epoch second starting the bucket a record was created in"""
+    if not created_at:
+        return None
+    try:
+        timestamp = datetime.fromisoformat(created_at).timestamp()
+    except (TypeError, ValueError):
+        return None
+    return int(timestamp // seconds) * seconds
+
+
+class Counters:
+    """Totals, per-status counts and per-minute creation counts for one table"""
+
+    def __init__(self):
+        self.total = 0
+        self.by_status = Counter()
+        # Start of minute (epoch seconds) -> records created in it
+        self.per_minute = Counter()
+
+    def add(self, record):
+        self.total += 1
+        self.by_status[record.get('status')] += 1
+        minute = _bucket_start(record.get('created_at'))
+        if minute is not None:
+            self.per_minute[minute] += 1
+
+    def remove(self, record):
+        """Account for a record leaving the table"""
+        self.total -= 1
+        self._discount(record.get('status'))
+        minute = _bucket_start(record.get('created_at'))
+        if minute is not None:
+            self.per_minute[minute] -= 1
+            if not self.per_minute[minute]:
+                del self.per_minute[minute]
+
+    def _discount(self, status):
+        self.by_status[status] -= 1
+        if not self.by_status[status]:
+            del self.by_status[status]
+
+    def change(self, previous, record):
+        """Account for a record being replaced by a newer version"""
+        old_status = previous.get('status')
+        new_status = record.get('status')
+        if old_status != new_status:
+            self._discount(old_status)
+            self.by_status[new_status] += 1
+
+    def series(self, bucket='minute', window=60, now=None):
+        """Return creation counts for the last window buckets, oldest first"""
+        return series_from_minutes(self.per_minute, bucket, window, now)
+
+
+def series_start(bucket='minute', window=60, now=None):
+    """Return the epoch second at which a series window begins"""
+    seconds = BUCKET_SECONDS[bucket]
+    if now is None:
+        now = datetime.now().timestamp()
+    return int(now // seconds) * seconds - (window - 1) * seconds
+
+
+def series_from_minutes(per_minute, bucket='minute', window=60, now=None):
+    """Build a series from a mapping of minute start to count
+
+    Hourly buckets are summed from the minute counts, so the cost is
+    proportional to the window and never to the number of records.
+    """
+    seconds = BUCKET_SECONDS[bucket]
+    first = series_start(bucket, window, now)
+    points = []
+    for i in range(window):
+        start = first + i * seconds
+        if seconds == 60:
+            count = per_minute.get(start, 0)
+        else:
+            count = sum(per_minute.get(minute, 0) for minute in range(start, start + seconds, 60))
+        points.append({'timestamp': start, 'count': count})
+    return points
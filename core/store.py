@@ -0,0 +1,683 @@
+"""
+Append-only storage engine for the wallet platform database.
+
+The snapshot file keeps the original ``wallet_connections.json`` layout
+(``{"connections": [...], "transactions": [...]}``). Every mutation is appended
+as a single JSON line to ``<snapshot>.wal`` and replayed on startup. Once the
+log grows past ``compact_threshold`` records it is folded into a fresh snapshot
+by a background thread. Expired connections can be archived to
+``<snapshot>.archive.ndjson``, which is never read back.
+
+Next to each snapshot goes a ``<snapshot>.map`` (``core.mapped``), so a new
+store answers ``get`` and ``stats`` from the mapped file and the log, and only
+loads the tables once something else needs them.
+
+Rows are held as ``core.records`` objects, which are encoded once, when they
+are written or first read, and keep the bytes. Log entries, snapshots and
+responses are all assembled from those cached encodings.
+
+A store stays resident for the life of the process (the Flask server or a warm
+Vercel function). Reads only go back to disk when the snapshot or log changed
+underneath it, which happens when another process writes to the same files.
+
+Writers are serialized by an in-process lock plus an ``fcntl`` lock on
+``<snapshot>.lock``, and catch up with other processes' entries before
+appending, so several workers can share one database. Appends reach the log
+file before the lock is released; when they are fsynced, and whether a write
+waits for that, depends on the durability mode (``core.durability``).
+"""
+
+import glob
+import heapq
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+
+from core import serializer
+from core.durability import GROUP, GROUP_COMMIT_INTERVAL, GROUP_COMMIT_RECORDS, GroupCommit
+from core.expiry import EXPIRED
+from core.indexes import add_key, build_indexes, remove_key, sort_key
+from core.locking import FileLock, lock_file, unlock_file
+from core.mapped import MappedSnapshot, MappedView, SnapshotWriter, Stale, signature_of
+from core.metrics import timed
+from core.records import check_record, make_record
+from core.repository import TABLES, Repository
+from core.stats import Counters
+
+COMPACT_THRESHOLD = 1000
+# Upper bound, in seconds, on how stale a read may be with respect to writes
+# made by other processes. Writes always catch up first.
+REFRESH_INTERVAL = 0.1
+
+logger = logging.getLogger(__name__)
+
+
+def _empty_tables():
+    return {table: [] for table in TABLES}
+
+
+class Store(Repository):
+    """JSON snapshot plus append-only log, held in memory with indexes"""
+
+    def __init__(self, path, compact_threshold=COMPACT_THRESHOLD, refresh_interval=REFRESH_INTERVAL,
+                 durability=GROUP, commit_interval=GROUP_COMMIT_INTERVAL, commit_records=GROUP_COMMIT_RECORDS,
+                 mapped=True):
+        self.path = path
+        self.map_path = path + '.map'
+        self.log_path = path + '.wal'
+        self.compacting_path = path + '.wal.compacting'
+        self.archive_path = path + '.archive.ndjson'
+        self.compact_threshold = compact_threshold
+        self.refresh_interval = refresh_interval
+        # Bumped on every change to the in-memory tables, whichever process
+        # made it. Counts differ between processes, so versions carry a
+        # token of this instance as well.
+        self.generation = 0
+        self._instance = secrets.token_hex(4)
+
+        self._lock = threading.RLock()
+        self._write_lock = FileLock(path + '.lock', self._lock)
+        self._compact_lock = threading.Lock()
+        self._compact_lock_path = path + '.compact.lock'
+        self._log = None
+        self._log_records = 0
+        self._log_inode = None
+        self._log_offset = 0
+        self._snapshot_signature = None
+        self._checked_at = 0.0
+
+        # Until something needs the whole tables, get() and stats() are
+        # answered from the snapshot's .map file and the log
+        self._view = self._open_view() if mapped else None
+        if self._view is None:
+            with self._write_lock:
+                self._load()
+        self._commit = GroupCommit(self._sync_log, durability, commit_interval, commit_records)
+
+    # Startup / replay
+
+    def _reset(self):
+        self._tables = _empty_tables()
+        self._positions = {table: {} for table in TABLES}
+        # Sort keys of every record per table, in creation order
+        self._order = {table: [] for table in TABLES}
+        self._indexes = build_indexes()
+        self._counters = {table: Counters() for table in TABLES}
+        # (expires_at, id) of pending connections. Entries are not removed
+        # when a connection changes; expire() skips the stale ones.
+        self._expiry = []
+
+    @timed('load')
+    def _load(self):
+        """Load the snapshot and replay any pending log segments"""
+        # Torn tails are only cut while holding the write lock; otherwise the
+        # partial line may be another process's append in flight.
+        truncate = self._write_lock.held
+        while True:
+            self._reset()
+            self._log_records = 0
+
+            self._snapshot_signature = signature_of(self.path)
+            if self._snapshot_signature is not None:
+                with open(self.path, 'r') as f:
+                    text = f.read()
+                # Rows become records as they are decoded, so the whole
+                # snapshot never exists as dicts at once.
+                for table, record in serializer.iter_arrays(text):
+                    if table in self._tables:
+                        self._apply(table, make_record(table, record))
+                del text
+
+            # Open the live log before looking for a compacting segment: if a
+            # rotation slips in between, the log we hold is that segment and
+            # replaying it twice is harmless.
+            self._open_log('ab+')
+            try:
+                with open(self.compacting_path, 'r+b' if truncate else 'rb') as f:
+                    self._log_records += self._replay(f, truncate=truncate)[0]
+            except FileNotFoundError:
+                pass
+            applied, self._log_offset = self._replay(self._log, truncate=truncate)
+            self._log_records += applied
+
+            # A compaction finishing while we read means the segments we
+            # replayed may no longer match the snapshot; start over.
+            if signature_of(self.path) == self._snapshot_signature:
+                break
+
+        self.generation += 1
+        self._checked_at = time.monotonic()
+
+    def _open_log(self, mode):
+        if self._log:
+            self._log.close()
+        self._log = open(self.log_path, mode)
+        self._log_inode = os.fstat(self._log.fileno()).st_ino
+        self._log_offset = self._log.seek(0, os.SEEK_END)
+
+    def _replay(self, f, offset=0, truncate=False):
+        """Apply every complete entry of a log segment from offset on
+
+        Returns the number of records applied and the offset just past the
+        last complete one.
+        """
+        applied = 0
+        good_offset = offset
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            # Only the last line can be torn, and that one has no newline yet
+            try:
+                applied += self._replay_entry(json.loads(line))
+            except (AttributeError, KeyError, TypeError, ValueError) as e:
+                # One bad entry mustn't keep the whole database from loading
+                logger.warning('Skipping log entry at %s:%d that cannot be applied: %r', f.name, good_offset, e)
+            good_offset += len(line)
+
+        if truncate and good_offset < f.seek(0, os.SEEK_END):
+            # A crash mid-append left a partial line; cut it so new entries
+            # don't get glued onto it.
+            f.truncate(good_offset)
+        return applied, good_offset
+
+    def _replay_entry(self, entry):
+        """Apply one log entry, all of it or, if any record is invalid, none; returns its record count"""
+        table = entry['table']
+        if entry.get('op') == 'delete':
+            self._remove(table, entry['id'])
+            return 1
+        records = entry['records'] if entry.get('op') == 'put_many' else [entry['record']]
+        records = [make_record(table, record) for record in records]
+        for record in records:
+            check_record(record)
+        for record in records:
+            self._apply(table, record)
+        return len(records)
+
+    def _apply(self, table, record):
+        """Insert or replace a record in memory and keep its indexes current"""
+        rows = self._tables[table]
+        positions = self._positions[table]
+        order = self._order[table]
+        indexes = self._indexes[table]
+        position = positions.get(record['id'])
+        if position is None:
+            # The row goes in before its position is published
+            rows.append(record)
+            positions[record['id']] = len(rows) - 1
+            add_key(order, sort_key(record))
+            for index in indexes.values():
+                index.add(record)
+            self._counters[table].add(record)
+            previous = None
+        else:
+            previous = rows[position]
+            rows[position] = record
+            moved = sort_key(previous) != sort_key(record)
+            if moved:
+                remove_key(order, sort_key(previous))
+                add_key(order, sort_key(record))
+            for field, index in indexes.items():
+                if moved or previous.get(field) != record.get(field):
+                    index.remove(previous)
+                    index.add(record)
+            self._counters[table].change(previous, record)
+
+        if (table == 'connections' and record.get('status') == 'pending'
+                and record.get('expires_at') is not None
+                and (previous is None or previous.get('status') != 'pending'
+                     or previous.get('expires_at') != record.get('expires_at'))):
+            heapq.heappush(self._expiry, (record['expires_at'], record['id']))
+        self.generation += 1
+
+    def _remove(self, table, record_id):
+        """Drop a record from memory and from its indexes"""
+        rows = self._tables[table]
+        positions = self._positions[table]
+        position = positions.pop(record_id, None)
+        if position is None:
+            return
+        record = rows[position]
+        # Move the last row into the hole so removal stays O(1); it is
+        # copied before the end is cut off
+        last = rows[-1]
+        if last is not record:
+            rows[position] = last
+            positions[last['id']] = position
+        rows.pop()
+        remove_key(self._order[table], sort_key(record))
+        for index in self._indexes[table].values():
+            index.remove(record)
+        self._counters[table].remove(record)
+        self.generation += 1
+
+    def _open_view(self):
+        """Return a MappedView of the files as they are, or None if the .map can't be used"""
+        signature = signature_of(self.path)
+        try:
+            snapshot = MappedSnapshot(self.map_path, signature) if signature is not None else None
+            return MappedView(snapshot, self.path, signature, self.log_path, self.compacting_path,
+                              self.refresh_interval)
+        except (OSError, ValueError, Stale):
+            return None
+
+    def _follow(self, view):
+        """Replace a view that went stale, loading the tables if no new one can be opened"""
+        with self._lock:
+            if self._view is view:
+                replacement = self._open_view()
+                if replacement is None:
+                    self._load()
+                self._view = replacement
+
+    def refresh(self, force=False):
+        """Pick up writes made by other processes since the last check"""
+        if self._view is not None:
+            # First use of the whole tables
+            with self._lock:
+                if self._view is not None:
+                    self._load()
+                    self._view = None
+            return
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.refresh_interval:
+            return
+        with self._lock:
+            self._checked_at = now
+            try:
+                log_stat = os.stat(self.log_path)
+            except FileNotFoundError:
+                log_stat = None
+
+            if (signature_of(self.path) != self._snapshot_signature
+                    or log_stat is None
+                    or log_stat.st_ino != self._log_inode
+                    or log_stat.st_size < self._log_offset):
+                # Another process compacted or replaced the database.
+                self._load()
+            elif log_stat.st_size > self._log_offset:
+                # Another process appended to the log; replay just the tail.
+                self._replay_tail()
+
+    @timed('load')
+    def _replay_tail(self):
+        applied, self._log_offset = self._replay(
+            self._log, self._log_offset, truncate=self._write_lock.held)
+        self._log_records += applied
+
+    # Writes
+
+    def _append(self, table, record):
+        return self._append_entry({'op': 'put', 'table': table, 'record': self.encode(table, record)})
+
+    @timed('save')
+    def _append_entry(self, entry, records=1):
+        """Write an entry to the log, returning its group-commit ticket"""
+        self._log.write(serializer.dumps(entry) + b'\n')
+        self._log.flush()
+        self._log_offset = self._log.tell()
+        self._log_records += records
+        return self._commit.written(records)
+
+    def _append_many(self, table, records):
+        # One line for the whole batch: a torn write loses all of it, never
+        # part of it.
+        encoded = serializer.join([self.encode(table, record) for record in records])
+        return self._append_entry({'op': 'put_many', 'table': table, 'records': encoded}, len(records))
+
+    @timed('sync')
+    def _sync_log(self):
+        """fsync the live log without holding up writers"""
+        with self._lock:
+            if self._log is None:
+                return
+            fd = os.dup(self._log.fileno())
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def insert(self, table, record):
+        """Append a new record and log it"""
+        record = make_record(table, record)
+        check_record(record)
+        with self._write_lock:
+            self.refresh(force=True)
+            ticket = self._append(table, record)
+            self._apply(table, record)
+        self._commit.wait(ticket)
+        self._maybe_compact()
+        return record
+
+    def insert_many(self, table, records):
+        """Append several new records as one log entry"""
+        if not records:
+            return records
+        records = [make_record(table, record) for record in records]
+        for record in records:
+            check_record(record)
+        with self._write_lock:
+            self.refresh(force=True)
+            ticket = self._append_many(table, records)
+            for record in records:
+                self._apply(table, record)
+        self._commit.wait(ticket)
+        self._maybe_compact()
+        return records
+
+    def update(self, table, record_id, changes):
+        """Merge changes into a record, returning the new version or None"""
+        with self._write_lock:
+            self.refresh(force=True)
+            current = self._get(table, record_id)
+            if current is None:
+                return None
+            # Records are never mutated in place so that compaction can take a
+            # cheap shallow copy of the tables.
+            record = current.merge(changes)
+            check_record(record)
+            ticket = self._append(table, record)
+            self._apply(table, record)
+        self._commit.wait(ticket)
+        self._maybe_compact()
+        return record
+
+    def update_many(self, table, patches):
+        """Merge several changes and log them as one entry"""
+        results = []
+        ticket = 0
+        with self._write_lock:
+            self.refresh(force=True)
+            records = {}
+            for record_id, changes in patches:
+                current = records.get(record_id) or self._get(table, record_id)
+                if current is None:
+                    results.append(None)
+                    continue
+                record = current.merge(changes)
+                # Checked before anything is logged, so a bad patch fails the
+                # whole batch
+                check_record(record)
+                records[record_id] = record
+                results.append(record)
+            if records:
+                ticket = self._append_many(table, list(records.values()))
+                for record in records.values():
+                    self._apply(table, record)
+        self._commit.wait(ticket)
+        self._maybe_compact()
+        return results
+
+    def expire(self, now=None, archive=False):
+        if now is None:
+            now = time.time()
+        expired = 0
+        with self._write_lock:
+            self.refresh(force=True)
+            expired_at = datetime.now().isoformat()
+            while self._expiry and self._expiry[0][0] <= now:
+                expires_at, record_id = heapq.heappop(self._expiry)
+                current = self._get('connections', record_id)
+                if (current is None or current.get('status') != 'pending'
+                        or current.get('expires_at') != expires_at):
+                    continue
+                record = current.merge({'status': EXPIRED, 'expired_at': expired_at})
+                self._append('connections', record)
+                self._apply('connections', record)
+                expired += 1
+            if archive:
+                self._archive_expired()
+        self._commit.wait(self._commit.ticket)
+        self._maybe_compact()
+        return expired
+
+    def _archive_expired(self):
+        """Move every expired connection to the archive segment"""
+        records = self.find('connections', 'status', EXPIRED)
+        if not records:
+            return
+        # The archive is made durable before the records leave the log, so a
+        # crash can at worst leave a record in both places.
+        with open(self.archive_path, 'ab') as f:
+            for record in records:
+                f.write(record.to_json(cache=False) + b'\n')
+            f.flush()
+            os.fsync(f.fileno())
+        for record in records:
+            self._append_entry({'op': 'delete', 'table': 'connections', 'id': record['id']})
+            self._remove('connections', record['id'])
+
+    def replace(self, data):
+        """Replace the whole database and write it straight to the snapshot"""
+        with self._compact_lock:
+            fd = lock_file(self._compact_lock_path)
+            try:
+                with self._write_lock:
+                    self._view = None
+                    self._reset()
+                    for table in TABLES:
+                        for record in data.get(table, []):
+                            self._apply(table, make_record(table, record))
+                    self._write_snapshot(self._tables)
+                    self._open_log('wb+')
+                    self._log_records = 0
+                    if os.path.exists(self.compacting_path):
+                        os.remove(self.compacting_path)
+            finally:
+                unlock_file(fd)
+
+    # Reads
+
+    @timed('scan')
+    def data(self):
+        """Return the live tables in the original database layout"""
+        self.refresh()
+        return self._tables
+
+    def version(self):
+        """Return this instance's token and generation"""
+        view = self._view
+        if view is not None:
+            try:
+                return view.version()
+            except Stale:
+                self._follow(view)
+                return self.version()
+        self.refresh()
+        return f'{self._instance}-{self.generation}'
+
+    def encode(self, table, record):
+        """Return a record's cached JSON encoding, encoding it on first use"""
+        return record.to_json()
+
+    def _get(self, table, record_id):
+        position = self._positions[table].get(record_id)
+        if position is None:
+            return None
+        return self._tables[table][position]
+
+    def get(self, table, record_id):
+        """Look up a record by id"""
+        view = self._view
+        if view is not None:
+            try:
+                return view.get(table, record_id)
+            except Stale:
+                self._follow(view)
+                return self.get(table, record_id)
+        self.refresh()
+        # Rows move while a record is removed, so lookups take the lock
+        # like query() does
+        with self._lock:
+            return self._get(table, record_id)
+
+    @timed('scan')
+    def find(self, table, field, value):
+        """Return the records whose indexed field equals value"""
+        self.refresh()
+        with self._lock:
+            rows = self._tables[table]
+            positions = self._positions[table]
+            return [rows[positions[record_id]] for record_id in self._indexes[table][field].ids(value)]
+
+    def count(self, table, field, value):
+        """Count the records whose indexed field equals value"""
+        self.refresh()
+        return self._indexes[table][field].count(value)
+
+    @timed('scan')
+    def query(self, table, filters=None, since=None, until=None, after=None, limit=None, descending=False):
+        """Return one page of records ordered by created_at
+
+        ``filters`` maps indexed fields to the value they must equal; the
+        smallest matching index bucket is walked and the other filters are
+        checked per record. ``since`` is inclusive and ``until`` exclusive,
+        both compared against ``created_at``. ``after`` is the sort key of the
+        last record of the previous page.
+
+        Returns the records and the key to resume from, which is None once
+        the last page has been reached.
+        """
+        self.refresh()
+        with self._lock:
+            filters = dict(filters or {})
+            indexes = self._indexes[table]
+            if filters:
+                field = min(filters, key=lambda f: indexes[f].count(filters[f]))
+                keys = indexes[field].keys(filters.pop(field))
+            else:
+                keys = self._order[table]
+
+            lo = bisect_left(keys, (since,)) if since else 0
+            hi = bisect_left(keys, (until,)) if until else len(keys)
+            if after is not None:
+                if descending:
+                    hi = min(hi, bisect_left(keys, after))
+                else:
+                    lo = max(lo, bisect_right(keys, after))
+
+            positions = range(hi - 1, lo - 1, -1) if descending else range(lo, hi)
+            records = []
+            for position in positions:
+                record = self._get(table, keys[position][1])
+                if all(record.get(f) == v for f, v in filters.items()):
+                    records.append(record)
+                    if limit and len(records) == limit:
+                        more = position != positions[-1]
+                        return records, sort_key(record) if more else None
+            return records, None
+
+    def stats(self):
+        """Return the running totals and per-status counts for every table"""
+        view = self._view
+        if view is not None:
+            try:
+                return view.stats()
+            except Stale:
+                self._follow(view)
+                return self.stats()
+        self.refresh()
+        return {
+            table: {'total': counters.total, 'by_status': dict(counters.by_status)}
+            for table, counters in self._counters.items()
+        }
+
+    @timed('scan')
+    def series(self, table, bucket='minute', window=60):
+        """Return records created per bucket over the last window buckets"""
+        self.refresh()
+        return self._counters[table].series(bucket, window)
+
+    # Compaction
+
+    def _maybe_compact(self):
+        if self._log_records >= self.compact_threshold and not self._compact_lock.locked():
+            threading.Thread(target=self.compact, daemon=True).start()
+
+    def compact(self):
+        """Fold the current log into a new snapshot"""
+        if not self._compact_lock.acquire(blocking=False):
+            return
+        # Only one process compacts at a time; the others just skip.
+        fd = lock_file(self._compact_lock_path, blocking=False)
+        if fd is None:
+            self._compact_lock.release()
+            return
+        try:
+            # Temp files left by an interrupted compaction can't be in use by
+            # anyone while we hold the compaction lock.
+            for stale in glob.glob(glob.escape(self.path) + '.*.tmp'):
+                os.remove(stale)
+            with self._write_lock:
+                # The snapshot is built from memory, so it must include every
+                # entry other processes have appended to the log.
+                self.refresh(force=True)
+                # A leftover segment from an interrupted compaction is kept as
+                # is; the snapshot below covers it and the live log replays
+                # idempotently on top.
+                if not os.path.exists(self.compacting_path):
+                    # The segment is replayed if the snapshot never lands, so
+                    # make every process's appends to it durable first.
+                    os.fsync(self._log.fileno())
+                    self._log.close()
+                    self._log = None
+                    os.replace(self.log_path, self.compacting_path)
+                    self._open_log('ab+')
+                    self._log_records = 0
+                tables = {table: list(rows) for table, rows in self._tables.items()}
+
+            self._write_snapshot(tables)
+            os.remove(self.compacting_path)
+        finally:
+            unlock_file(fd)
+            self._compact_lock.release()
+
+    @timed('save')
+    def _write_snapshot(self, tables):
+        """Write the snapshot to a temporary file and rename it into place"""
+        suffix = f'{os.getpid()}.{threading.get_ident()}.tmp'
+        tmp_path = f'{self.path}.{suffix}'
+        writer = SnapshotWriter(f'{self.map_path}.{suffix}')
+        # Compact JSON streamed from the cached record encodings; records
+        # nobody has read are encoded here but not cached. The .map gets the
+        # same bytes.
+        try:
+            with open(tmp_path, 'wb') as f:
+                for i, table in enumerate(TABLES):
+                    f.write(b'{' if i == 0 else b',')
+                    f.write(serializer.dumps(table) + b':[')
+                    for j, record in enumerate(tables.get(table, ())):
+                        if j:
+                            f.write(b',')
+                        data = record.to_json(cache=False)
+                        f.write(data)
+                        writer.add(table, record, data)
+                    f.write(b']')
+                f.write(b'}')
+                f.flush()
+                os.fsync(f.fileno())
+            # Renaming keeps the inode and mtime, so the .map can name the
+            # snapshot before it is in place
+            writer.finish(signature_of(tmp_path))
+        except BaseException:
+            writer.discard()
+            raise
+        os.replace(writer.path, self.map_path)
+        os.replace(tmp_path, self.path)
+        self._snapshot_signature = signature_of(self.path)
+
+    def close(self):
+        # A background compaction finishes with the log still open
+        with self._compact_lock:
+            self._commit.close()
+            with self._lock:
+                if self._log:
+                    self._log.close()
+                    self._log = None
+
@@ -0,0 +1,99 @@
+"""
+``BaseHTTPRequestHandler`` front end for the Vercel functions.
+
+Every file in ``api/`` subclasses ``ServiceHandler``; ``vercel.json`` decides
+which paths reach which function, and the shared router picks the route.
+Nothing here imports Flask, so a cold start only loads the standard library
+and ``core``.
+"""
+
+import time
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import parse_qsl, urlsplit
+
+from core import metrics
+from core.routing import Router
+from core.service import CORS_HEADERS, ROUTES, Request, Service, env_config, error
+
+router = Router(ROUTES)
+
+# Background threads don't run between serverless invocations, so the
+# sweeper is off unless EXPIRY_SWEEP_INTERVAL asks for it. Requests always
+# come through Vercel's proxy, which records the client in X-Forwarded-For.
+service = Service(env_config(EXPIRY_SWEEP_INTERVAL=0, TRUSTED_PROXIES=1))
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """Serve any API route through the shared service"""
+
+    def do_GET(self):
+        self.dispatch()
+
+    def do_POST(self):
+        self.dispatch()
+
+    def do_OPTIONS(self):
+        """Handle preflight request"""
+        self.send_response(200)
+        for name, value in CORS_HEADERS.items():
+            self.send_header(name, value)
+        self.end_headers()
+
+    def dispatch(self):
+        started = time.perf_counter()
+        url = urlsplit(self.path)
+        endpoint, params, pattern = router.match(self.command, url.path)
+        if endpoint is None:
+            response = error(405 if params else 404, 'Method not allowed' if params else 'Not found')
+            pattern = 'unmatched'
+        else:
+            response = service.handle(endpoint, self.build_request(url), params)
+        try:
+            self.send(response)
+        finally:
+            metrics.observe_request(pattern, self.command, response.status, time.perf_counter() - started)
+
+    def build_request(self, url):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        # Vercel terminates TLS in front of the function
+        scheme = self.headers.get('X-Forwarded-Proto', 'https')
+        host = self.headers.get('Host', 'localhost')
+        # Like Flask, the first value of a repeated parameter wins
+        args = {}
+        for name, value in parse_qsl(url.query, keep_blank_values=True):
+            args.setdefault(name, value)
+        return Request(self.command, url.path, args, self.headers, body, f'{scheme}://{host}/',
+                       self.client_address[0])
+
+    def send(self, response):
+        self.send_response(response.status)
+        if response.status != 304:
+            self.send_header('Content-type', response.content_type)
+        for name, value in CORS_HEADERS.items():
+            self.send_header(name, value)
+        for name, value in response.headers.items():
+            self.send_header(name, value)
+
+        if not response.streamed:
+            body = response.body.encode() if isinstance(response.body, str) else response.body
+            # A 304 has no body, and its headers describe the cached one
+            if response.status != 304:
+                self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        # Streamed bodies end when the connection closes
+        self.close_connection = True
+        self.end_headers()
+        try:
+            for chunk in response.body:
+                self.wfile.write(chunk)
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            close = getattr(response.body, 'close', None)
+            if close is not None:
+                close()
@@ -4,66 +4,11 @@ Example Usage of Wallet Platform
 This script demonstrates how to use the wallet platform programmatically.
 """
 
-import requests
 import json
 import time
 from datetime import datetime
 
-class WalletPlatformClient:
-    def __init__(self, base_url="http://localhost:5000"):
-        self.base_url = base_url
-        
-    def create_connection(self, user_id, metadata=None):
-        """Create a new wallet connection"""
-        url = f"{self.base_url}/api/connect"
-        data = {
-            "user_id": user_id,
-            "metadata": metadata or {}
-        }
-        
-        response = requests.post(url, json=data)
-        return response.json()
-    
-    def get_connection(self, connection_id):
-        """Get connection status"""
-        url = f"{self.base_url}/api/connections/{connection_id}"
-        response = requests.get(url)
-        return response.json()
-    
-    def update_connection(self, connection_id, wallet_address, network="ethereum"):
-        """Update connection with wallet info"""
-        url = f"{self.base_url}/api/connections/{connection_id}/update"
-        data = {
-            "wallet_address": wallet_address,
-            "network": network
-        }
-        
-        response = requests.post(url, json=data)
-        return response.json()
-    
-    def create_transaction(self, connection_id, to_address, amount):
-        """Create a transaction request"""
-        url = f"{self.base_url}/api/transactions"
-        data = {
-            "connection_id": connection_id,
-            "to_address": to_address,
-            "amount": amount
-        }
-        
-        response = requests.post(url, json=data)
-        return response.json()
-    
-    def get_transaction(self, transaction_id):
-        """Get transaction status"""
-        url = f"{self.base_url}/api/transactions/{transaction_id}"
-        response = requests.get(url)
-        return response.json()
-    
-    def get_stats(self):
-        """Get platform statistics"""
-        url = f"{self.base_url}/api/stats"
-        response = requests.get(url)
-        return response.json()
+from wallet_client import ClientError, WalletPlatformClient
 
 def main():
     """Example usage of the wallet platform"""
@@ -127,7 +72,10 @@ def main():
         
         print("\n✅ All examples completed successfully!")
         
-    except requests.exceptions.ConnectionError:
+    except ClientError as e:
+        if e.status is not None:
+            print(f"❌ Error: {e}")
+            return
         print("❌ Error: Could not connect to the server.")
         print("Make sure the backend server is running at http://localhost:5000")
         print("Run: python start.py to start the platform")
@@ -151,26 +99,39 @@ def demonstrate_telegram_integration():
     
     connections = []
     
-    for user in telegram_users:
-        metadata = {
-            "source": "telegram",
-            "username": user["username"],
-            "created_via": "bot"
+    # One request for the whole campaign instead of one per user
+    items = [
+        {
+            "user_id": user["user_id"],
+            "metadata": {
+                "source": "telegram",
+                "username": user["username"],
+                "created_via": "bot"
+            }
         }
-        
-        try:
-            result = client.create_connection(user["user_id"], metadata)
-            connections.append({
-                "user": user,
-                "connection_id": result["connection_id"],
-                "link": result["connection_link"]
-            })
-            
-            print(f"✅ Created connection for {user['username']}")
-            print(f"   Link: {result['connection_link']}")
-            
-        except Exception as e:
-            print(f"❌ Failed to create connection for {user['username']}: {e}")
+        for user in telegram_users
+    ]
+    
+    try:
+        batch = client.create_connections_batch(items)
+        results = batch["results"]
+    except Exception as e:
+        print(f"❌ Failed to create connections: {e}")
+        results = []
+    
+    for user, result in zip(telegram_users, results):
+        if not result.get("success"):
+            print(f"❌ Failed to create connection for {user['username']}: {result.get('error')}")
+            continue
+        
+        connections.append({
+            "user": user,
+            "connection_id": result["connection_id"],
+            "link": result["connection_link"]
+        })
+        
+        print(f"✅ Created connection for {user['username']}")
+        print(f"   Link: {result['connection_link']}")
     
     print(f"\n📊 Created {len(connections)} connections for Telegram users")
     
@@ -187,5 +148,5 @@ if __name__ == "__main__":
     print("\n💡 Tips:")
     print("- Use the admin dashboard to monitor connections")
     print("- Share connection links with users via Telegram")
-    print("- Track transaction status in real-time")
+    print("- Track transaction status in real-time with wait_for_connection_status() / wait_for_transaction_status()")
     print("- Integrate with your existing bot or application") 
\ No newline at end of file
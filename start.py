@@ -2,8 +2,13 @@
 """
 Wallet Platform Startup Script
 This script helps you start the wallet platform easily.
+
+    python start.py                                  # Flask development server
+    python start.py --mode wsgi --workers 4 --threads 8
+    python start.py --mode asgi --workers 2
 """
 
+import argparse
 import os
 import sys
 import subprocess
@@ -48,9 +53,25 @@ def install_backend_dependencies():
         print(f"❌ Error installing backend dependencies: {e}")
         return False
 
-def start_backend():
-    """Start the Flask backend server"""
-    print("\n🚀 Starting backend server...")
+def server_command(mode, workers, threads, port):
+    """Return the command line that runs the backend in the given mode"""
+    if mode == "asgi":
+        # Reads run on WORKER_THREADS threads per worker process
+        return [sys.executable, "-m", "uvicorn", "asgi:app", "--host", "0.0.0.0",
+                "--port", str(port), "--workers", str(workers)]
+    if mode == "wsgi":
+        if os.name == "nt":
+            # gunicorn doesn't run on Windows; waitress serves one process
+            if workers > 1:
+                print("⚠️  waitress runs a single process; using --threads only")
+            return [sys.executable, "-m", "waitress", f"--threads={threads}", f"--port={port}", "server:app"]
+        return [sys.executable, "-m", "gunicorn", "--workers", str(workers), "--threads", str(threads),
+                "--bind", f"0.0.0.0:{port}", "server:app"]
+    return [sys.executable, "server.py"]
+
+def start_backend(mode="dev", workers=1, threads=8, port=5000):
+    """Start the backend server"""
+    print(f"\n🚀 Starting backend server ({mode})...")
     
     try:
         # Get the current working directory
@@ -64,40 +85,51 @@ def start_backend():
         
         # Start the server from the backend directory
         process = subprocess.Popen(
-            [sys.executable, "server.py"],
-            cwd=backend_dir
+            server_command(mode, workers, threads, port),
+            cwd=backend_dir,
+            env=dict(os.environ, PORT=str(port), WORKER_THREADS=str(threads))
         )
         
         # Wait a moment for server to start
         time.sleep(3)
         
-        print("✅ Backend server started at http://localhost:5000")
-        print("📊 Admin dashboard: http://localhost:5000/admin")
-        print("🌐 Main site: http://localhost:5000")
+        print(f"✅ Backend server started at http://localhost:{port}")
+        print(f"📊 Admin dashboard: http://localhost:{port}/admin")
+        print(f"🌐 Main site: http://localhost:{port}")
         
         return process
     except Exception as e:
         print(f"❌ Error starting backend: {e}")
         return None
 
-def open_browsers():
+def open_browsers(port=5000):
     """Open the platform in browser"""
     print("\n🌍 Opening platform in browser...")
     
     try:
         # Open main site
-        webbrowser.open("http://localhost:5000")
+        webbrowser.open(f"http://localhost:{port}")
         time.sleep(1)
         
         # Open admin dashboard
-        webbrowser.open("http://localhost:5000/admin")
+        webbrowser.open(f"http://localhost:{port}/admin")
         
         print("✅ Platform opened in browser")
     except Exception as e:
         print(f"❌ Error opening browser: {e}")
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Start the wallet platform")
+    parser.add_argument("--mode", choices=("dev", "wsgi", "asgi"), default="dev",
+                        help="dev: Flask debug server; wsgi: gunicorn (waitress on Windows); asgi: uvicorn")
+    parser.add_argument("--workers", type=int, default=1, help="server processes (wsgi, asgi)")
+    parser.add_argument("--threads", type=int, default=8, help="threads per process (wsgi, asgi)")
+    parser.add_argument("--port", type=int, default=5000)
+    return parser.parse_args()
+
 def main():
     """Main startup function"""
+    args = parse_args()
     print_banner()
     
     # Check Python version
@@ -109,17 +141,17 @@ def main():
         sys.exit(1)
     
     # Start backend (now serves both backend API and frontend pages)
-    backend_process = start_backend()
+    backend_process = start_backend(args.mode, args.workers, args.threads, args.port)
     if not backend_process:
         print("❌ Failed to start backend. Exiting.")
         sys.exit(1)
     
     # Open browsers
-    open_browsers()
+    open_browsers(args.port)
     
     print("\n🎉 Wallet Platform is now running!")
     print("\n📋 Quick Guide:")
-    print("1. Go to http://localhost:5000/admin to create connection links")
+    print(f"1. Go to http://localhost:{args.port}/admin to create connection links")
     print("2. Share the generated links with users")
     print("3. Users can connect their wallets through the links")
     print("4. Monitor connections and transactions in the admin dashboard")
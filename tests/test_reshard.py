@@ -0,0 +1,80 @@
+import os
+
+import pytest
+
+from core.repository import TABLES, open_store
+from core.reshard import layout_paths, reshard
+from core.sharding import ShardedStore, has_data, read_shard_count
+
+
+def quiet(*args):
+    pass
+
+
+def records(count=30):
+    connections = [{'id': f'c{i:02}', 'user_id': f'u{i % 4}', 'status': 'connected' if i % 3 else 'pending',
+                    'created_at': f'2026-01-01T00:{i:02}:00', 'wallet_address': f'0x{i}', 'network': 'ethereum',
+                    'expires_at': None, 'metadata': {'n': i}} for i in range(count)]
+    transactions = [{'id': f't{i:02}', 'connection_id': f'c{i % count:02}', 'to_address': '0xdef',
+                     'amount': str(i), 'status': 'pending', 'created_at': f'2026-01-02T00:{i:02}:00',
+                     'hash': None} for i in range(count * 2)]
+    return {'connections': connections, 'transactions': transactions}
+
+
+def contents(store):
+    return {table: list(store.iter_records(table)) for table in TABLES}
+
+
+@pytest.fixture(params=['db.json', 'db.sqlite'])
+def path(request, tmp_path, monkeypatch):
+    monkeypatch.delenv('DATABASE_BACKEND', raising=False)
+    monkeypatch.delenv('DATABASE_SHARDS', raising=False)
+    return str(tmp_path / request.param)
+
+
+def test_reshard_round_trip_keeps_every_record(path):
+    store = open_store(path)
+    for table, rows in records().items():
+        store.insert_many(table, rows)
+    expected = contents(store)
+    stats = store.stats()
+    store.close()
+
+    current = 1
+    for count in (3, 2, 1):
+        reshard(path, count, remove=True, log=quiet)
+        assert (read_shard_count(path) or 1) == count
+        assert not any(os.path.exists(old) for old in layout_paths(path, current))
+        current = count
+        store = open_store(path)
+        assert isinstance(store, ShardedStore) == (count > 1)
+        assert contents(store) == expected
+        assert store.stats() == stats
+        assert store.get('connections', 'c07')['metadata'] == {'n': 7}
+        assert [row['id'] for row in store.find('transactions', 'connection_id', 'c05')] == ['t05', 't35']
+        store.close()
+
+
+def test_reshard_keeps_the_old_files_and_refuses_to_overwrite_them(path):
+    store = open_store(path)
+    store.insert_many('connections', records(5)['connections'])
+    store.close()
+
+    reshard(path, 4, log=quiet)
+    assert has_data(path)
+    with pytest.raises(SystemExit):
+        reshard(path, 1, log=quiet)
+    assert read_shard_count(path) == 4
+    store = open_store(path)
+    assert store.stats()['connections']['total'] == 5
+    store.close()
+
+
+def test_reshard_to_the_current_count_changes_nothing(path):
+    store = open_store(path)
+    store.insert_many('connections', records(3)['connections'])
+    store.close()
+    messages = []
+    reshard(path, 1, log=messages.append)
+    assert messages == [f'{path} already has 1 shard(s)']
+    assert read_shard_count(path) is None
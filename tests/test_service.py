@@ -0,0 +1,156 @@
+import base64
+import json
+
+import pytest
+
+from core.service import Request, Service, env_config
+
+
+def connection(record_id, created_at, **fields):
+    return {'id': record_id, 'user_id': 'u1', 'status': 'pending', 'created_at': created_at,
+            'wallet_address': None, 'network': None, 'expires_at': None, 'metadata': {}, **fields}
+
+
+def call(service, endpoint, args=None, headers=None, body=None, **params):
+    method = 'GET' if body is None else 'POST'
+    data = b'' if body is None else json.dumps(body).encode()
+    request = Request(method, '/', args or {}, headers or {}, data, 'http://localhost/', '127.0.0.1')
+    return service.handle(endpoint, request, params)
+
+
+def decoded(response):
+    return json.loads(response.body)
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    for variable in ('DATABASE_FILE', 'DATABASE_BACKEND', 'DATABASE_SHARDS', 'RATE_LIMIT_IP', 'RATE_LIMIT_USER',
+                     'RATE_LIMIT_CONNECTION', 'MAX_CONCURRENT_WRITES'):
+        monkeypatch.delenv(variable, raising=False)
+    service = Service(env_config(DATABASE_FILE=str(tmp_path / 'db.json'), EXPIRY_SWEEP_INTERVAL=0))
+    yield service
+    service.get_db().close()
+
+
+def all_pages(service, args):
+    ids = []
+    cursor = None
+    while True:
+        page = decoded(call(service, 'get_all_connections', dict(args, cursor=cursor) if cursor else args))
+        ids += [record['id'] for record in page['connections']]
+        cursor = page['next_cursor']
+        if cursor is None:
+            return ids
+
+
+def test_cursor_pages_return_every_record_once(service):
+    # Records sharing a created_at are ordered by id
+    records = [connection(f'c{i:02}', f'2026-01-01T00:00:{i // 3:02}', status='pending' if i % 2 else 'connected')
+               for i in range(25)]
+    service.get_db().insert_many('connections', records)
+    ids = [record['id'] for record in records]
+
+    for limit in ('1', '7', '10', '25', '1000'):
+        assert all_pages(service, {'limit': limit}) == ids
+        assert all_pages(service, {'limit': limit, 'order': 'desc'}) == ids[::-1]
+    pending = [record['id'] for record in records if record['status'] == 'pending']
+    assert all_pages(service, {'limit': '4', 'status': 'pending'}) == pending
+    assert all_pages(service, {'limit': '4', 'since': '2026-01-01T00:00:03', 'until': '2026-01-01T00:00:05'}) == ids[9:15]
+
+
+def test_cursor_paging_skips_records_deleted_between_pages(service):
+    db = service.get_db()
+    db.insert_many('connections', [connection(f'c{i}', f'2026-01-01T00:00:0{i}', expires_at=1) for i in range(6)])
+    page = decoded(call(service, 'get_all_connections', {'limit': '3'}))
+    assert [record['id'] for record in page['connections']] == ['c0', 'c1', 'c2']
+    # Archiving removes the expired records from the table
+    db.update_many('connections', [('c3', {'status': 'connected'}), ('c4', {'status': 'connected'})])
+    db.expire(now=2, archive=True)
+    rest = decoded(call(service, 'get_all_connections', {'limit': '3', 'cursor': page['next_cursor']}))
+    assert [record['id'] for record in rest['connections']] == ['c3', 'c4']
+    assert rest['next_cursor'] is None
+
+
+def test_empty_table_has_no_next_cursor(service):
+    page = decoded(call(service, 'get_all_connections', {'limit': '10'}))
+    assert page == {'success': True, 'connections': [], 'next_cursor': None}
+
+
+@pytest.mark.parametrize('cursor', [
+    'not a cursor!',
+    base64.urlsafe_b64encode(b'"just a string"').decode(),
+    base64.urlsafe_b64encode(b'"ab"').decode(),
+    base64.urlsafe_b64encode(b'["only one"]').decode(),
+    base64.urlsafe_b64encode(b'[1, 2]').decode(),
+    base64.urlsafe_b64encode(b'[["2026"], "c1"]').decode(),
+    base64.urlsafe_b64encode(b'{"a": 1, "b": 2}').decode(),
+])
+def test_invalid_cursor_is_a_400(service, cursor):
+    response = call(service, 'get_all_connections', {'cursor': cursor})
+    assert response.status == 400
+    assert decoded(response) == {'error': 'Invalid cursor'}
+
+
+@pytest.mark.parametrize('args', [{'limit': '0'}, {'limit': '1001'}, {'limit': 'ten'}, {'order': 'sideways'}])
+def test_invalid_list_arguments_are_a_400(service, args):
+    assert call(service, 'get_all_connections', args).status == 400
+
+
+def test_idempotent_create_is_replayed(service):
+    headers = {'Idempotency-Key': 'key-1'}
+    first = call(service, 'create_connection', headers=headers, body={'user_id': 'u1'})
+    repeat = call(service, 'create_connection', headers=headers, body={'user_id': 'u1'})
+    assert first.status == repeat.status == 200
+    assert 'Idempotent-Replayed' not in first.headers
+    assert repeat.headers['Idempotent-Replayed'] == 'true'
+    assert decoded(repeat)['connection_id'] == decoded(first)['connection_id']
+    assert service.get_db().stats()['connections']['total'] == 1
+
+    # Without a key every request creates
+    call(service, 'create_connection', body={'user_id': 'u1'})
+    assert service.get_db().stats()['connections']['total'] == 2
+
+
+def test_idempotent_transaction_is_replayed(service):
+    connection_id = decoded(call(service, 'create_connection', body={'user_id': 'u1'}))['connection_id']
+    call(service, 'update_connection', body={'wallet_address': '0xabc'}, connection_id=connection_id)
+    body = {'connection_id': connection_id, 'to_address': '0xdef', 'amount': '1'}
+    first = call(service, 'create_transaction', headers={'Idempotency-Key': 'tx'}, body=body)
+    repeat = call(service, 'create_transaction', headers={'Idempotency-Key': 'tx'}, body=body)
+    assert first.status == 200
+    assert decoded(repeat)['transaction_id'] == decoded(first)['transaction_id']
+    assert service.get_db().stats()['transactions']['total'] == 1
+
+
+def test_reused_key_with_another_body_is_a_422(service):
+    headers = {'Idempotency-Key': 'key-1'}
+    call(service, 'create_connection', headers=headers, body={'user_id': 'u1'})
+    response = call(service, 'create_connection', headers=headers, body={'user_id': 'u2'})
+    assert response.status == 422
+    assert 'error' in decoded(response)
+    assert service.get_db().stats()['connections']['total'] == 1
+
+
+def test_rate_limit_is_a_429_with_retry_after(monkeypatch, service):
+    monkeypatch.setenv('RATE_LIMIT_USER', '0.1,2')
+    limited = Service(service.config)
+    statuses = [call(limited, 'create_connection', body={'user_id': 'u1'}).status for _ in range(3)]
+    assert statuses == [200, 200, 429]
+    response = call(limited, 'create_connection', body={'user_id': 'u1'})
+    assert response.status == 429
+    assert int(response.headers['Retry-After']) >= 1
+    # Other users have buckets of their own, and reads are not limited
+    assert call(limited, 'create_connection', body={'user_id': 'u2'}).status == 200
+    assert call(limited, 'get_all_connections').status == 200
+    assert service.get_db().stats()['connections']['total'] == 3
+
+
+def test_write_cap_sheds_load_with_a_503(monkeypatch, service):
+    monkeypatch.setenv('MAX_CONCURRENT_WRITES', '1')
+    capped = Service(service.config)
+    with capped.admission.admit([]):
+        response = call(capped, 'create_connection', body={'user_id': 'u1'})
+        assert response.status == 503
+        assert response.headers['Retry-After'] == '1'
+        assert call(capped, 'get_stats').status == 200
+    assert call(capped, 'create_connection', body={'user_id': 'u1'}).status == 200
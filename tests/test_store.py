@@ -0,0 +1,237 @@
+import json
+import os
+
+from core.store import Store
+
+
+def connection(record_id, **fields):
+    return {'id': record_id, 'user_id': 'u1', 'status': 'pending', 'created_at': '2026-01-01T00:00:00',
+            'wallet_address': None, 'network': None, 'expires_at': None, 'metadata': {}, **fields}
+
+
+def open_store(tmp_path, **options):
+    return Store(str(tmp_path / 'db.json'), **options)
+
+
+def test_unhashable_indexed_value_is_stored_and_reloads(tmp_path):
+    store = open_store(tmp_path)
+    store.insert('connections', connection('c1', user_id=['a', 'b']))
+    store.insert('connections', connection('c2'))
+    store.update('connections', 'c2', {'wallet_address': {'x': 1}})
+    assert store.stats()['connections']['total'] == 2
+    assert len(store.data()['connections']) == 2
+    assert store.find('connections', 'user_id', 'u1') == [store.get('connections', 'c2')]
+    store.close()
+
+    reopened = open_store(tmp_path, mapped=False)
+    assert reopened.get('connections', 'c1')['user_id'] == ['a', 'b']
+    assert reopened.get('connections', 'c2')['wallet_address'] == {'x': 1}
+    assert reopened.stats()['connections']['total'] == 2
+    assert len(reopened.data()['connections']) == 2
+    reopened.close()
+
+
+def test_invalid_record_is_rejected_before_it_is_logged(tmp_path):
+    store = open_store(tmp_path)
+    store.insert('connections', connection('c1'))
+    size = (tmp_path / 'db.json.wal').stat().st_size
+    for bad in (lambda: store.insert('connections', connection(['c2'])),
+                lambda: store.insert_many('connections', [connection('c3'), connection('c4', status={'a': 1})]),
+                lambda: store.update('connections', 'c1', {'status': ['connected']})):
+        try:
+            bad()
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('expected ValueError')
+    assert (tmp_path / 'db.json.wal').stat().st_size == size
+    assert store.stats()['connections'] == {'total': 1, 'by_status': {'pending': 1}}
+    store.close()
+
+
+def test_replay_skips_entries_it_cannot_apply(tmp_path):
+    store = open_store(tmp_path)
+    store.insert('connections', connection('c1'))
+    store.close()
+    with open(tmp_path / 'db.json.wal', 'ab') as f:
+        f.write(b'{"op": "put", "table": "connections", "record": {"id": ["x"]}}\n')
+        f.write(b'not json\n')
+        f.write(b'{"op": "put", "table": "nope", "record": {"id": "y"}}\n')
+        f.write(b'[1, 2]\n')
+    store = open_store(tmp_path)
+    store.insert('connections', connection('c2'))
+    store.close()
+
+    for mapped in (False, True):
+        reopened = open_store(tmp_path, mapped=mapped)
+        assert reopened.stats()['connections']['total'] == 2
+        assert reopened.get('connections', 'c2') is not None
+        reopened.close()
+
+
+def fill(store, count=5):
+    store.insert('connections', connection('c0'))
+    store.insert_many('connections', [connection(f'c{i}', created_at=f'2026-01-01T00:00:0{i}')
+                                      for i in range(1, count)])
+    store.update('connections', 'c1', {'status': 'connected', 'wallet_address': '0xabc'})
+
+
+def contents(store):
+    return {table: sorted((dict(record) for record in rows), key=lambda record: record['id'])
+            for table, rows in store.data().items()}
+
+
+def test_log_is_replayed_on_restart(tmp_path):
+    store = open_store(tmp_path)
+    fill(store)
+    expected = contents(store)
+    store.close()
+    assert not (tmp_path / 'db.json').exists()
+
+    reopened = open_store(tmp_path)
+    assert reopened.get('connections', 'c1')['status'] == 'connected'
+    assert reopened.stats()['connections'] == {'total': 5, 'by_status': {'pending': 4, 'connected': 1}}
+    assert contents(reopened) == expected
+    assert reopened.find('connections', 'status', 'connected') == [reopened.get('connections', 'c1')]
+    reopened.close()
+
+
+def test_compaction_folds_the_log_into_the_snapshot(tmp_path):
+    store = open_store(tmp_path)
+    fill(store)
+    store.compact()
+    assert (tmp_path / 'db.json.wal').stat().st_size == 0
+    assert not (tmp_path / 'db.json.wal.compacting').exists()
+    assert (tmp_path / 'db.json.map').exists()
+    with open(tmp_path / 'db.json') as f:
+        assert len(json.load(f)['connections']) == 5
+
+    # Writes after a compaction go to the new log, on top of the snapshot
+    store.update('connections', 'c2', {'status': 'connected'})
+    store.insert('connections', connection('c9'))
+    expected = contents(store)
+    store.close()
+    for mapped in (False, True):
+        reopened = open_store(tmp_path, mapped=mapped)
+        assert contents(reopened) == expected
+        reopened.close()
+
+
+def test_repeated_compactions_keep_every_write(tmp_path):
+    store = open_store(tmp_path)
+    for i in range(40):
+        store.insert('connections', connection(f'c{i}'))
+        store.compact()
+    store.close()
+    reopened = open_store(tmp_path, mapped=False)
+    assert reopened.stats()['connections']['total'] == 40
+    reopened.close()
+
+
+def test_torn_append_is_cut_on_restart(tmp_path):
+    store = open_store(tmp_path)
+    fill(store)
+    expected = contents(store)
+    store.close()
+    # A crash in the middle of an append leaves a line without its newline
+    with open(tmp_path / 'db.json.wal', 'ab') as f:
+        f.write(b'{"op": "put", "table": "connections", "record": {"id": "half"')
+
+    store = open_store(tmp_path, mapped=False)
+    assert contents(store) == expected
+    store.insert('connections', connection('after'))
+    store.close()
+    with open(tmp_path / 'db.json.wal', 'rb') as f:
+        assert all(line.endswith(b'\n') for line in f)
+
+    reopened = open_store(tmp_path)
+    assert reopened.get('connections', 'half') is None
+    assert reopened.get('connections', 'after') is not None
+    assert reopened.stats()['connections']['total'] == 6
+    reopened.close()
+
+
+def test_restart_without_close_sees_every_write(tmp_path):
+    crashed = open_store(tmp_path)
+    fill(crashed)
+    expected = contents(crashed)
+    # The first store is never closed, as when its process dies
+    restarted = open_store(tmp_path)
+    assert contents(restarted) == expected
+    restarted.close()
+
+
+def test_interrupted_compaction_is_recovered(tmp_path):
+    store = open_store(tmp_path)
+    fill(store)
+    store.compact()
+    store.insert('connections', connection('c7'))
+    store.update('connections', 'c0', {'status': 'connected'})
+    expected = contents(store)
+    store.close()
+    # A compaction that died after moving the log aside, before its
+    # snapshot landed
+    os.replace(tmp_path / 'db.json.wal', tmp_path / 'db.json.wal.compacting')
+
+    for mapped in (False, True):
+        reopened = open_store(tmp_path, mapped=mapped)
+        assert contents(reopened) == expected
+        reopened.close()
+
+    store = open_store(tmp_path)
+    store.insert('connections', connection('c8'))
+    store.compact()
+    assert not (tmp_path / 'db.json.wal.compacting').exists()
+    store.close()
+    reopened = open_store(tmp_path, mapped=False)
+    assert reopened.stats()['connections']['total'] == 7
+    reopened.close()
+
+
+def test_mapped_view_agrees_with_the_loaded_tables(tmp_path):
+    store = open_store(tmp_path)
+    fill(store, count=9)
+    store.compact()
+    # Changes since the snapshot live only in the log
+    store.update('connections', 'c3', {'status': 'connected', 'wallet_address': '0x3'})
+    store.insert('connections', connection('c9', user_id='u2'))
+    store.close()
+
+    mapped = open_store(tmp_path)
+    loaded = open_store(tmp_path, mapped=False)
+    assert mapped._view is not None
+    for i in range(11):
+        assert mapped.get('connections', f'c{i}') == loaded.get('connections', f'c{i}')
+    assert mapped.get('transactions', 'c1') is None
+    assert mapped.stats() == loaded.stats()
+    assert mapped._view is not None
+    # Anything beyond get and stats loads the tables
+    assert contents(mapped) == contents(loaded)
+    assert mapped._view is None
+    mapped.close()
+    loaded.close()
+
+
+def test_mapped_view_follows_a_live_writer(tmp_path):
+    writer = open_store(tmp_path)
+    fill(writer)
+    writer.compact()
+
+    reader = open_store(tmp_path, refresh_interval=0)
+    assert reader._view is not None
+    assert reader.get('connections', 'c1')['status'] == 'connected'
+
+    writer.insert('connections', connection('new'))
+    writer.update('connections', 'c2', {'status': 'connected'})
+    assert reader.get('connections', 'new') is not None
+    assert reader.get('connections', 'c2')['status'] == 'connected'
+    assert reader.stats() == writer.stats()
+
+    # The writer's compaction replaces the snapshot the view maps
+    writer.compact()
+    writer.insert('connections', connection('later'))
+    assert reader.get('connections', 'later') is not None
+    assert reader.get('connections', 'c0') == writer.get('connections', 'c0')
+    assert reader.stats() == writer.stats()
+    writer.close()
+    reader.close()
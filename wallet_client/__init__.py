@@ -0,0 +1,19 @@
+"""
+Python client for the wallet platform API.
+
+``WalletPlatformClient`` is the blocking client (needs ``requests``);
+``AsyncWalletPlatformClient`` is the asyncio one (needs ``aiohttp``) and is
+only imported when first used.
+"""
+
+from wallet_client.common import ClientError
+from wallet_client.sync import WalletPlatformClient
+
+__all__ = ['AsyncWalletPlatformClient', 'ClientError', 'WalletPlatformClient']
+
+
+def __getattr__(name):
+    if name == 'AsyncWalletPlatformClient':
+        from wallet_client.aio import AsyncWalletPlatformClient
+        return AsyncWalletPlatformClient
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
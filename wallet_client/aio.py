@@ -0,0 +1,115 @@
+"""
+asyncio client built on ``aiohttp``.
+"""
+
+import asyncio
+import time
+
+import aiohttp
+
+from wallet_client.common import (
+    CONNECT_TIMEOUT, DEFAULT_BASE_URL, IDEMPOTENCY_HEADER, MAX_RETRIES, MAX_WAIT, READ_TIMEOUT,
+    ClientError, backoff_delay, error_from_body, should_retry, wait_finished
+)
+from wallet_client.endpoints import Endpoints
+
+
+class AsyncWalletPlatformClient(Endpoints):
+    """asyncio client for the wallet platform API
+
+    Requests share one keep-alive connection pool, and at most
+    ``max_concurrency`` are in flight at once, so callers can fan out with
+    ``asyncio.gather`` freely. Retries follow the same rules as the sync
+    client. Use it as ``async with AsyncWalletPlatformClient() as client``.
+    """
+
+    def __init__(self, base_url=DEFAULT_BASE_URL, max_concurrency=20, timeout=READ_TIMEOUT,
+                 connect_timeout=CONNECT_TIMEOUT, max_retries=MAX_RETRIES):
+        self.base_url = base_url.rstrip('/')
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_retries = max_retries
+        self._long_poll = None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._session = None
+
+    def _get_session(self):
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=30)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _request(self, method, path, json=None, params=None, retry=True, timeout=None, headers=None):
+        """Send a request and return the decoded JSON body"""
+        url = f"{self.base_url}{path}"
+        keyed = bool(headers and IDEMPOTENCY_HEADER in headers)
+        request_timeout = aiohttp.ClientTimeout(sock_connect=self.connect_timeout,
+                                                sock_read=timeout or self.timeout)
+        attempts = self.max_retries + 1 if retry else 1
+        for attempt in range(attempts):
+            status = None
+            try:
+                async with self._semaphore:
+                    async with self._get_session().request(
+                            method, url, json=json, params=params, headers=headers,
+                            timeout=request_timeout) as response:
+                        status = response.status
+                        try:
+                            body = await response.json(content_type=None)
+                        except ValueError:
+                            body = None
+                if status < 400:
+                    return body
+                error = error_from_body(status, body)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                status = None
+                error = ClientError(None, str(e) or type(e).__name__)
+
+            if not should_retry(status, keyed) or attempt == attempts - 1:
+                raise error
+            await asyncio.sleep(backoff_delay(attempt))
+
+    async def get_connections(self, connection_ids):
+        """Fetch several connections concurrently, in the order given"""
+        return await asyncio.gather(*(self.get_connection(connection_id) for connection_id in connection_ids))
+
+    async def get_transactions(self, transaction_ids):
+        """Fetch several transactions concurrently, in the order given"""
+        return await asyncio.gather(*(self.get_transaction(transaction_id) for transaction_id in transaction_ids))
+
+    async def _wait_for_status(self, table, key, record_id, statuses, timeout, poll_interval):
+        deadline = time.monotonic() + timeout
+        record = await self._request('GET', f'/api/{table}/{record_id}')
+        while not wait_finished(table, record, statuses):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"{key} {record_id} is still {record.get('status')} after {timeout}s")
+
+            if self._long_poll is not False:
+                wait = min(remaining, MAX_WAIT)
+                try:
+                    result = await self._request('GET', f'/api/{table}/{record_id}/wait',
+                                                 params={'status': record.get('status'), 'timeout': wait},
+                                                 timeout=wait + READ_TIMEOUT)
+                except ClientError as e:
+                    self._stop_long_polling(e)
+                else:
+                    self._long_poll = True
+                    record = result[key]
+                    continue
+
+            await asyncio.sleep(min(poll_interval, remaining))
+            record = await self._request('GET', f'/api/{table}/{record_id}')
+        return record
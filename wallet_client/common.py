@@ -0,0 +1,77 @@
+"""
+Pieces shared by the sync and async clients: errors, retry timing and the
+status waiting rules.
+"""
+
+import random
+import secrets
+
+DEFAULT_BASE_URL = 'http://localhost:5000'
+
+# Seconds to wait for a TCP connection and for a response
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 30
+
+# Retries of idempotent requests that failed with a 5xx or a network error
+MAX_RETRIES = 3
+BACKOFF = 0.25
+MAX_BACKOFF = 5.0
+
+# Sent with creates so a retry replays the first attempt instead of creating
+# the record again (see core/idempotency.py)
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+# Longest single long-poll the server accepts (MAX_WAIT_TIMEOUT in server.py)
+MAX_WAIT = 60
+POLL_INTERVAL = 2.0
+
+# Transaction states that never change again
+FINAL_TRANSACTION_STATUSES = ('confirmed', 'failed')
+
+
+class ClientError(Exception):
+    """The platform answered with an error status, or could not be reached"""
+
+    def __init__(self, status, message, body=None):
+        super().__init__(f'{status}: {message}' if status else message)
+        self.status = status
+        self.message = message
+        self.body = body
+
+
+def backoff_delay(attempt, backoff=BACKOFF, max_backoff=MAX_BACKOFF):
+    """Seconds to sleep before retry number attempt (0-based), with full jitter"""
+    return random.uniform(0, min(max_backoff, backoff * 2 ** attempt))
+
+
+def should_retry(status, keyed=False):
+    """Tell whether a failed attempt is worth repeating
+
+    A keyed create also retries a 409, which the server sends while the
+    attempt it repeats is still running.
+    """
+    return status is None or status >= 500 or (keyed and status == 409)
+
+
+def idempotency_headers(key=None):
+    """Headers for one logical create, with a fresh key unless one is given"""
+    return {IDEMPOTENCY_HEADER: key or secrets.token_urlsafe(24)}
+
+
+def error_from_body(status, body):
+    message = body.get('error') if isinstance(body, dict) else None
+    return ClientError(status, message or f'HTTP {status}', body)
+
+
+def wait_finished(table, record, statuses):
+    """Tell whether waiting on a record is over, raising if it never will be"""
+    status = record.get('status')
+    if status in statuses:
+        return True
+    if table == 'connections' and status == 'expired':
+        raise ClientError(410, 'Connection expired', record)
+    return table == 'transactions' and status in FINAL_TRANSACTION_STATUSES
+
+
+def as_statuses(statuses):
+    return (statuses,) if isinstance(statuses, str) else tuple(statuses)
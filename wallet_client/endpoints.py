@@ -0,0 +1,121 @@
+"""
+The API's endpoints, shared by the sync and async clients.
+
+``Endpoints`` builds every request's path and payload and hands it to
+``_request``, which each client implements over its own transport: the sync
+client returns the decoded body, the async one a coroutine for it, so every
+method here is awaited on ``AsyncWalletPlatformClient``.
+
+Single creates carry an ``Idempotency-Key``, the same on every retry, so
+they are retried like everything else without creating a record twice.
+"""
+
+from wallet_client.common import POLL_INTERVAL, READ_TIMEOUT, as_statuses, idempotency_headers
+
+
+class Endpoints:
+    """API methods on top of a client's ``_request`` and ``_wait_for_status``"""
+
+    def _request(self, method, path, json=None, params=None, retry=True, timeout=None, headers=None):
+        raise NotImplementedError
+
+    def _wait_for_status(self, table, key, record_id, statuses, timeout, poll_interval):
+        raise NotImplementedError
+
+    def _stop_long_polling(self, error):
+        """Fall back to polling if error says the server has no /wait endpoints"""
+        # A server without /wait answers 404 for the route itself
+        if error.status not in (404, 405) or self._long_poll:
+            raise error
+        self._long_poll = False
+
+    # Connections
+
+    def create_connection(self, user_id, metadata=None, idempotency_key=None):
+        """Create a new wallet connection
+
+        Pass idempotency_key to make repeats of your own call safe as well;
+        by default each call gets a fresh one.
+        """
+        data = {
+            "user_id": user_id,
+            "metadata": metadata or {}
+        }
+        return self._request('POST', '/api/connect', json=data, headers=idempotency_headers(idempotency_key))
+
+    def create_connections_batch(self, items):
+        """Create many connections in one request, results in the same order"""
+        return self._request('POST', '/api/connect/batch', json=items, retry=False)
+
+    def get_connection(self, connection_id):
+        """Get connection status"""
+        return self._request('GET', f'/api/connections/{connection_id}')
+
+    def list_connections(self, **params):
+        """Get one page of connections (limit, cursor, order, since, until, fields, filters)"""
+        return self._request('GET', '/api/connections', params=params or {'limit': 100})
+
+    def update_connection(self, connection_id, wallet_address, network="ethereum"):
+        """Update connection with wallet info"""
+        data = {
+            "wallet_address": wallet_address,
+            "network": network
+        }
+        return self._request('POST', f'/api/connections/{connection_id}/update', json=data)
+
+    def wait_for_connection(self, connection_id, status="pending", timeout=30):
+        """Block until the connection leaves the given status (or timeout)"""
+        params = {"status": status, "timeout": timeout}
+        return self._request('GET', f'/api/connections/{connection_id}/wait',
+                             params=params, timeout=timeout + READ_TIMEOUT)
+
+    def wait_for_connection_status(self, connection_id, statuses=('connected',), timeout=300,
+                                   poll_interval=POLL_INTERVAL):
+        """Wait until the connection reaches one of statuses and return it"""
+        return self._wait_for_status('connections', 'connection', connection_id,
+                                     as_statuses(statuses), timeout, poll_interval)
+
+    # Transactions
+
+    def create_transaction(self, connection_id, to_address, amount, idempotency_key=None):
+        """Create a transaction request (idempotency_key as for create_connection)"""
+        data = {
+            "connection_id": connection_id,
+            "to_address": to_address,
+            "amount": amount
+        }
+        return self._request('POST', '/api/transactions', json=data, headers=idempotency_headers(idempotency_key))
+
+    def get_transaction(self, transaction_id):
+        """Get transaction status"""
+        return self._request('GET', f'/api/transactions/{transaction_id}')
+
+    def update_transaction(self, transaction_id, **changes):
+        """Update transaction with blockchain info (status, hash, gas_used, gas_price)"""
+        return self._request('POST', f'/api/transactions/{transaction_id}/update', json=changes)
+
+    def update_transactions_batch(self, patches):
+        """Apply many {id, status, hash, gas_used, gas_price} updates in one request"""
+        return self._request('POST', '/api/transactions/batch/update', json=patches)
+
+    def get_connection_transactions(self, connection_id, **params):
+        """Get the transactions of a connection"""
+        return self._request('GET', f'/api/connections/{connection_id}/transactions', params=params)
+
+    def wait_for_transaction(self, transaction_id, status="pending", timeout=30):
+        """Block until the transaction leaves the given status (or timeout)"""
+        params = {"status": status, "timeout": timeout}
+        return self._request('GET', f'/api/transactions/{transaction_id}/wait',
+                             params=params, timeout=timeout + READ_TIMEOUT)
+
+    def wait_for_transaction_status(self, transaction_id, statuses=('confirmed',), timeout=300,
+                                    poll_interval=POLL_INTERVAL):
+        """Wait until the transaction reaches one of statuses (or fails) and return it"""
+        return self._wait_for_status('transactions', 'transaction', transaction_id,
+                                     as_statuses(statuses), timeout, poll_interval)
+
+    # Statistics
+
+    def get_stats(self):
+        """Get platform statistics"""
+        return self._request('GET', '/api/stats')
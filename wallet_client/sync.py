@@ -0,0 +1,101 @@
+"""
+Blocking client built on a pooled ``requests.Session``.
+"""
+
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from wallet_client.common import (
+    CONNECT_TIMEOUT, DEFAULT_BASE_URL, IDEMPOTENCY_HEADER, MAX_RETRIES, MAX_WAIT, READ_TIMEOUT,
+    ClientError, backoff_delay, error_from_body, should_retry, wait_finished
+)
+from wallet_client.endpoints import Endpoints
+
+
+class WalletPlatformClient(Endpoints):
+    """Client for the wallet platform API
+
+    One instance keeps a pool of keep-alive connections and can be shared by
+    threads. Requests are retried with jittered backoff on 5xx responses and
+    network errors; single creates send an Idempotency-Key so a retry never
+    creates a record twice. Batch creates are not retried.
+    """
+
+    def __init__(self, base_url=DEFAULT_BASE_URL, pool_size=10, timeout=READ_TIMEOUT,
+                 connect_timeout=CONNECT_TIMEOUT, max_retries=MAX_RETRIES):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_retries = max_retries
+        # None until we know whether the server has the /wait endpoints
+        self._long_poll = None
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _request(self, method, path, json=None, params=None, retry=True, timeout=None, headers=None):
+        """Send a request and return the decoded JSON body"""
+        url = f"{self.base_url}{path}"
+        keyed = bool(headers and IDEMPOTENCY_HEADER in headers)
+        attempts = self.max_retries + 1 if retry else 1
+        for attempt in range(attempts):
+            try:
+                response = self.session.request(
+                    method, url, json=json, params=params, headers=headers,
+                    timeout=(self.connect_timeout, timeout or self.timeout))
+                status = response.status_code
+            except requests.RequestException as e:
+                response = None
+                status = None
+                error = ClientError(None, str(e))
+
+            if response is not None:
+                try:
+                    body = response.json()
+                except ValueError:
+                    body = None
+                if status < 400:
+                    return body
+                error = error_from_body(status, body)
+
+            if not should_retry(status, keyed) or attempt == attempts - 1:
+                raise error
+            time.sleep(backoff_delay(attempt))
+
+    def _wait_for_status(self, table, key, record_id, statuses, timeout, poll_interval):
+        deadline = time.monotonic() + timeout
+        record = self._request('GET', f'/api/{table}/{record_id}')
+        while not wait_finished(table, record, statuses):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"{key} {record_id} is still {record.get('status')} after {timeout}s")
+
+            if self._long_poll is not False:
+                wait = min(remaining, MAX_WAIT)
+                try:
+                    result = self._request('GET', f'/api/{table}/{record_id}/wait',
+                                           params={'status': record.get('status'), 'timeout': wait},
+                                           timeout=wait + READ_TIMEOUT)
+                except ClientError as e:
+                    self._stop_long_polling(e)
+                else:
+                    self._long_poll = True
+                    record = result[key]
+                    continue
+
+            time.sleep(min(poll_interval, remaining))
+            record = self._request('GET', f'/api/{table}/{record_id}')
+        return record